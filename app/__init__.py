@@ -1,18 +1,43 @@
 """Initialization of app object"""
 
+import json
 import os
 
+import click
 from flask import Flask, abort, request
 from flask_cors import CORS
 
+from app import logger
 from app.article.routes import article_ns
+from app.batch_status import expiry, jobs
+from app.batch_status.loader import LOAD_BLOCK_SIZE, load_batch_results
 from app.batch_status.routes import batch_status_ns
+from app.batch_status.worker import DEFAULT_POLL_SECONDS, BatchWorker
 from app.brand.routes import brand_ns
+from app.enrichment_simweb.estimates import (
+    DEFAULT_CHUNK_SIZE,
+    recompute_estimates_exclusive,
+)
+from app.enrichment_simweb.export import export_parquet_snapshot
 from app.enrichment_simweb.routes import enrichment_sim_web_ns
 from app.extensions import api, db, migrate
 from app.main import main as main_blueprint
 from app.publisher.routes import publisher_ns
+from app.sentiment.rollup import rebuild_sentiment_rollup
 from app.sentiment.routes import sentiment_ns
+from app.utility import (
+    caching,
+    coalescing,
+    compression,
+    labels,
+    memory,
+    pool,
+    profiling,
+    prometheus,
+    query_stats,
+    replicas,
+)
+from app.utility.access import is_allowed_ip
 from config import DevelopmentConfig, ProductionConfig
 
 
@@ -44,7 +69,17 @@ def create_app():
     api.add_namespace(sentiment_ns, path="/sentiment")
     api.add_namespace(batch_status_ns, path="/batchstatus")
 
+    # first, so every request logs with its id
+    logger.init_app(app)
+    pool.init_app(app)
+    replicas.init_binds(app)
     db.init_app(app)
+    replicas.init_app(app, db)
+    query_stats.init_app(app)
+    prometheus.init_app(app, api)
+    profiling.init_app(app)
+    memory.init_app(app)
+    caching.init_app(app, api)
 
     @app.cli.command("init-db")
     def init_db():
@@ -52,18 +87,285 @@ def create_app():
         db.create_all()
         print("Initialized the database.")
 
-    migrate.init_app(app, db)
+    @app.cli.command("recompute-estimates")
+    @click.option(
+        "--estimate",
+        "estimates",
+        multiple=True,
+        help="Estimate column to recompute (repeatable). Defaults to all.",
+    )
+    @click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, show_default=True)
+    def recompute_estimates_command(estimates, chunk_size):
+        """Recompute *_estimate columns of all enrichments in batches."""
+        result = recompute_estimates_exclusive(
+            estimates=list(estimates), chunk_size=chunk_size
+        )
+        if result is None:
+            raise click.ClickException("A recompute of the estimates is already running.")
+        print(
+            f"Recomputed {len(result['estimates'])} estimates: "
+            f"{result['scanned']} enrichments scanned, {result['updated']} updated."
+        )
+
+    @app.cli.command("export-enrichments")
+    @click.argument("output_dir")
+    @click.option(
+        "--since",
+        type=click.DateTime(),
+        help="Only export enrichments updated after this timestamp.",
+    )
+    @click.option(
+        "--incremental",
+        is_flag=True,
+        help="Only export enrichments updated since the previous snapshot.",
+    )
+    def export_enrichments_command(output_dir, since, incremental):
+        """Write enrichments as a Parquet dataset partitioned by industry."""
+        result = export_parquet_snapshot(
+            output_dir, since=since, incremental=incremental
+        )
+        print(
+            f"Exported {result['rows']} enrichments to {result['output_dir']} "
+            f"(watermark: {result['watermark']})."
+        )
+
+    @app.cli.command("rebuild-sentiment-rollup")
+    def rebuild_sentiment_rollup_command():
+        """Recompute the sentiment rollup table from all sentiments."""
+        groups = rebuild_sentiment_rollup()
+        print(f"Rebuilt sentiment rollup: {groups} groups.")
+
+    @app.cli.command("load-batch-results")
+    @click.argument("batch_id")
+    @click.option("--block-size", default=LOAD_BLOCK_SIZE, show_default=True)
+    @click.option(
+        "--restart",
+        is_flag=True,
+        help="Load from the first line, replacing the sentiments already loaded.",
+    )
+    def load_batch_results_command(batch_id, block_size, restart):
+        """Load the output file of a batch into sentiments (resumable)."""
+        result = load_batch_results(batch_id, block_size=block_size, restart=restart)
+        print(
+            f"Batch {batch_id}: {result['inserted']} sentiments inserted, "
+            f"{result['failed']} lines failed, stopped at line {result['line_offset']}."
+        )
+        if result["deleted"]:
+            print(f"Replaced {result['deleted']} sentiments loaded before.")
+        for error in result["errors"]:
+            print(f"  {error['error']}")
+
+    @app.cli.command("batch-worker")
+    @click.option(
+        "--threads",
+        type=int,
+        help="Jobs run concurrently. Defaults to BATCH_WORKER_THREADS.",
+    )
+    @click.option(
+        "--lease-seconds",
+        type=int,
+        help="Lease duration, renewed by heartbeats. Defaults to BATCH_JOB_LEASE_SECONDS.",
+    )
+    @click.option("--poll-interval", default=DEFAULT_POLL_SECONDS, show_default=True)
+    @click.option(
+        "--kind",
+        "kinds",
+        multiple=True,
+        type=click.Choice(list(jobs.JOB_HANDLERS)),
+        help="Job kind to run (repeatable). Defaults to all.",
+    )
+    @click.option(
+        "--sweep-interval",
+        default=expiry.DEFAULT_SWEEP_INTERVAL_SECONDS,
+        show_default=True,
+        help="Seconds between expiry sweeps, 0 to disable.",
+    )
+    @click.option(
+        "--once", is_flag=True, help="Exit once no job is available instead of polling."
+    )
+    def batch_worker_command(
+        threads, lease_seconds, poll_interval, kinds, sweep_interval, once
+    ):
+        """Lease and run batch jobs until stopped."""
+        worker = BatchWorker(
+            app,
+            threads=threads or app.config["BATCH_WORKER_THREADS"],
+            lease_seconds=lease_seconds or app.config["BATCH_JOB_LEASE_SECONDS"],
+            poll_interval=poll_interval,
+            kinds=kinds,
+            sweep_interval=sweep_interval,
+        )
+        result = worker.run(once=once)
+        print(
+            f"Batch worker {worker.worker_id}: {result['done']} jobs done, "
+            f"{result['retried']} retried, {result['failed']} failed, "
+            f"{result['lost']} leases lost."
+        )
+
+    @app.cli.command("enqueue-result-loads")
+    def enqueue_result_loads_command():
+        """Queue a results load for completed batches not uploaded yet."""
+        print(f"Queued {jobs.enqueue_result_loads()} result loads.")
+
+    @app.cli.command("expire-batches")
+    @click.option(
+        "--batch-size", default=expiry.DEFAULT_SWEEP_BATCH_SIZE, show_default=True
+    )
+    @click.option(
+        "--max-batches", default=expiry.DEFAULT_MAX_SWEEP_BATCHES, show_default=True
+    )
+    def expire_batches_command(batch_size, max_batches):
+        """Mark running batches past their expires_at as expired."""
+        result = expiry.expire_batches(batch_size=batch_size, max_batches=max_batches)
+        print(
+            f"Expired {result['expired']} batches, {result['remaining']} overdue left "
+            f"({result['seconds']:.3f}s)."
+        )
+
+    @app.cli.command("normalize-labels")
+    @click.option(
+        "--label",
+        "label_names",
+        multiple=True,
+        type=click.Choice(list(labels.LABEL_ENUMS)),
+        help="Label to normalize (repeatable). Defaults to all.",
+    )
+    @click.option("--chunk-size", default=labels.DEFAULT_CHUNK_SIZE, show_default=True)
+    @click.option(
+        "--throttle",
+        default=labels.DEFAULT_THROTTLE_SECONDS,
+        show_default=True,
+        help="Seconds to sleep between chunks.",
+    )
+    def normalize_labels_command(label_names, chunk_size, throttle):
+        """Rewrite stored labels to their normalized enum values."""
+        result = labels.normalize_stored_labels(
+            labels=list(label_names), chunk_size=chunk_size, throttle=throttle
+        )
+        for column, updated in result.items():
+            print(f"{column}: {updated} rows normalized.")
+
+    @app.cli.group("memory")
+    @click.option(
+        "--url",
+        default=f"http://127.0.0.1:{os.getenv('FLASK_PORT') or 5000}",
+        show_default=True,
+        help="Server whose process is traced.",
+    )
+    @click.option(
+        "--pid",
+        type=int,
+        envvar="MEMORY_PID",
+        help="Worker process to call, as printed by start, when the server runs several.",
+    )
+    @click.pass_context
+    def memory_command(ctx, url, pid):
+        """Trace the allocations of a running server (tracemalloc)."""
+        ctx.obj = {"url": url, "pid": pid}
+
+    def call_memory(ctx, method, path, **params):
+        try:
+            return memory.call_server(
+                ctx.obj["url"], method, path, pid=ctx.obj["pid"], **params
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e)) from e
 
-    allowed_ips = {
-        "44.220.242.243",  # company-vpc-public-subnet-nat-ip
-        "127.0.0.1",  # internal localhost access
-        "99.231.69.240",
-    }
+    def print_sites(sites):
+        for site in sites:
+            change = (
+                f" ({site['size_diff_bytes']:+} bytes, {site['count_diff']:+} blocks)"
+                if "size_diff_bytes" in site
+                else ""
+            )
+            print(f"{site['size_bytes']} bytes in {site['count']} blocks{change}")
+            for frame in site["site"]:
+                print(f"  {frame}")
+
+    @memory_command.command("start")
+    @click.option("--frames", default=memory.DEFAULT_FRAMES, show_default=True)
+    @click.pass_context
+    def memory_start_command(ctx, frames):
+        """Start tracing allocations."""
+        result = call_memory(ctx, "POST", "/start", frames=frames)
+        print(f"Tracing worker {result['pid']} with {result['frames']} frames.")
+        if ctx.obj["pid"] is None:
+            print(
+                "Tracing is per process: with several workers, pass "
+                f"--pid {result['pid']} to the next commands."
+            )
+
+    @memory_command.command("stop")
+    @click.pass_context
+    def memory_stop_command(ctx):
+        """Stop tracing and drop the snapshots."""
+        call_memory(ctx, "POST", "/stop")
+        print("Tracing stopped.")
+
+    @memory_command.command("status")
+    @click.pass_context
+    def memory_status_command(ctx):
+        """Traced memory, snapshots and peak memory of bulk and paged requests."""
+        print(json.dumps(call_memory(ctx, "GET", ""), indent=2))
+
+    @memory_command.command("snapshot")
+    @click.pass_context
+    def memory_snapshot_command(ctx):
+        """Keep a snapshot of the traced allocations, prints its name."""
+        print(call_memory(ctx, "POST", "/snapshots")["snapshot"])
+
+    @memory_command.command("top")
+    @click.option("--limit", default=memory.DEFAULT_LIMIT, show_default=True)
+    @click.option(
+        "--key-type",
+        type=click.Choice(memory.KEY_TYPES),
+        default="lineno",
+        show_default=True,
+    )
+    @click.option("--snapshot", help="Snapshot to read. Defaults to the current heap.")
+    @click.pass_context
+    def memory_top_command(ctx, limit, key_type, snapshot):
+        """Largest allocation sites."""
+        print_sites(
+            call_memory(
+                ctx, "GET", "/top", limit=limit, key_type=key_type, snapshot=snapshot
+            )["sites"]
+        )
+
+    @memory_command.command("diff")
+    @click.argument("from_snapshot")
+    @click.argument("to_snapshot", required=False)
+    @click.option("--limit", default=memory.DEFAULT_LIMIT, show_default=True)
+    @click.option(
+        "--key-type",
+        type=click.Choice(memory.KEY_TYPES),
+        default="lineno",
+        show_default=True,
+    )
+    @click.pass_context
+    def memory_diff_command(ctx, from_snapshot, to_snapshot, limit, key_type):
+        """Allocation sites that grew the most since FROM_SNAPSHOT."""
+        print_sites(
+            call_memory(
+                ctx,
+                "GET",
+                "/diff",
+                **{"from": from_snapshot, "to": to_snapshot},
+                limit=limit,
+                key_type=key_type,
+            )["sites"]
+        )
+
+    migrate.init_app(app, db)
 
     @app.before_request
     def limit_remote_addr():
-        client_ip = request.remote_addr
-        if client_ip not in allowed_ips:
+        if not is_allowed_ip(request.remote_addr):
             abort(403)  # Forbidden
 
+    # after the IP check, see coalescing.init_app
+    coalescing.init_app(app, api)
+    # after coalescing, see compression.init_app
+    compression.init_app(app, api)
+
     return app
@@ -5,6 +5,14 @@ from app.extensions import db
 
 class Article(db.Model):
     __tablename__ = "articles"
+    # (id, last_updated_at) read by index-only scans for ETags (app/utility/caching.py)
+    __table_args__ = (
+        db.Index(
+            "ix_articles_article_id_last_updated_at",
+            "article_id",
+            postgresql_include=["last_updated_at"],
+        ),
+    )
 
     article_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
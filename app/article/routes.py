@@ -7,6 +7,9 @@ from sqlalchemy.exc import SQLAlchemyError
 from app.extensions import db
 from app.logger import app_logger
 from app.publisher.models import Publisher
+from app.utility import metrics
+from app.utility.caching import conditional_get
+from app.utility.replicas import replica_read
 
 from .models import Article
 
@@ -62,6 +65,7 @@ pagination_model = article_ns.model(
 @article_ns.route("/")
 class ArticleListResource(Resource):
     @article_ns.marshal_list_with(pagination_model)
+    @replica_read
     def get(self):
         """Get a list of articles with pagination"""
         try:
@@ -220,6 +224,9 @@ class ArticleBulkResource(Resource):
 
             db.session.bulk_save_objects(new_articles)
             db.session.commit()
+            metrics.increment(
+                "bulk_ingest_rows_total", len(new_articles), kind="article"
+            )
 
             return {
                 "message": f"{len(new_articles)} articles successfully created.",
@@ -234,7 +241,10 @@ class ArticleBulkResource(Resource):
 
 @article_ns.route("/<int:article_id>")
 class ArticleResource(Resource):
+    @article_ns.response(304, "Article not modified.")
     @article_ns.response(404, "Article not found.")
+    @replica_read
+    @conditional_get(Article, "article_id")
     def get(self, article_id):
         """Get an article by its ID"""
         try:
@@ -0,0 +1,150 @@
+"""
+Optional ASGI app serving the read-only GETs without pinning a thread each
+
+The list and detail GETs of articles, brands and enrichments are answered on
+the event loop through SQLAlchemy's asyncio extension and asyncpg, so a
+process holds thousands of slow concurrent reads. Every other request goes to
+the Flask app, run in a thread pool behind the same server:
+
+uvicorn asgi:app --host 0.0.0.0 --port 8765 --workers 2
+"""
+
+import contextlib
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount
+
+from app.utility.access import is_allowed_ip
+from app.logger import REQUEST_ID_HEADER, new_request_id, request_id
+from app.extensions import api
+from app.utility import compression, prometheus
+from app.utility.coalescing import AsyncSingleFlight
+
+from . import db
+from .routes import routes
+
+# threads running the Flask app, for everything but the async reads
+DEFAULT_WSGI_WORKERS = 10
+
+
+class AllowedIpsMiddleware:
+    """
+    Refuse clients outside app.utility.access.ALLOWED_IPS with 403, like the
+    Flask app does
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            client = scope.get("client")
+            if not is_allowed_ip(client[0] if client else None):
+                response = PlainTextResponse("Forbidden", status_code=403)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class RequestIdMiddleware:
+    """
+    Give every request an id, logged with its records and sent back, like
+    app.logger.init_app does in the Flask app (which reuses it)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = REQUEST_ID_HEADER.lower().encode("latin-1")
+        headers = [(key, value) for key, value in scope["headers"] if key != name]
+        sent = dict(scope["headers"]).get(name)
+        value = new_request_id(sent.decode("latin-1") if sent else None)
+        headers.append((name, value.encode("latin-1")))
+        scope = {**scope, "headers": headers}
+
+        async def send_request_id(message):
+            if message["type"] == "http.response.start" and not any(
+                key.lower() == name for key, _ in message.get("headers", [])
+            ):
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (name, value.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        token = request_id.set(value)
+        try:
+            await self.app(scope, receive, send_request_id)
+        finally:
+            request_id.reset(token)
+
+
+def create_asgi_app(flask_app):
+    """
+    ASGI app answering the async reads itself and the rest through `flask_app`
+    returns: Starlette app, its engine is created on startup and disposed on
+    shutdown (lifespan)
+    """
+
+    @contextlib.asynccontextmanager
+    async def lifespan(asgi_app):
+        engine, sessionmaker = db.create_engine(flask_app.config)
+        asgi_app.state.engine = engine
+        asgi_app.state.sessionmaker = sessionmaker
+        replica_engines = {}
+        router = asgi_app.state.replica_router
+        if router is not None:
+            replica_engines = db.create_replica_engines(flask_app.config)
+            for key, (replica_engine, _) in replica_engines.items():
+                router.watch(key, replica_engine.sync_engine)
+            router.start()
+        asgi_app.state.replica_sessionmakers = {
+            key: replica_sessionmaker
+            for key, (_, replica_sessionmaker) in replica_engines.items()
+        }
+        try:
+            yield
+        finally:
+            await engine.dispose()
+            for replica_engine, _ in replica_engines.values():
+                await replica_engine.dispose()
+
+    wsgi_app = WSGIMiddleware(
+        flask_app,
+        workers=flask_app.config.get("ASGI_WSGI_WORKERS", DEFAULT_WSGI_WORKERS),
+    )
+    asgi_app = Starlette(
+        routes=[*routes, Mount("/", app=wsgi_app)],
+        lifespan=lifespan,
+    )
+    asgi_app.state.cache_control = flask_app.config.get("CACHE_CONTROL") or {}
+    # health and read-your-writes state shared with the Flask app's reads
+    asgi_app.state.replica_router = flask_app.extensions.get("replica_router")
+    asgi_app.state.compression_levels = flask_app.config.get("COMPRESSION_LEVELS") or {}
+    asgi_app.state.compression_default_level = flask_app.config.get(
+        "COMPRESSION_DEFAULT_LEVEL", compression.DEFAULT_LEVEL
+    )
+    asgi_app.state.compression_min_size = flask_app.config.get(
+        "COMPRESSION_MIN_SIZE", compression.DEFAULT_MIN_SIZE
+    )
+    asgi_app.state.flights = (
+        AsyncSingleFlight(flask_app.config.get("COALESCE_TTL_SECONDS", 0.0))
+        if flask_app.config.get("COALESCE_GETS", True)
+        else None
+    )
+    asgi_app.add_middleware(AllowedIpsMiddleware)
+    # outside the IP check, refused requests are counted like in the Flask app
+    asgi_app.add_middleware(
+        prometheus.AsgiMiddleware, flask_app=flask_app, api=api, routes=routes
+    )
+    asgi_app.add_middleware(RequestIdMiddleware)
+    return asgi_app
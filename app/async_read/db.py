@@ -0,0 +1,62 @@
+"""
+Async engine of the read-only ASGI app
+
+The engine reads the same database as the Flask app, through asyncpg, with a
+pool of its own (ASYNC_SQLALCHEMY_POOL_OPTIONS): one event loop serves many
+concurrent requests, so it needs more connections than a Flask worker thread.
+Each of the SQLALCHEMY_REPLICA_URIS gets an async engine too, the reads
+picking one through the Flask app's ReplicaRouter (app/utility/replicas.py).
+"""
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.utility.replicas import BIND_PREFIX
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg"}
+
+
+def async_database_uri(uri):
+    """
+    SQLALCHEMY_DATABASE_URI with its driver swapped for the asyncio one
+    Raises ValueError for databases without an asyncio driver here
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {backend} databases.")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _create_engine(config, uri):
+    engine = create_async_engine(
+        uri,
+        pool_recycle=config["SQLALCHEMY_ENGINE_OPTIONS"].get("pool_recycle", -1),
+        pool_pre_ping=config["SQLALCHEMY_ENGINE_OPTIONS"].get("pool_pre_ping", False),
+        **config.get("ASYNC_SQLALCHEMY_POOL_OPTIONS", {}),
+    )
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+def create_engine(config):
+    """
+    AsyncEngine for the app config
+    returns: (engine, sessionmaker), sessions don't expire loaded rows on commit
+    """
+    return _create_engine(
+        config,
+        config.get("ASYNC_SQLALCHEMY_DATABASE_URI")
+        or async_database_uri(config["SQLALCHEMY_DATABASE_URI"]),
+    )
+
+
+def create_replica_engines(config):
+    """
+    AsyncEngines of the SQLALCHEMY_REPLICA_URIS
+    returns: {bind key: (engine, sessionmaker)}, keyed like the Flask app's
+    replica binds (app.utility.replicas.init_binds)
+    """
+    return {
+        f"{BIND_PREFIX}{index}": _create_engine(config, async_database_uri(uri))
+        for index, uri in enumerate(config.get("SQLALCHEMY_REPLICA_URIS") or [])
+    }
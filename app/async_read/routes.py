@@ -0,0 +1,349 @@
+"""
+Read-only endpoints served through the async engine
+
+Each handler answers like the GET of the Flask resource at the same path,
+same models and same response bodies (the list pages are marshalled with the
+namespaces' flask-restx models), so clients can't tell which app served them:
+the detail GETs answer If-None-Match with ETags and 304s, and the successful
+responses carry the Cache-Control of their namespace (app/utility/caching.py)
+and are compressed like the Flask ones (app/utility/compression.py).
+"""
+
+import functools
+import math
+
+from flask_restx import marshal
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.http import quote_etag
+from starlette.responses import Response
+from starlette.routing import Route
+
+from app.article.models import Article
+from app.article.routes import pagination_model as article_pagination_model
+from app.brand.models import Brand
+from app.brand.routes import pagination_model as brand_pagination_model
+from app.enrichment_simweb.models import EnrichmentSimWeb
+from app.logger import app_logger
+from app.utility import metrics
+from app.utility.caching import entity_etag, not_modified, version_statement
+from app.utility.coalescing import request_key
+from app.utility.compression import encode_result
+from app.utility.json_encoding import JSONResponse
+from app.utility.replicas import read_after
+
+# defaults of Flask-SQLAlchemy's paginate()
+DEFAULT_PAGE_SIZE = 20
+ENRICHMENTS_NAMESPACE = "enrichmentsSim_web"
+
+
+def _int_arg(request, name, default):
+    """Like request.args.get(name, default, type=int) in Flask"""
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def paginate(session, statement, page, per_page):
+    """
+    Page of `statement` the way Flask-SQLAlchemy's paginate(error_out=False) does
+    returns: (items, total, pages)
+    """
+    page = max(page, 1)
+    if per_page < 1:
+        per_page = DEFAULT_PAGE_SIZE
+    items = (
+        (await session.execute(statement.limit(per_page).offset((page - 1) * per_page)))
+        .scalars()
+        .all()
+    )
+    if page == 1 and len(items) < per_page:
+        total = len(items)
+    else:
+        total = (
+            await session.execute(
+                select(func.count()).select_from(statement.order_by(None).subquery())
+            )
+        ).scalar()
+    pages = math.ceil(total / per_page) if total else 0
+    return items, total, pages
+
+
+def _sessionmaker(request):
+    """
+    Sessions on the replica chosen for the request, like
+    app.utility.replicas.replica_read, or on the primary
+    """
+    state = request.app.state
+    router = state.replica_router
+    if router is None:
+        return state.sessionmaker
+    key, reason = router.choose(read_after(request))
+    metrics.increment("db_reads_total", bind=key or "primary", reason=reason)
+    return state.replica_sessionmakers.get(key, state.sessionmaker)
+
+
+async def _page(request, model, order_by):
+    page_number = _int_arg(request, "page", 1)
+    page_size = _int_arg(request, "page_size", 10)
+    async with _sessionmaker(request)() as session:
+        items, total, pages = await paginate(
+            session, select(model).order_by(order_by), page_number, page_size
+        )
+    return {
+        "first_page_number": 1,
+        "last_page_number": pages,
+        "total_items": total,
+        "total_pages": pages,
+        "current_page": page_number,
+    }, items
+
+
+def coalesced(namespace, handler):
+    """
+    Share the response of `handler` between identical concurrent requests, like
+    app.utility.coalescing does for the Flask GETs, compressed the way
+    app.utility.compression does
+    """
+
+    @functools.wraps(handler)
+    async def wrapper(request):
+        state = request.app.state
+        level = state.compression_levels.get(namespace, state.compression_default_level)
+
+        async def compute():
+            response = await handler(request)
+            return encode_result(
+                (response.status_code, dict(response.headers), response.body),
+                request.headers,
+                level,
+                state.compression_min_size,
+            )
+
+        flights = state.flights
+        if flights is None or "X-Profile" in request.headers:
+            status, headers, body = await compute()
+            return Response(body, status_code=status, headers=headers)
+
+        (status, headers, body), source = await flights.run(
+            request_key(
+                request.method,
+                request.url.path,
+                request.scope["query_string"],
+                request.headers,
+                read_after(request),
+            ),
+            compute,
+            cacheable=lambda result: result[0] == 200,
+        )
+        if source is not None:
+            metrics.increment(
+                "http_coalesced_requests_total", namespace=namespace, source=source
+            )
+        return Response(body, status_code=status, headers=headers)
+
+    return wrapper
+
+
+def _headers(request, namespace, etag=None):
+    headers = {}
+    policy = request.app.state.cache_control.get(namespace)
+    if policy:
+        headers["Cache-Control"] = policy
+    if etag is not None:
+        headers["ETag"] = quote_etag(etag)
+    return headers
+
+
+def _json(request, namespace, content, etag=None):
+    return JSONResponse(content, headers=_headers(request, namespace, etag))
+
+
+async def _get(request, model, object_id):
+    """
+    Row of `model` and its ETag, like app.utility.caching.conditional_get
+    returns: (row, etag), (None, etag) when If-None-Match holds the ETag (the
+    row isn't loaded), (None, None) for missing rows
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    async with _sessionmaker(request)() as session:
+        if if_none_match:
+            row = (await session.execute(version_statement(model, object_id))).first()
+            if row is not None:
+                etag = entity_etag(model, object_id, row.last_updated_at)
+                if not_modified(if_none_match, etag):
+                    return None, etag
+        found = await session.get(model, object_id)
+    if found is None:
+        return None, None
+    return found, entity_etag(model, object_id, found.last_updated_at)
+
+
+def _not_modified(request, namespace, model, etag):
+    metrics.increment("http_not_modified_total", table=model.__tablename__)
+    return Response(status_code=304, headers=_headers(request, namespace, etag))
+
+
+async def list_articles(request):
+    """GET /article/"""
+    try:
+        result, articles = await _page(request, Article, Article.article_id.desc())
+        return _json(
+            request,
+            "articles",
+            marshal({**result, "articles": articles}, article_pagination_model),
+        )
+    except SQLAlchemyError as e:
+        app_logger.error(f"Error while fetching articles: {str(e)}")
+        return JSONResponse(
+            {"message": f"An error occurred while fetching the article.{str(e)}"},
+            status_code=500,
+        )
+
+
+async def get_article(request):
+    """GET /article/<article_id>"""
+    article_id = request.path_params["article_id"]
+    try:
+        article, etag = await _get(request, Article, article_id)
+        if etag is None:
+            app_logger.info(f"Article with id: {article_id} not found")
+            return JSONResponse(
+                {"message": f"Article with id: {article_id} not found"}, status_code=404
+            )
+        if article is None:
+            return _not_modified(request, "articles", Article, etag)
+        return _json(
+            request,
+            "articles",
+            {"message": "Article successfully fetched.", "data": article.to_dict()},
+            etag,
+        )
+    except SQLAlchemyError as e:
+        app_logger.error(f"Error getting one article: {str(e)}")
+        return JSONResponse(
+            {"message": "An error occurred while getting the article."}, status_code=500
+        )
+
+
+async def list_brands(request):
+    """GET /brand/"""
+    try:
+        result, brands = await _page(request, Brand, Brand.brand_id.desc())
+        return _json(
+            request,
+            "brands",
+            marshal({**result, "brands": brands}, brand_pagination_model),
+        )
+    except SQLAlchemyError as e:
+        app_logger.error(f"Error while fetching brands: {str(e)}")
+        return JSONResponse(
+            {"message": f"An error occurred while fetching the brand.{str(e)}"},
+            status_code=500,
+        )
+
+
+async def get_brand(request):
+    """GET /brand/<brand_id>"""
+    brand_id = request.path_params["brand_id"]
+    try:
+        brand, etag = await _get(request, Brand, brand_id)
+        if etag is None:
+            app_logger.info(f"Brand with id: {brand_id} not found")
+            return JSONResponse(
+                {"message": f"Brand with id: {brand_id} not found"}, status_code=404
+            )
+        if brand is None:
+            return _not_modified(request, "brands", Brand, etag)
+        return _json(
+            request,
+            "brands",
+            {"message": "Brand successfully fetched.", "data": brand.to_dict()},
+            etag,
+        )
+    except SQLAlchemyError as e:
+        app_logger.error(f"Error getting one brand: {str(e)}")
+        return JSONResponse(
+            {"message": "An error occurred while getting the brand."}, status_code=500
+        )
+
+
+async def list_enrichments(request):
+    """GET /enrichmentsimweb/"""
+    try:
+        result, enrichments = await _page(
+            request, EnrichmentSimWeb, EnrichmentSimWeb.enrichment_sim_web_id.desc()
+        )
+        return _json(
+            request,
+            ENRICHMENTS_NAMESPACE,
+            {**result, "enrichment_sim_webs": [item.to_dict() for item in enrichments]},
+        )
+    except SQLAlchemyError as e:
+        app_logger.error(f"Error while fetching enrichment_sim_webs: {str(e)}")
+        return JSONResponse(
+            {
+                "message": "An error occurred while fetching the enrichment_sim_web."
+                f"{str(e)}"
+            },
+            status_code=500,
+        )
+
+
+async def get_enrichment(request):
+    """GET /enrichmentsimweb/<enrichment_sim_web_id>"""
+    enrichment_sim_web_id = request.path_params["enrichment_sim_web_id"]
+    try:
+        enrichment_sim_web, etag = await _get(
+            request, EnrichmentSimWeb, enrichment_sim_web_id
+        )
+        if etag is None:
+            app_logger.info(
+                f"EnrichmentSimWeb with id: {enrichment_sim_web_id} not found"
+            )
+            return JSONResponse(
+                {
+                    "message": f"EnrichmentSimWeb with id: {enrichment_sim_web_id} not found"
+                },
+                status_code=404,
+            )
+        if enrichment_sim_web is None:
+            return _not_modified(request, ENRICHMENTS_NAMESPACE, EnrichmentSimWeb, etag)
+        return _json(
+            request,
+            ENRICHMENTS_NAMESPACE,
+            {
+                "message": "EnrichmentSimWeb successfully fetched.",
+                "data": enrichment_sim_web.to_dict(),
+            },
+            etag,
+        )
+    except SQLAlchemyError as e:
+        app_logger.error(f"Error getting one enrichment_sim_web: {str(e)}")
+        return JSONResponse(
+            {"message": "An error occurred while getting the enrichment_sim_web."},
+            status_code=500,
+        )
+
+
+routes = [
+    Route("/article/", coalesced("articles", list_articles), methods=["GET"]),
+    Route(
+        "/article/{article_id:int}",
+        coalesced("articles", get_article),
+        methods=["GET"],
+    ),
+    Route("/brand/", coalesced("brands", list_brands), methods=["GET"]),
+    Route("/brand/{brand_id:int}", coalesced("brands", get_brand), methods=["GET"]),
+    Route(
+        "/enrichmentsimweb/",
+        coalesced(ENRICHMENTS_NAMESPACE, list_enrichments),
+        methods=["GET"],
+    ),
+    Route(
+        "/enrichmentsimweb/{enrichment_sim_web_id:int}",
+        coalesced(ENRICHMENTS_NAMESPACE, get_enrichment),
+        methods=["GET"],
+    ),
+]
@@ -0,0 +1,85 @@
+"""
+Sweeper moving running batches past their expires_at to "expired"
+
+Overdue batches are read from the partial index on expires_at, which only
+holds running batches (EXPIRABLE_STATUSES), so a sweep costs the same however
+much terminal history batch_statuses keeps. They are expired in bounded
+UPDATEs committed one by one, skipping rows another writer has locked; the
+NOTIFY trigger tells /batchstatus/watch clients about every expired batch.
+"""
+
+import time
+
+from sqlalchemy import func, select, update
+
+from app.extensions import db
+from app.logger import app_logger
+from app.utility import metrics
+
+from .models import EXPIRABLE_STATUSES, EXPIRED_STATUS, BatchStatus
+
+DEFAULT_SWEEP_BATCH_SIZE = 1000
+DEFAULT_MAX_SWEEP_BATCHES = 100
+DEFAULT_SWEEP_INTERVAL_SECONDS = 60
+
+
+def _overdue(batches):
+    return (
+        batches.c.status.in_(EXPIRABLE_STATUSES),
+        batches.c.expires_at < func.now(),
+    )
+
+
+def expire_batches(
+    batch_size=DEFAULT_SWEEP_BATCH_SIZE, max_batches=DEFAULT_MAX_SWEEP_BATCHES
+):
+    """
+    Mark overdue running batches expired, recording expired_at
+    Args:
+        batch_size (int): Batches expired per UPDATE (and transaction)
+        max_batches (int): UPDATEs per sweep, the rest waits for the next sweep
+    returns: {"expired", "remaining", "seconds"}
+    """
+    batches = BatchStatus.__table__
+    started = time.monotonic()
+    expired = 0
+    for _ in range(max_batches):
+        overdue = (
+            select(batches.c.batch_id)
+            .where(*_overdue(batches))
+            .order_by(batches.c.expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .cte("overdue")
+        )
+        batch_ids = db.session.execute(
+            update(batches)
+            .where(batches.c.batch_id == overdue.c.batch_id)
+            .values(
+                status=EXPIRED_STATUS,
+                expired_at=func.now(),
+                last_updated_at=func.now(),
+            )
+            .returning(batches.c.batch_id)
+        ).scalars().all()
+        db.session.commit()
+        expired += len(batch_ids)
+        if len(batch_ids) < batch_size:
+            break
+
+    remaining = db.session.execute(
+        select(func.count()).select_from(batches).where(*_overdue(batches))
+    ).scalar()
+    db.session.commit()
+    seconds = time.monotonic() - started
+
+    metrics.increment("batch_statuses_expired_total", expired)
+    metrics.set_gauge("batch_statuses_overdue", remaining)
+    metrics.set_gauge("batch_expiry_sweep_seconds", seconds)
+    metrics.set_gauge("batch_expiry_sweep_last_run", time.time())
+    if expired or remaining:
+        app_logger.info(
+            f"Batch expiry sweep: {expired} expired, {remaining} overdue left "
+            f"in {seconds:.3f}s"
+        )
+    return {"expired": expired, "remaining": remaining, "seconds": seconds}
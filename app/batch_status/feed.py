@@ -0,0 +1,211 @@
+"""
+Change feed of BatchStatus transitions over Postgres LISTEN/NOTIFY
+
+A trigger on batch_statuses sends a NOTIFY on CHANNEL whenever a batch is
+created, changes status or gets its results uploaded, whoever wrote the row
+(API, workers, raw SQL). Each app process keeps one LISTEN connection in a
+background thread and fans notifications out to its watchers, so any number of
+/batchstatus/watch clients cost a single database connection per process.
+
+The trigger DDL below is also what migration f1b6d2c84a09 runs, keep it
+compatible with existing databases (PostgreSQL 15+, like the rest of the app).
+"""
+
+import json
+import queue
+import select
+import threading
+
+from sqlalchemy import event
+
+from app.extensions import db
+from app.logger import app_logger
+
+from .models import BatchStatus
+
+CHANNEL = "batch_status_changes"
+LISTEN_POLL_SECONDS = 5
+LISTEN_READY_TIMEOUT_SECONDS = 5
+RECONNECT_DELAY_SECONDS = 2
+
+
+def notify_trigger_statements(batch_statuses_table):
+    """
+    DDL creating the NOTIFY trigger function and trigger
+    Args:
+        batch_statuses_table (str): Schema qualified name of the batch_statuses table
+    returns: List of SQL statements
+    """
+    function_name = f"{batch_statuses_table}_notify_change"
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {function_name}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE'
+                AND NEW.status IS NOT DISTINCT FROM OLD.status
+                AND NEW.are_results_uploaded IS NOT DISTINCT FROM OLD.are_results_uploaded
+            THEN
+                RETURN NULL;
+            END IF;
+            PERFORM pg_notify('{CHANNEL}', json_build_object(
+                'event', lower(TG_OP),
+                'batch_id', NEW.batch_id,
+                'publisher_id', NEW.publisher_id,
+                'status', NEW.status,
+                'previous_status', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END,
+                'are_results_uploaded', NEW.are_results_uploaded
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"CREATE OR REPLACE TRIGGER batch_statuses_notify_change "
+        f"AFTER INSERT OR UPDATE ON {batch_statuses_table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function_name}()",
+    ]
+
+
+def drop_notify_trigger_statements(batch_statuses_table):
+    """
+    DDL dropping what notify_trigger_statements creates
+    """
+    return [
+        f"DROP TRIGGER IF EXISTS batch_statuses_notify_change ON {batch_statuses_table}",
+        f"DROP FUNCTION IF EXISTS {batch_statuses_table}_notify_change()",
+    ]
+
+
+@event.listens_for(db.metadata, "after_create")
+def create_notify_trigger(metadata, connection, tables=(), **kw):
+    """
+    Databases created with db.create_all() (init-db) get the trigger too
+    """
+    if connection.dialect.name != "postgresql" or BatchStatus.__table__ not in tables:
+        return
+    for statement in notify_trigger_statements(BatchStatus.__table__.fullname):
+        connection.exec_driver_sql(statement)
+
+
+class Watcher:
+    """
+    Queue of the changes matching one watcher's filters
+    """
+
+    def __init__(self, publisher_id=None, statuses=None):
+        self.publisher_id = publisher_id
+        self.statuses = set(statuses) if statuses else None
+        self.changes = queue.Queue()
+
+    def matches(self, change):
+        """Whether a change passes the publisher_id and status filters"""
+        if self.publisher_id is not None and change.get("publisher_id") != self.publisher_id:
+            return False
+        if self.statuses is not None and change.get("status") not in self.statuses:
+            return False
+        return True
+
+    def get(self, timeout):
+        """Next change, or None after `timeout` seconds"""
+        try:
+            return self.changes.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Changes already queued, without waiting"""
+        changes = []
+        while True:
+            try:
+                changes.append(self.changes.get_nowait())
+            except queue.Empty:
+                return changes
+
+
+class BatchStatusFeed:
+    """
+    Process wide LISTEN connection dispatching notifications to watchers
+    """
+
+    def __init__(self):
+        self._watchers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._listening = threading.Event()
+
+    def subscribe(self, app, publisher_id=None, statuses=None):
+        """
+        Register a watcher, starting the listener thread on first use
+        returns: Watcher, to be passed to unsubscribe when done
+        """
+        watcher = Watcher(publisher_id=publisher_id, statuses=statuses)
+        with self._lock:
+            self._watchers.add(watcher)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._listen, args=(app,), daemon=True
+                )
+                self._thread.start()
+        # changes committed before LISTEN is active would be missed
+        self._listening.wait(LISTEN_READY_TIMEOUT_SECONDS)
+        return watcher
+
+    def unsubscribe(self, watcher):
+        """Stop delivering changes to a watcher"""
+        with self._lock:
+            self._watchers.discard(watcher)
+
+    def dispatch(self, change):
+        """Hand a change to every watcher whose filters match"""
+        with self._lock:
+            watchers = list(self._watchers)
+        for watcher in watchers:
+            if watcher.matches(change):
+                watcher.changes.put(change)
+
+    def _listen(self, app):
+        while True:
+            with self._lock:
+                if not self._watchers:
+                    self._thread = None
+                    return
+            try:
+                self._listen_once(app)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                app_logger.error(f"Batch status feed connection lost: {str(e)}")
+                threading.Event().wait(RECONNECT_DELAY_SECONDS)
+            finally:
+                self._listening.clear()
+
+    def _listen_once(self, app):
+        with app.app_context():
+            # dedicated connection, detached so it never goes back to the pool
+            connection = db.engine.raw_connection()
+            dbapi_connection = connection.driver_connection
+            connection.detach()
+        try:
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            self._listening.set()
+
+            while True:
+                with self._lock:
+                    if not self._watchers:
+                        return
+                ready, _, _ = select.select([dbapi_connection], [], [], LISTEN_POLL_SECONDS)
+                if not ready:
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    try:
+                        self.dispatch(json.loads(notification.payload))
+                    except ValueError:
+                        app_logger.error(
+                            f"Invalid batch status notification: {notification.payload}"
+                        )
+        finally:
+            dbapi_connection.close()
+
+
+batch_status_feed = BatchStatusFeed()
@@ -0,0 +1,55 @@
+"""
+Pluggable stores for batch input/output files
+
+A store maps the file ids kept on BatchStatus (input_file_id, output_file_id,
+error_file_id) to readable binary streams. The store used by the app is picked
+with the BATCH_FILE_STORE config, new stores are added to FILE_STORES.
+"""
+
+import os
+
+from flask import current_app
+
+
+class LocalFileStore:
+    """
+    Files stored on the local filesystem as <root>/<file_id>
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, file_id):
+        """Absolute path of a file id, refusing ids that escape the root"""
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, file_id))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Invalid file id: {file_id}")
+        return path
+
+    def open(self, file_id, offset=0):
+        """
+        Open a file for binary reading, positioned at byte `offset`
+        """
+        path = self.path(file_id)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Batch file {file_id} not found.")
+        stream = open(path, "rb")  # pylint: disable=consider-using-with
+        if offset:
+            stream.seek(offset)
+        return stream
+
+
+FILE_STORES = {
+    "local": lambda config: LocalFileStore(config["BATCH_FILE_STORE_ROOT"]),
+}
+
+
+def get_file_store():
+    """
+    File store configured for the current app
+    """
+    name = current_app.config["BATCH_FILE_STORE"]
+    if name not in FILE_STORES:
+        raise ValueError(f"Unknown batch file store: {name}")
+    return FILE_STORES[name](current_app.config)
@@ -0,0 +1,270 @@
+"""
+Queue of BatchJobs leased by concurrent workers
+
+Workers lease jobs with a single UPDATE over a SELECT ... FOR UPDATE SKIP LOCKED,
+so each one skips the rows another worker is claiming instead of waiting on
+them: adding workers adds throughput rather than lock contention. A lease lasts
+`lease_seconds` and is extended by heartbeats; a job whose worker died becomes
+available again once its lease expires. Failed jobs are retried with an
+exponential backoff until max_attempts, then marked failed.
+
+Every lease carries a random lease_token, heartbeats and results only apply
+while the token still matches, so a worker that lost its lease can't overwrite
+the outcome of the worker that took the job over.
+
+What a job does is looked up by its kind in JOB_HANDLERS.
+"""
+
+import random
+from datetime import timedelta
+
+from sqlalchemy import case, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.extensions import db
+
+from .loader import load_batch_results
+from .models import (
+    ACTIVE_JOB_STATES,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_LEASED,
+    JOB_PENDING,
+    BatchJob,
+    BatchStatus,
+)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+MAX_ERROR_LENGTH = 2000
+
+LOAD_RESULTS = "load_results"
+
+# {kind: callable(job)}, job being the dict returned by lease_jobs
+JOB_HANDLERS = {
+    LOAD_RESULTS: lambda job: load_batch_results(job["batch_id"]),
+}
+
+
+def retry_delay(attempts):
+    """
+    Backoff before the next attempt of a job that failed `attempts` times
+    Exponential from RETRY_BASE_SECONDS, capped at RETRY_MAX_SECONDS, with
+    jitter so jobs failing together don't all come back at once.
+    """
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def enqueue_job(batch_id, kind, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Add a job for a batch unless one of the same kind is already pending or leased
+    Args:
+        batch_id (str): BatchStatus the job works on
+        kind (str): Key of JOB_HANDLERS
+        max_attempts (int): Attempts before the job is marked failed
+    returns: (BatchJob, created)
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    jobs = BatchJob.__table__
+    job_id = db.session.execute(
+        pg_insert(jobs)
+        .values(batch_id=batch_id, kind=kind, max_attempts=max_attempts)
+        .on_conflict_do_nothing(
+            index_elements=["batch_id", "kind"],
+            index_where=jobs.c.state.in_(ACTIVE_JOB_STATES),
+        )
+        .returning(jobs.c.job_id)
+    ).scalar()
+    created = job_id is not None
+    if not created:
+        job_id = db.session.execute(
+            select(jobs.c.job_id).where(
+                jobs.c.batch_id == batch_id,
+                jobs.c.kind == kind,
+                jobs.c.state.in_(ACTIVE_JOB_STATES),
+            )
+        ).scalar_one()
+    db.session.commit()
+    return db.session.get(BatchJob, job_id), created
+
+
+def enqueue_result_loads():
+    """
+    Queue a results load for every completed batch whose output isn't uploaded yet
+    returns: Number of jobs added
+    """
+    jobs = BatchJob.__table__
+    batches = BatchStatus.__table__
+    result = db.session.execute(
+        pg_insert(jobs)
+        .from_select(
+            ["batch_id", "kind"],
+            select(batches.c.batch_id, db.literal(LOAD_RESULTS)).where(
+                batches.c.status == "completed",
+                batches.c.output_file_id.is_not(None),
+                db.func.coalesce(batches.c.are_results_uploaded, False).is_(False),
+            ),
+        )
+        .on_conflict_do_nothing(
+            index_elements=["batch_id", "kind"],
+            index_where=jobs.c.state.in_(ACTIVE_JOB_STATES),
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def lease_jobs(worker_id, limit=1, lease_seconds=DEFAULT_LEASE_SECONDS, kinds=None):
+    """
+    Atomically lease up to `limit` available jobs
+    Jobs are available when pending and due, or leased with an expired lease.
+    An expired job that already used all its attempts is marked failed instead.
+    Args:
+        worker_id (str): Recorded as leased_by
+        limit (int): Maximum number of jobs to lease
+        lease_seconds (int): Lease duration, extended by heartbeat
+        kinds (list): Only lease jobs of these kinds, all when None
+    returns: List of {"job_id", "batch_id", "kind", "attempts", "max_attempts", "lease_token"}
+    """
+    jobs = BatchJob.__table__
+    lease = timedelta(seconds=lease_seconds)
+    candidates = (
+        select(jobs.c.job_id)
+        .where(
+            jobs.c.state.in_(ACTIVE_JOB_STATES),
+            jobs.c.available_at <= db.func.now(),
+        )
+        .order_by(jobs.c.available_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    if kinds:
+        candidates = candidates.where(jobs.c.kind.in_(kinds))
+    candidates = candidates.cte("candidates")
+
+    exhausted = jobs.c.attempts >= jobs.c.max_attempts
+    rows = db.session.execute(
+        update(jobs)
+        .where(jobs.c.job_id == candidates.c.job_id)
+        .values(
+            state=case((exhausted, JOB_FAILED), else_=JOB_LEASED),
+            attempts=case((exhausted, jobs.c.attempts), else_=jobs.c.attempts + 1),
+            # a job failed here isn't leased by anyone
+            leased_by=case((exhausted, None), else_=worker_id),
+            lease_token=case(
+                (exhausted, None), else_=db.cast(db.func.gen_random_uuid(), db.Text)
+            ),
+            lease_expires_at=case((exhausted, None), else_=db.func.now() + lease),
+            available_at=db.func.now() + lease,
+            heartbeat_at=db.func.now(),
+            last_error=case(
+                (exhausted, "Lease expired after the last attempt."),
+                else_=jobs.c.last_error,
+            ),
+            finished_at=case((exhausted, db.func.now()), else_=None),
+            last_updated_at=db.func.now(),
+        )
+        .returning(
+            jobs.c.job_id,
+            jobs.c.batch_id,
+            jobs.c.kind,
+            jobs.c.state,
+            jobs.c.attempts,
+            jobs.c.max_attempts,
+            jobs.c.lease_token,
+        )
+    ).mappings().all()
+    db.session.commit()
+    return [
+        {key: value for key, value in row.items() if key != "state"}
+        for row in rows
+        if row["state"] == JOB_LEASED
+    ]
+
+
+def heartbeat(lease_tokens, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Extend the leases still held by a worker, in one statement
+    returns: Set of the lease tokens that are still valid
+    """
+    if not lease_tokens:
+        return set()
+    jobs = BatchJob.__table__
+    lease = timedelta(seconds=lease_seconds)
+    held = db.session.execute(
+        update(jobs)
+        .where(jobs.c.lease_token.in_(list(lease_tokens)), jobs.c.state == JOB_LEASED)
+        .values(
+            lease_expires_at=db.func.now() + lease,
+            available_at=db.func.now() + lease,
+            heartbeat_at=db.func.now(),
+        )
+        .returning(jobs.c.lease_token)
+    ).scalars().all()
+    db.session.commit()
+    return set(held)
+
+
+def complete_job(job_id, lease_token):
+    """
+    Mark a leased job done
+    returns: False when the lease was lost in the meantime
+    """
+    jobs = BatchJob.__table__
+    result = db.session.execute(
+        update(jobs)
+        .where(
+            jobs.c.job_id == job_id,
+            jobs.c.lease_token == lease_token,
+            jobs.c.state == JOB_LEASED,
+        )
+        .values(
+            state=JOB_DONE,
+            leased_by=None,
+            lease_token=None,
+            lease_expires_at=None,
+            finished_at=db.func.now(),
+            last_updated_at=db.func.now(),
+        )
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def fail_job(job_id, lease_token, error, attempts, max_attempts):
+    """
+    Record a failed attempt, scheduling a retry or marking the job failed
+    returns: New state of the job, or None when the lease was lost in the meantime
+    """
+    jobs = BatchJob.__table__
+    final = attempts >= max_attempts
+    values = {
+        "state": JOB_FAILED if final else JOB_PENDING,
+        "leased_by": None,
+        "lease_token": None,
+        "lease_expires_at": None,
+        "last_error": str(error)[:MAX_ERROR_LENGTH],
+        "last_updated_at": db.func.now(),
+    }
+    if final:
+        values["finished_at"] = db.func.now()
+    else:
+        values["available_at"] = db.func.now() + retry_delay(attempts)
+    result = db.session.execute(
+        update(jobs)
+        .where(
+            jobs.c.job_id == job_id,
+            jobs.c.lease_token == lease_token,
+            jobs.c.state == JOB_LEASED,
+        )
+        .values(values)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return None
+    return values["state"]
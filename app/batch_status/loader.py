@@ -0,0 +1,202 @@
+"""
+Loader turning the output file of a completed batch into sentiments
+
+The output file is JSONL, one line per batch request, either in the batch API
+format ({"custom_id", "response": {"status_code", "body": {"choices": [{"message":
+{"content": <sentiment JSON>}}]}}, "error"}) or as plain sentiment objects.
+publisher/article/brand ids found in custom_id (e.g. "article-12_brand-7")
+take precedence over the ones in the content.
+
+The file is streamed and loaded in blocks. Each block of sentiments is inserted
+in the same transaction that advances the line/byte offsets stored on the
+BatchStatus (and, for the last block, sets are_results_uploaded), so a crashed
+load resumes right after the last committed block. A restart deletes the
+sentiments of the batch in the transaction of its first block, so loading a
+batch again never duplicates them.
+"""
+
+import json
+import re
+
+from sqlalchemy import delete, update
+
+from app.extensions import db
+from app.logger import app_logger
+from app.sentiment.ingest import SentimentIngestResult, ingest_sentiments
+from app.sentiment.models import Sentiment
+
+from .file_store import get_file_store
+from .models import BatchStatus
+
+LOAD_BLOCK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+_CUSTOM_ID_PATTERN = re.compile(r"(publisher|article|brand)[_:-]?(\d+)", re.IGNORECASE)
+
+
+def ids_from_custom_id(custom_id):
+    """
+    Extract {"<entity>_id": int} pairs from a batch request custom_id
+    """
+    if not custom_id:
+        return {}
+    return {
+        f"{entity.lower()}_id": int(value)
+        for entity, value in _CUSTOM_ID_PATTERN.findall(str(custom_id))
+    }
+
+
+def normalize_output_row(row):
+    """
+    Normalize the keys of a sentiment produced by a batch request
+    Label values are normalized by the ingest itself.
+    """
+    return {str(key).strip().lower().replace(" ", "_"): value for key, value in row.items()}
+
+
+def parse_output_line(line):
+    """
+    Parse one line of a batch output file into a raw sentiment row
+    Raises ValueError when the line is not valid JSON or the request failed
+    """
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise ValueError("Line is not valid JSON.") from e
+    if not isinstance(record, dict):
+        raise ValueError("Line should be a JSON object.")
+
+    if "response" not in record and "custom_id" not in record:
+        return normalize_output_row(record)
+
+    custom_id = record.get("custom_id")
+    if record.get("error"):
+        raise ValueError(f"Request {custom_id} failed: {record['error']}")
+    response = record.get("response") or {}
+    if response.get("status_code") != 200:
+        raise ValueError(
+            f"Request {custom_id} returned status {response.get('status_code')}."
+        )
+    try:
+        content = response["body"]["choices"][0]["message"]["content"]
+        row = json.loads(content) if isinstance(content, str) else content
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise ValueError(f"Request {custom_id} has no sentiment content.") from e
+    if not isinstance(row, dict):
+        raise ValueError(f"Request {custom_id} content should be a JSON object.")
+
+    return {**normalize_output_row(row), **ids_from_custom_id(custom_id)}
+
+
+def load_batch_results(batch_id, block_size=LOAD_BLOCK_SIZE, restart=False):
+    """
+    Load the output file of a batch into sentiments, resuming where the last run stopped
+    Args:
+        batch_id (str): BatchStatus to load
+        block_size (int): Lines inserted and committed per transaction
+        restart (bool): Start again from the first line, replacing the rows already loaded
+    returns: {"batch_id", "inserted", "deleted", "failed", "errors", "line_offset",
+        "are_results_uploaded"}
+    """
+    batch = db.session.get(BatchStatus, batch_id)
+    if batch is None:
+        raise ValueError(f"BatchStatus with ID {batch_id} not found.")
+    if not batch.output_file_id:
+        raise ValueError(f"BatchStatus {batch_id} has no output file yet.")
+
+    summary = {
+        "batch_id": batch_id,
+        "inserted": 0,
+        "deleted": 0,
+        "failed": 0,
+        "errors": [],
+        "line_offset": batch.results_line_offset,
+        "are_results_uploaded": bool(batch.are_results_uploaded),
+    }
+    if batch.are_results_uploaded and not restart:
+        return summary
+
+    line_offset = 0 if restart else batch.results_line_offset
+    byte_offset = 0 if restart else batch.results_byte_offset
+    committed_line_offset = batch.results_line_offset
+    publisher_id = batch.publisher_id
+    output_file_id = batch.output_file_id
+    db.session.commit()
+
+    replace = restart
+
+    def commit_block(block, final):
+        nonlocal committed_line_offset, replace
+        if replace:
+            deleted = db.session.execute(
+                delete(Sentiment.__table__).where(
+                    Sentiment.__table__.c.batch_id == batch_id
+                )
+            )
+            summary["deleted"] = deleted.rowcount
+        result = SentimentIngestResult()
+        valid_rows = []
+        for index, row in block:
+            if isinstance(row, ValueError):
+                result.add_error(index, str(row))
+            else:
+                valid_rows.append((index, row))
+        ingest_sentiments(valid_rows, result=result)
+
+        # only advance from the offset we resumed at, a concurrent load of the
+        # same batch makes this match nothing
+        progress = db.session.execute(
+            update(BatchStatus.__table__)
+            .where(
+                BatchStatus.__table__.c.batch_id == batch_id,
+                BatchStatus.__table__.c.results_line_offset == committed_line_offset,
+            )
+            .values(
+                results_line_offset=line_offset,
+                results_byte_offset=byte_offset,
+                are_results_uploaded=final,
+            )
+        )
+        if progress.rowcount != 1:
+            db.session.rollback()
+            raise RuntimeError(
+                f"BatchStatus {batch_id} is being loaded by another run."
+            )
+        db.session.commit()
+        committed_line_offset = line_offset
+        replace = False
+
+        summary["inserted"] += len(result.created)
+        summary["failed"] += len(result.errors)
+        remaining = MAX_REPORTED_ERRORS - len(summary["errors"])
+        if remaining > 0:
+            summary["errors"].extend(result.to_dict()["errors"][:remaining])
+        app_logger.info(
+            f"Loaded batch {batch_id} up to line {line_offset}: "
+            f"{len(result.created)} inserted, {len(result.errors)} failed"
+        )
+
+    block = []
+    with get_file_store().open(output_file_id, offset=byte_offset) as stream:
+        for raw_line in stream:
+            index = line_offset
+            line_offset += 1
+            byte_offset += len(raw_line)
+            if not raw_line.strip():
+                continue
+            try:
+                row = parse_output_line(raw_line)
+                row["batch_id"] = batch_id
+                if row.get("publisher_id") is None:
+                    row["publisher_id"] = publisher_id
+            except ValueError as e:
+                row = ValueError(f"Line {index}: {e}")
+            block.append((index, row))
+            if len(block) >= block_size:
+                commit_block(block, final=False)
+                block = []
+    commit_block(block, final=True)
+
+    summary["line_offset"] = line_offset
+    summary["are_results_uploaded"] = True
+    return summary
@@ -4,8 +4,16 @@ BatchStatus model
 
 # pylint: disable=too-many-arguments
 
+from datetime import datetime
+
 from app.extensions import db
 
+# Statuses of a batch still running at its provider, the ones that can expire.
+# Also the predicate of ix_batch_statuses_expirable_expires_at: changing them
+# needs a migration re-creating the index (see d83f5a1c9e27)
+EXPIRABLE_STATUSES = ("validating", "in_progress", "finalizing")
+EXPIRED_STATUS = "expired"
+
 
 class BatchStatus(db.Model):
     """
@@ -14,6 +22,18 @@ class BatchStatus(db.Model):
     """
 
     __tablename__ = "batch_statuses"
+    __table_args__ = (
+        # only running batches are indexed, terminal history never is
+        db.Index(
+            "ix_batch_statuses_expirable_expires_at",
+            "expires_at",
+            postgresql_where=db.text(
+                "status IN ("
+                + ", ".join(f"'{status}'" for status in EXPIRABLE_STATUSES)
+                + ")"
+            ),
+        ),
+    )
 
     batch_id = db.Column(db.Text, primary_key=True)
 
@@ -45,6 +65,13 @@ class BatchStatus(db.Model):
     set_metadata = db.Column(db.JSON, nullable=True)
     batch_type = db.Column(db.Text)
     are_results_uploaded = db.Column(db.Boolean, default=False)
+    # progress of the output file loader, committed with every block of sentiments
+    results_line_offset = db.Column(
+        db.BigInteger, nullable=False, default=0, server_default="0"
+    )
+    results_byte_offset = db.Column(
+        db.BigInteger, nullable=False, default=0, server_default="0"
+    )
 
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     last_updated_at = db.Column(
@@ -73,7 +100,10 @@ class BatchStatus(db.Model):
         set_metadata=None,
         batch_type=None,
         are_results_uploaded=None,
+        batch_id=None,
     ):
+        if batch_id:
+            self.batch_id = batch_id
         if publisher_id:
             self.publisher_id = publisher_id
         if object_type:
@@ -114,3 +144,93 @@ class BatchStatus(db.Model):
             self.batch_type = batch_type
         if are_results_uploaded:
             self.are_results_uploaded = are_results_uploaded
+
+    def to_dict(self):
+        """
+        To convert class object to required python dictionary
+        returns: BatchStatus in python dictionary
+        """
+        data = {
+            column.name: getattr(self, column.name)
+            for column in self.__table__.columns
+        }
+        for name, value in data.items():
+            if isinstance(value, datetime):
+                data[name] = value.isoformat()
+        return data
+
+
+# BatchJob states, pending and leased jobs are the ones workers can pick up
+JOB_PENDING = "pending"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+ACTIVE_JOB_STATES = (JOB_PENDING, JOB_LEASED)
+
+
+class BatchJob(db.Model):
+    """
+    Unit of work on a batch (submit it, collect its results, ...)
+    Leased by workers with SELECT ... FOR UPDATE SKIP LOCKED, see app/batch_status/jobs.py.
+    available_at is when the job can next be picked up: its retry time while
+    pending, its lease expiry while leased.
+    """
+
+    __tablename__ = "batch_jobs"
+    __table_args__ = (
+        db.Index(
+            "ix_batch_jobs_active_available_at",
+            "available_at",
+            postgresql_where=db.text("state IN ('pending', 'leased')"),
+        ),
+        # one active job per batch and kind, enqueueing twice is a no-op
+        db.Index(
+            "uq_batch_jobs_active_batch_id_kind",
+            "batch_id",
+            "kind",
+            unique=True,
+            postgresql_where=db.text("state IN ('pending', 'leased')"),
+        ),
+    )
+
+    job_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    batch_id = db.Column(
+        db.Text,
+        db.ForeignKey("batch_statuses.batch_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    kind = db.Column(db.Text, nullable=False)
+    state = db.Column(
+        db.Text, nullable=False, default=JOB_PENDING, server_default=JOB_PENDING
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    max_attempts = db.Column(db.Integer, nullable=False, default=5, server_default="5")
+    available_at = db.Column(
+        db.DateTime, nullable=False, server_default=db.func.now()
+    )
+    leased_by = db.Column(db.Text)
+    lease_token = db.Column(db.Text)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    last_updated_at = db.Column(
+        db.DateTime, server_default=db.func.now(), onupdate=db.func.now()
+    )
+
+    def to_dict(self):
+        """
+        To convert class object to required python dictionary
+        returns: BatchJob in python dictionary
+        """
+        data = {
+            column.name: getattr(self, column.name)
+            for column in self.__table__.columns
+            if column.name != "lease_token"
+        }
+        for name, value in data.items():
+            if isinstance(value, datetime):
+                data[name] = value.isoformat()
+        return data
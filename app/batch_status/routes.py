@@ -2,13 +2,529 @@
 API Routes for BatchStatus
 """
 
-from flask_restx import Namespace
+import json
+import time
 
-from .models import BatchStatus
+from flask import Response, current_app, request, stream_with_context
+from flask_restx import Namespace, Resource, fields
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import SQLAlchemyError
 
-# from app.extensions import db
+from app.extensions import db
+from app.logger import app_logger
+from app.publisher.models import Publisher
+from app.sentiment.models import Sentiment
+from app.utility.utils import parse_datetime
 
+from .feed import batch_status_feed
+from .jobs import DEFAULT_MAX_ATTEMPTS, JOB_HANDLERS, enqueue_job
+from .models import BatchJob, BatchStatus
 
 batch_status_ns = Namespace(
     "batch_statuses", description="Batch status related operations"
 )
+
+# Columns a client may set, everything else is managed by the app
+UPDATABLE_FIELDS = [
+    "publisher_id",
+    "object_type",
+    "endpoint",
+    "errors",
+    "input_file_id",
+    "completion_window",
+    "status",
+    "output_file_id",
+    "error_file_id",
+    "in_progress_at",
+    "expires_at",
+    "completed_at",
+    "failed_at",
+    "expired_at",
+    "request_total",
+    "request_completed",
+    "request_failed",
+    "set_metadata",
+    "batch_type",
+    "are_results_uploaded",
+]
+DATETIME_FIELDS = {
+    "in_progress_at",
+    "expires_at",
+    "completed_at",
+    "failed_at",
+    "expired_at",
+}
+
+MAX_BULK_UPDATES = 1000
+DEFAULT_WATCH_TIMEOUT = 30
+MAX_WATCH_TIMEOUT = 60
+SSE_KEEPALIVE_SECONDS = 15
+
+batch_status_model = batch_status_ns.model(
+    "BatchStatus",
+    {
+        "batch_id": fields.String(required=True, description="The ID of the batch"),
+        "publisher_id": fields.Integer(
+            required=True, description="The ID of the publisher"
+        ),
+        "object_type": fields.String(),
+        "endpoint": fields.String(),
+        "errors": fields.String(),
+        "input_file_id": fields.String(),
+        "completion_window": fields.String(),
+        "status": fields.String(description="Status of the batch"),
+        "output_file_id": fields.String(),
+        "error_file_id": fields.String(),
+        "in_progress_at": fields.DateTime(),
+        "expires_at": fields.DateTime(),
+        "completed_at": fields.DateTime(),
+        "failed_at": fields.DateTime(),
+        "expired_at": fields.DateTime(),
+        "request_total": fields.Integer(),
+        "request_completed": fields.Integer(),
+        "request_failed": fields.Integer(),
+        "set_metadata": fields.Raw(),
+        "batch_type": fields.String(),
+        "are_results_uploaded": fields.Boolean(),
+        "created_at": fields.DateTime(readonly=True),
+        "last_updated_at": fields.DateTime(readonly=True),
+    },
+)
+
+batch_job_model = batch_status_ns.model(
+    "BatchJob",
+    {
+        "kind": fields.String(
+            required=True, enum=list(JOB_HANDLERS), description="What the job does"
+        ),
+        "max_attempts": fields.Integer(
+            default=DEFAULT_MAX_ATTEMPTS, description="Attempts before the job fails"
+        ),
+    },
+)
+
+
+def clean_batch_status_data(data):
+    """
+    Keep the updatable fields of a request body, parsing datetimes
+    Raises ValueError on unknown fields, invalid datetimes or publisher ids
+    """
+    unknown = [key for key in data if key not in UPDATABLE_FIELDS and key != "batch_id"]
+    if unknown:
+        raise ValueError(f"Unknown BatchStatus attributes: {', '.join(unknown)}")
+
+    values = {}
+    for key in UPDATABLE_FIELDS:
+        if key not in data:
+            continue
+        value = data[key]
+        if key == "publisher_id" and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f"publisher_id should be an integer: {value}")
+        if key in DATETIME_FIELDS and value is not None:
+            try:
+                value = parse_datetime(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{key} should be an ISO-8601 datetime: {value}") from e
+        values[key] = value
+    return values
+
+
+def get_watch_filters():
+    """
+    publisher_id and statuses of a watch request
+    """
+    statuses = [
+        status.strip()
+        for status in request.args.get("status", "").split(",")
+        if status.strip()
+    ]
+    return request.args.get("publisher_id", type=int), statuses or None
+
+
+@batch_status_ns.route("/")
+class BatchStatusListResource(Resource):
+    """
+    Endpoints related to BatchStatus without ID param
+    """
+
+    @batch_status_ns.doc(
+        params={
+            "page": "Page number",
+            "page_size": "Number of batches per page",
+            "publisher_id": "Filter by publisher",
+            "status": "Filter by status (comma separated)",
+        }
+    )
+    def get(self):
+        """Get a list of batch statuses with pagination"""
+        try:
+            page_number = request.args.get("page", 1, type=int)
+            page_size = request.args.get("page_size", 10, type=int)
+            publisher_id, statuses = get_watch_filters()
+
+            query = BatchStatus.query.order_by(BatchStatus.created_at.desc())
+            if publisher_id is not None:
+                query = query.filter(BatchStatus.publisher_id == publisher_id)
+            if statuses:
+                query = query.filter(BatchStatus.status.in_(statuses))
+            pagination = query.paginate(
+                page=page_number, per_page=page_size, error_out=False
+            )
+
+            return {
+                "first_page_number": 1,
+                "last_page_number": pagination.pages,
+                "total_items": pagination.total,
+                "total_pages": pagination.pages,
+                "current_page": page_number,
+                "batch_statuses": [batch.to_dict() for batch in pagination.items],
+            }, 200
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error while fetching batch statuses: {str(e)}")
+            return {
+                "message": f"An error occurred while fetching batch statuses.{str(e)}"
+            }, 500
+
+    @batch_status_ns.expect(batch_status_model)
+    @batch_status_ns.response(201, "BatchStatus successfully created.")
+    @batch_status_ns.response(400, "Validation Error.")
+    @batch_status_ns.response(409, "BatchStatus already exists.")
+    def post(self):
+        """Create a new batch status"""
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {"message": "Input data should be an object of attributes."}, 400
+
+        try:
+            if not data.get("batch_id") or not data.get("publisher_id"):
+                return {"message": "batch_id and publisher_id are required."}, 400
+            try:
+                values = clean_batch_status_data(data)
+            except ValueError as e:
+                return {"message": str(e)}, 400
+
+            if db.session.get(BatchStatus, data["batch_id"]):
+                return {
+                    "message": f"BatchStatus with ID {data['batch_id']} already exists."
+                }, 409
+            if not db.session.get(Publisher, values["publisher_id"]):
+                return {
+                    "message": f"Publisher with ID {values['publisher_id']} not found."
+                }, 404
+
+            new_batch_status = BatchStatus(batch_id=data["batch_id"], **values)
+            db.session.add(new_batch_status)
+            db.session.commit()
+            return {
+                "message": "BatchStatus successfully created.",
+                "data": new_batch_status.to_dict(),
+            }, 201
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error creating batch status: {str(e)}")
+            return {"message": "An error occurred while creating the batch status."}, 500
+
+
+@batch_status_ns.route("/bulk")
+class BatchStatusBulkResource(Resource):
+    """
+    Endpoint to update many batch statuses at once
+    """
+
+    @batch_status_ns.expect([batch_status_model], validate=False)
+    @batch_status_ns.response(200, "BatchStatuses successfully updated.")
+    @batch_status_ns.response(400, "Validation Error.")
+    def patch(self):
+        """Update several batch statuses, each item identified by its batch_id"""
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return {"message": "Input data should be a list of batch statuses."}, 400
+        if len(data) > MAX_BULK_UPDATES:
+            return {
+                "message": f"You can update a maximum of {MAX_BULK_UPDATES} batch statuses at a time."
+            }, 400
+
+        rows = []
+        skipped = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict) or not item.get("batch_id"):
+                return {"message": f"Item {index} has no batch_id."}, 400
+            try:
+                values = clean_batch_status_data(item)
+            except ValueError as e:
+                return {"message": f"Item {index}: {str(e)}"}, 400
+            if values:
+                rows.append({"batch_id": item["batch_id"], **values})
+            else:
+                skipped.append(item["batch_id"])
+
+        try:
+            # checked up front, an unknown publisher would fail the whole UPDATE
+            publisher_ids = {
+                row["publisher_id"] for row in rows if row.get("publisher_id") is not None
+            }
+            if publisher_ids:
+                publisher_key = Publisher.__table__.c.publisher_id
+                missing_publishers = publisher_ids - set(
+                    db.session.execute(
+                        select(publisher_key).where(publisher_key.in_(publisher_ids))
+                    ).scalars()
+                )
+                if missing_publishers:
+                    return {
+                        "message": "Publishers not found: "
+                        + ", ".join(str(key) for key in sorted(missing_publishers))
+                    }, 400
+
+            table = BatchStatus.__table__
+            requested = {row["batch_id"] for row in rows}
+            existing = set(
+                db.session.execute(
+                    select(table.c.batch_id).where(table.c.batch_id.in_(requested))
+                ).scalars()
+            )
+            rows = [row for row in rows if row["batch_id"] in existing]
+
+            # one UPDATE per distinct set of columns, executed as executemany
+            by_columns = {}
+            for row in rows:
+                by_columns.setdefault(tuple(sorted(row)), []).append(row)
+            for columns, group in by_columns.items():
+                statement = (
+                    update(table)
+                    .where(table.c.batch_id == db.bindparam("key_batch_id"))
+                    .values(
+                        {
+                            **{
+                                column: db.bindparam(column)
+                                for column in columns
+                                if column != "batch_id"
+                            },
+                            "last_updated_at": db.func.now(),
+                        }
+                    )
+                )
+                db.session.execute(
+                    statement,
+                    [{**row, "key_batch_id": row["batch_id"]} for row in group],
+                )
+            db.session.commit()
+            return {
+                "message": f"{len(rows)} batch statuses successfully updated.",
+                "updated": sorted(row["batch_id"] for row in rows),
+                "not_found": sorted(requested - existing),
+                # items without any updatable field
+                "skipped": sorted(set(skipped)),
+            }, 200
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error updating batch statuses in bulk: {str(e)}")
+            return {
+                "message": f"An error occurred while updating batch statuses.{str(e)}"
+            }, 500
+
+
+@batch_status_ns.route("/watch")
+class BatchStatusWatchResource(Resource):
+    """
+    Change feed of batch status transitions
+    Long-polls by default: returns as soon as matching changes arrive, or an
+    empty list after `timeout` seconds. With Accept: text/event-stream the
+    changes are streamed as Server-Sent Events instead.
+    """
+
+    @batch_status_ns.doc(
+        params={
+            "publisher_id": "Only changes of this publisher",
+            "status": "Only changes into these statuses (comma separated)",
+            "timeout": f"Long-poll timeout in seconds (max {MAX_WATCH_TIMEOUT})",
+        }
+    )
+    def get(self):
+        """Wait for batch status changes"""
+        publisher_id, statuses = get_watch_filters()
+        app = current_app._get_current_object()  # pylint: disable=protected-access
+        watcher = batch_status_feed.subscribe(
+            app, publisher_id=publisher_id, statuses=statuses
+        )
+
+        if request.accept_mimetypes.best == "text/event-stream":
+
+            def stream_changes():
+                try:
+                    yield ": watching batch statuses\n\n"
+                    while True:
+                        change = watcher.get(timeout=SSE_KEEPALIVE_SECONDS)
+                        if change is None:
+                            yield ": keep-alive\n\n"
+                            continue
+                        yield f"event: batch_status\ndata: {json.dumps(change)}\n\n"
+                finally:
+                    batch_status_feed.unsubscribe(watcher)
+
+            return Response(
+                stream_with_context(stream_changes()),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        try:
+            timeout = min(
+                request.args.get("timeout", DEFAULT_WATCH_TIMEOUT, type=float),
+                MAX_WATCH_TIMEOUT,
+            )
+            deadline = time.monotonic() + timeout
+            changes = []
+            first = watcher.get(timeout=max(timeout, 0))
+            if first is not None:
+                changes.append(first)
+                # give changes committed together a moment to arrive in one response
+                time.sleep(min(0.05, max(deadline - time.monotonic(), 0)))
+                changes.extend(watcher.drain())
+            return {"changes": changes}, 200
+        finally:
+            batch_status_feed.unsubscribe(watcher)
+
+
+@batch_status_ns.route("/<string:batch_id>")
+class BatchStatusResource(Resource):
+    """
+    Endpoints related to BatchStatus with ID param
+    """
+
+    @batch_status_ns.response(404, "BatchStatus not found.")
+    def get(self, batch_id):
+        """Get a batch status by its ID"""
+        try:
+            batch_status = db.session.get(BatchStatus, batch_id)
+            if not batch_status:
+                return {"message": f"BatchStatus with id: {batch_id} not found"}, 404
+            return {
+                "message": "BatchStatus successfully fetched.",
+                "data": batch_status.to_dict(),
+            }, 200
+        except SQLAlchemyError as e:
+            app_logger.error(f"Error getting one batch status: {str(e)}")
+            return {"message": "An error occurred while getting the batch status."}, 500
+
+    @batch_status_ns.expect(batch_status_model, validate=False)
+    @batch_status_ns.response(200, "BatchStatus successfully updated.")
+    @batch_status_ns.response(400, "Validation Error.")
+    @batch_status_ns.response(404, "BatchStatus not found.")
+    def put(self, batch_id):
+        """Update a batch status by its ID"""
+        try:
+            batch_status = db.session.get(BatchStatus, batch_id)
+            if not batch_status:
+                return {"message": f"BatchStatus with id: {batch_id} not found"}, 404
+
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return {"message": "Input data should be an object of attributes."}, 400
+            try:
+                values = clean_batch_status_data(data)
+            except ValueError as e:
+                return {"message": str(e)}, 400
+            if "publisher_id" in values and not db.session.get(
+                Publisher, values["publisher_id"]
+            ):
+                return {
+                    "message": f"Publisher with ID {values['publisher_id']} not found."
+                }, 404
+
+            for key, value in values.items():
+                setattr(batch_status, key, value)
+            db.session.commit()
+            return {
+                "message": "BatchStatus successfully updated.",
+                "data": batch_status.to_dict(),
+            }, 200
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error updating batch status {batch_id}: {str(e)}")
+            return {
+                "message": f"An error occurred while updating the batch status.{str(e)}"
+            }, 500
+
+    @batch_status_ns.response(200, "BatchStatus successfully deleted.")
+    @batch_status_ns.response(404, "BatchStatus not found.")
+    def delete(self, batch_id):
+        """Delete a batch status by its ID"""
+        try:
+            batch_status = db.session.get(BatchStatus, batch_id)
+            if not batch_status:
+                return {"message": f"BatchStatus with id: {batch_id} not found"}, 404
+
+            # sentiments keep their rows, only the link to the batch goes away;
+            # set-based so a large batch isn't loaded through the relationship
+            sentiments = Sentiment.__table__
+            db.session.execute(
+                update(sentiments)
+                .where(sentiments.c.batch_id == batch_id)
+                .values(batch_id=None)
+            )
+            db.session.execute(
+                delete(BatchStatus.__table__).where(
+                    BatchStatus.__table__.c.batch_id == batch_id
+                )
+            )
+            db.session.commit()
+            return {"message": "BatchStatus successfully deleted."}, 200
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error deleting batch status {batch_id}: {str(e)}")
+            return {
+                "message": f"An error occurred while deleting the batch status.{str(e)}"
+            }, 500
+
+
+@batch_status_ns.route("/<string:batch_id>/jobs")
+class BatchJobListResource(Resource):
+    """
+    Jobs queued for a batch, run by `flask batch-worker`
+    """
+
+    @batch_status_ns.response(404, "BatchStatus not found.")
+    def get(self, batch_id):
+        """List the jobs of a batch, latest first"""
+        try:
+            if not db.session.get(BatchStatus, batch_id):
+                return {"message": f"BatchStatus with id: {batch_id} not found"}, 404
+            batch_jobs = db.session.scalars(
+                select(BatchJob)
+                .where(BatchJob.batch_id == batch_id)
+                .order_by(BatchJob.job_id.desc())
+            ).all()
+            return {
+                "message": "BatchJobs successfully fetched.",
+                "data": [job.to_dict() for job in batch_jobs],
+            }, 200
+        except SQLAlchemyError as e:
+            app_logger.error(f"Error getting jobs of batch {batch_id}: {str(e)}")
+            return {"message": "An error occurred while getting the batch jobs."}, 500
+
+    @batch_status_ns.expect(batch_job_model)
+    @batch_status_ns.response(201, "BatchJob successfully queued.")
+    @batch_status_ns.response(200, "BatchJob already queued.")
+    @batch_status_ns.response(404, "BatchStatus not found.")
+    def post(self, batch_id):
+        """Queue a job for a batch, unless the same kind is already pending or running"""
+        try:
+            if not db.session.get(BatchStatus, batch_id):
+                return {"message": f"BatchStatus with id: {batch_id} not found"}, 404
+            data = request.json
+            job, created = enqueue_job(
+                batch_id,
+                data["kind"],
+                max_attempts=data.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            )
+            if not created:
+                return {"message": "BatchJob already queued.", "data": job.to_dict()}, 200
+            return {"message": "BatchJob successfully queued.", "data": job.to_dict()}, 201
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error queueing job for batch {batch_id}: {str(e)}")
+            return {"message": "An error occurred while queueing the batch job."}, 500
@@ -0,0 +1,182 @@
+"""
+Worker process running leased BatchJobs on a thread pool
+
+Each pool thread loops on lease -> run -> complete/fail, one job at a time,
+with its own app context (hence its own session and pooled connection). A
+single heartbeat thread extends the leases of all the jobs the process holds
+with one UPDATE, so a long job keeps its lease and a dead process loses all of
+its leases after `lease_seconds`. Every `sweep_interval` seconds another thread
+runs the expiry sweeper, overlapping sweeps of several workers skip each
+other's rows.
+"""
+
+import os
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.extensions import db
+from app.logger import app_logger
+
+from . import jobs
+from .expiry import DEFAULT_SWEEP_INTERVAL_SECONDS, expire_batches
+
+DEFAULT_THREADS = 4
+DEFAULT_POLL_SECONDS = 5
+
+
+class BatchWorker:
+    """
+    Pool of threads leasing and running BatchJobs until stopped
+    """
+
+    def __init__(
+        self,
+        app,
+        threads=DEFAULT_THREADS,
+        lease_seconds=jobs.DEFAULT_LEASE_SECONDS,
+        poll_interval=DEFAULT_POLL_SECONDS,
+        kinds=None,
+        sweep_interval=DEFAULT_SWEEP_INTERVAL_SECONDS,
+    ):
+        self.app = app
+        self.threads = threads
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.kinds = list(kinds) if kinds else None
+        self.sweep_interval = sweep_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats = {"done": 0, "retried": 0, "failed": 0, "lost": 0}
+        self._held = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        # heartbeats go on while running jobs finish after stop()
+        self._finished = threading.Event()
+
+    def stop(self, *_):
+        """Finish the running jobs, then exit"""
+        if not self._stopping.is_set():
+            app_logger.info(f"Batch worker {self.worker_id} stopping")
+        self._stopping.set()
+
+    def run(self, once=False):
+        """
+        Run until stopped (SIGINT/SIGTERM), or until no job is available when `once`
+        returns: {"done", "retried", "failed", "lost"} job counts
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        app_logger.info(
+            f"Batch worker {self.worker_id} started with {self.threads} threads"
+        )
+        heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        heartbeat.start()
+        if self.sweep_interval and not once:
+            threading.Thread(target=self._sweep_loop, daemon=True).start()
+        with ThreadPoolExecutor(
+            max_workers=self.threads, thread_name_prefix="batch-worker"
+        ) as executor:
+            loops = [executor.submit(self._work_loop, once) for _ in range(self.threads)]
+            for loop in loops:
+                loop.result()
+        self._finished.set()
+        heartbeat.join()
+        return dict(self.stats)
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _work_loop(self, once):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    leased = jobs.lease_jobs(
+                        self.worker_id,
+                        limit=1,
+                        lease_seconds=self.lease_seconds,
+                        kinds=self.kinds,
+                    )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                app_logger.error(f"Batch worker could not lease jobs: {str(e)}")
+                leased = []
+            if not leased:
+                if once:
+                    return
+                self._stopping.wait(self.poll_interval)
+                continue
+            self._run_job(leased[0])
+
+    def _run_job(self, job):
+        with self._lock:
+            self._held[job["lease_token"]] = job["job_id"]
+        try:
+            with self.app.app_context():
+                try:
+                    jobs.JOB_HANDLERS[job["kind"]](job)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    db.session.rollback()
+                    app_logger.error(
+                        f"Batch job {job['job_id']} ({job['kind']} {job['batch_id']}) "
+                        f"attempt {job['attempts']} failed: {str(e)}"
+                    )
+                    state = jobs.fail_job(
+                        job["job_id"],
+                        job["lease_token"],
+                        e,
+                        job["attempts"],
+                        job["max_attempts"],
+                    )
+                    if state is None:
+                        self._count("lost")
+                    else:
+                        self._count("failed" if state == jobs.JOB_FAILED else "retried")
+                    return
+                if jobs.complete_job(job["job_id"], job["lease_token"]):
+                    self._count("done")
+                else:
+                    app_logger.warning(
+                        f"Batch job {job['job_id']} finished after its lease was lost"
+                    )
+                    self._count("lost")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # the lease expires and the job is picked up again
+            app_logger.error(
+                f"Batch worker could not record job {job['job_id']}: {str(e)}"
+            )
+        finally:
+            with self._lock:
+                self._held.pop(job["lease_token"], None)
+
+    def _heartbeat_loop(self):
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._finished.wait(interval):
+            with self._lock:
+                tokens = set(self._held)
+            if not tokens:
+                continue
+            try:
+                with self.app.app_context():
+                    held = jobs.heartbeat(tokens, lease_seconds=self.lease_seconds)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                app_logger.error(f"Batch worker heartbeat failed: {str(e)}")
+                continue
+            with self._lock:
+                # jobs finished since the snapshot aren't leased anymore either
+                lost = [self._held[token] for token in tokens - held if token in self._held]
+            for job_id in lost:
+                app_logger.warning(f"Batch worker lost the lease of job {job_id}")
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    expire_batches()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                app_logger.error(f"Batch expiry sweep failed: {str(e)}")
+            if self._stopping.wait(self.sweep_interval):
+                return
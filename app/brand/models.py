@@ -27,6 +27,14 @@ class Brand(db.Model):
     """
 
     __tablename__ = "brands"
+    # (id, last_updated_at) read by index-only scans for ETags (app/utility/caching.py)
+    __table_args__ = (
+        db.Index(
+            "ix_brands_brand_id_last_updated_at",
+            "brand_id",
+            postgresql_include=["last_updated_at"],
+        ),
+    )
 
     brand_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
@@ -101,7 +109,9 @@ class Brand(db.Model):
                 self.last_updated_at.isoformat() if self.last_updated_at else None
             ),
             "entity_type": self.entity_type,
-            "fixed_entity_type": self.fixed_entity_type,
+            "fixed_entity_type": (
+                self.fixed_entity_type.value if self.fixed_entity_type else None
+            ),
             "apollo_enrichment": self.apollo_enrichment,    
         }
 
@@ -135,6 +145,8 @@ class BrandUtility:
                 brand.last_updated_at.isoformat() if brand.last_updated_at else None
             ),
             "entity_type": brand.entity_type,
-            "fixed_entity_type": brand.fixed_entity_type,
+            "fixed_entity_type": (
+                brand.fixed_entity_type.value if brand.fixed_entity_type else None
+            ),
             "apollo_enrichment": brand.apollo_enrichment,
         }
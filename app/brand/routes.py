@@ -10,6 +10,10 @@ from app.enrichment_simweb.models import EnrichmentSimWeb
 from app.extensions import db
 from app.logger import app_logger
 from app.sentiment.models import Sentiment
+from app.utility import metrics
+from app.utility.caching import conditional_get
+from app.utility.labels import normalize_label
+from app.utility.replicas import replica_read
 from app.utility.utils import is_valid_website
 
 from .models import Brand, BrandUtility
@@ -37,6 +41,10 @@ brand_model = brand_ns.model(
         "contact_phone": fields.String(
             description="Contact phone number of the brand", attribute="contact_phone"
         ),
+        "entity_type": fields.String(
+            description="Entity type of the brand (normalized into fixed_entity_type)",
+            attribute="entity_type",
+        ),
         "created_at": fields.DateTime(readonly=True, attribute="created_at"),
         "last_updated_at": fields.DateTime(readonly=True, attribute="last_updated_at"),
     },
@@ -69,6 +77,7 @@ class BrandResourceNoParams(Resource):
     """
 
     @brand_ns.marshal_with(pagination_model)
+    @replica_read
     def get(self):
         """Get a list of brands with pagination"""
         try:
@@ -126,6 +135,10 @@ class BrandResourceNoParams(Resource):
                 contact_name=data.get("contact_name"),
                 contact_email=data.get("contact_email"),
                 contact_phone=data.get("contact_phone"),
+                entity_type=data.get("entity_type"),
+                fixed_entity_type=normalize_label(
+                    "entity_type", data.get("entity_type")
+                ),
             )
             db.session.add(new_brand)
             db.session.commit()
@@ -134,6 +147,9 @@ class BrandResourceNoParams(Resource):
                 "message": "Brand successfully created.",
                 "data": new_brand.to_dict(),
             }, 201
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
         except SQLAlchemyError as e:
             db.session.rollback()
             app_logger.error(f"Error creating brand: {str(e)}")
@@ -185,17 +201,25 @@ class BrandBulkResource(Resource):
                     contact_name=brand_data.get("contact_name"),
                     contact_email=brand_data.get("contact_email"),
                     contact_phone=brand_data.get("contact_phone"),
+                    entity_type=brand_data.get("entity_type"),
+                    fixed_entity_type=normalize_label(
+                        "entity_type", brand_data.get("entity_type")
+                    ),
                 )
                 new_brands.append(new_brand)
 
             db.session.bulk_save_objects(new_brands)
             db.session.commit()
+            metrics.increment("bulk_ingest_rows_total", len(new_brands), kind="brand")
 
             return {
                 "message": f"{len(new_brands)} brands successfully created.",
                 "brands": [brand.to_dict() for brand in new_brands],
             }, 201
 
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
         except SQLAlchemyError as e:
             db.session.rollback()
             app_logger.error(f"Error creating brands: {str(e)}")
@@ -211,7 +235,10 @@ class BrandResourceWithParam(Resource):
     """
 
     # @brand_ns.marshal_with(brand_model)
+    @brand_ns.response(304, "Brand not modified.")
     @brand_ns.response(404, "Brand not found.")
+    @replica_read
+    @conditional_get(Brand, "brand_id")
     def get(self, brand_id):
         """Get a brand by its ID"""
         try:
@@ -246,6 +273,11 @@ class BrandResourceWithParam(Resource):
             brand.contact_name = data.get("contact_name", brand.contact_name)
             brand.contact_email = data.get("contact_email", brand.contact_email)
             brand.contact_phone = data.get("contact_phone", brand.contact_phone)
+            if "entity_type" in data:
+                brand.entity_type = data["entity_type"]
+                brand.fixed_entity_type = normalize_label(
+                    "entity_type", data["entity_type"]
+                )
 
             data_website = data.get("website", None)
             # Conditions such as no brand website or same brand website
@@ -353,6 +385,9 @@ class BrandResourceWithParam(Resource):
                     ],
                 }, 200
 
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
         except Exception as e:
             db.session.rollback()
             app_logger.error(f"Error updating brand {brand_id}: {str(e)}")
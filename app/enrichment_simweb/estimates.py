@@ -0,0 +1,408 @@
+"""
+Batch recomputation of the *_estimate columns of EnrichmentSimWeb
+
+Every estimate is a vectorized NumPy formula registered with @register_estimate.
+Input metrics are pulled for a chunk of enrichments at once (only the columns
+the selected formulas need), all formulas run over whole columns, and the
+results are written back with one UPDATE ... FROM (VALUES ...) per chunk.
+An estimate that can't be computed for a row (missing inputs) keeps the value
+already stored, so values written by other tools aren't wiped.
+
+The formulas rely on heuristics (revenue per visit, per employee, ...) that
+are rough placeholders, not calibrated figures: they come from the
+ESTIMATE_HEURISTICS config and should be tuned per deployment.
+"""
+
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import BigInteger, column, func, select, table
+
+from app.extensions import db
+from app.logger import app_logger
+from app.utility import metrics as app_metrics
+from app.utility.sql import bulk_update_from_values
+
+from .history import record_history
+from .models import EnrichmentSimWeb
+
+DEFAULT_CHUNK_SIZE = 5000
+# pg advisory lock held while a recompute runs, one at a time across processes
+RECOMPUTE_LOCK_KEY = 26_000_001
+
+# Placeholder heuristics of the default formulas, overridden by the
+# ESTIMATE_HEURISTICS config (see config.py). Not calibrated against real data.
+DEFAULT_HEURISTICS = {
+    # yearly revenue per monthly website visit
+    "revenue_per_visit_usd": 0.5,
+    # yearly revenue per employee
+    "revenue_per_employee_usd": 150_000,
+    # share of the ad spend addressable by publisher IP
+    "ip_ad_spend_share": 0.1,
+    # share of revenue a licensing deal could be worth
+    "licensing_share_of_revenue": 0.005,
+}
+
+# Ordered registry: {estimate_column: (input_columns, formula)}
+# Formulas may use estimates registered before them as inputs
+ESTIMATE_REGISTRY = {}
+
+# a number, optionally in scientific notation, and an optional magnitude suffix
+# that must end a word ("100 monthly visits" has no suffix)
+_NUMBER_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?(?:e[+-]?\d+)?)\s*([kmbt]|thousand|million|billion|trillion)?\b",
+    re.IGNORECASE,
+)
+_MULTIPLIERS = {
+    "": 1,
+    "k": 1e3,
+    "thousand": 1e3,
+    "m": 1e6,
+    "million": 1e6,
+    "b": 1e9,
+    "billion": 1e9,
+    "t": 1e12,
+    "trillion": 1e12,
+}
+# largest float64 below 2**63, float(iinfo(int64).max) rounds up to 2**63
+_INT64_MAX = np.nextafter(2.0**63, 0)
+
+
+def register_estimate(column_name, inputs):
+    """
+    Register a vectorized formula computing `column_name` from `inputs`
+    The formula receives {column_name: float64 ndarray} (NaN for missing values)
+    and the heuristics dict, and must return a float64 ndarray of the same length.
+    """
+    if column_name not in EnrichmentSimWeb.__table__.c:
+        raise ValueError(f"Unknown enrichment column: {column_name}")
+
+    def decorator(formula):
+        ESTIMATE_REGISTRY[column_name] = (tuple(inputs), formula)
+        return formula
+
+    return decorator
+
+
+@lru_cache(maxsize=65536)
+def parse_metric(value):
+    """
+    Convert a stored metric into a float
+    Handles plain numbers and SimilarWeb style text such as "1.2M", "$10M - $50M",
+    "51-200", "3.4e6" or "12,345" (ranges become their midpoint). Unparseable
+    values are NaN.
+    """
+    if value is None:
+        return np.nan
+    if not isinstance(value, str):
+        return float(value)
+
+    text = value.replace(",", "").strip()
+    tokens = _NUMBER_PATTERN.findall(text)
+    if not tokens:
+        return np.nan
+
+    numbers = [float(number) * _MULTIPLIERS[suffix.lower()] for number, suffix in tokens]
+    result = sum(numbers) / len(numbers)
+    if text.endswith("%"):
+        result /= 100
+    if len(numbers) == 1 and text.startswith("-"):
+        result = -result
+    return result
+
+
+def to_numeric_array(column_values):
+    """
+    Convert one column of raw DB values into a float64 ndarray
+    """
+    return np.fromiter(
+        (parse_metric(value) for value in column_values),
+        dtype=np.float64,
+        count=len(column_values),
+    )
+
+
+def to_bigint_values(array):
+    """
+    Convert a float64 ndarray into python ints for a BigInteger column
+    NaN and values outside the BIGINT range become None.
+    """
+    valid = np.isfinite(array) & (np.abs(array) <= _INT64_MAX)
+    converted = np.full(len(array), None, dtype=object)
+    converted[valid] = np.rint(array[valid]).astype(np.int64)
+    return converted.tolist()
+
+
+def _coalesce(*arrays):
+    """
+    Element-wise first non-NaN value of the given arrays
+    """
+    result = arrays[0].copy()
+    for array in arrays[1:]:
+        result = np.where(np.isnan(result), array, result)
+    return result
+
+
+@register_estimate("company_revenue_estimate", inputs=["annual_revenue"])
+def company_revenue_estimate(metrics, heuristics):
+    """Reported annual revenue"""
+    return metrics["annual_revenue"]
+
+
+@register_estimate("online_revenue_estimate", inputs=["online_revenue"])
+def online_revenue_estimate(metrics, heuristics):
+    """Reported online revenue"""
+    return metrics["online_revenue"]
+
+
+@register_estimate("employee_count_revenue_estimate", inputs=["employees"])
+def employee_count_revenue_estimate(metrics, heuristics):
+    """Revenue implied by head count"""
+    return metrics["employees"] * heuristics["revenue_per_employee_usd"]
+
+
+@register_estimate(
+    "web_traffic_revenue_estimate",
+    inputs=["monthly_visits", "average_monthly_visits"],
+)
+def web_traffic_revenue_estimate(metrics, heuristics):
+    """Yearly revenue implied by monthly website traffic"""
+    visits = _coalesce(metrics["monthly_visits"], metrics["average_monthly_visits"])
+    return visits * 12 * heuristics["revenue_per_visit_usd"]
+
+
+@register_estimate(
+    "similarweb_revenue_estimate",
+    inputs=["online_revenue_estimate", "web_traffic_revenue_estimate"],
+)
+def similarweb_revenue_estimate(metrics, heuristics):
+    """Online revenue when known, traffic based revenue otherwise"""
+    return _coalesce(
+        metrics["online_revenue_estimate"], metrics["web_traffic_revenue_estimate"]
+    )
+
+
+@register_estimate("ad_spend_estimate", inputs=["ppc_spend"])
+def ad_spend_estimate(metrics, heuristics):
+    """Yearly ad spend from monthly PPC spend"""
+    return metrics["ppc_spend"] * 12
+
+
+@register_estimate("ip_ad_spend_estimate", inputs=["ad_spend_estimate"])
+def ip_ad_spend_estimate(metrics, heuristics):
+    """Part of the ad spend addressable by publisher IP"""
+    return metrics["ad_spend_estimate"] * heuristics["ip_ad_spend_share"]
+
+
+@register_estimate(
+    "licensing_opportunity_estimate",
+    inputs=[
+        "ip_ad_spend_estimate",
+        "similarweb_revenue_estimate",
+        "company_revenue_estimate",
+    ],
+)
+def licensing_opportunity_estimate(metrics, heuristics):
+    """Larger of the IP ad spend and a share of the best known revenue"""
+    revenue = _coalesce(
+        metrics["similarweb_revenue_estimate"], metrics["company_revenue_estimate"]
+    )
+    return np.fmax(
+        metrics["ip_ad_spend_estimate"],
+        revenue * heuristics["licensing_share_of_revenue"],
+    )
+
+
+def select_estimates(estimates=None):
+    """
+    Estimate columns to recompute, in registry order so estimates depending on
+    other estimates see fresh values
+    Raises ValueError on unknown estimates
+    """
+    selected = list(ESTIMATE_REGISTRY) if not estimates else list(estimates)
+    unknown = [name for name in selected if name not in ESTIMATE_REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown estimates: {', '.join(unknown)}")
+    return [name for name in ESTIMATE_REGISTRY if name in selected]
+
+
+def configured_heuristics():
+    """
+    DEFAULT_HEURISTICS overridden by the ESTIMATE_HEURISTICS config
+    """
+    heuristics = dict(DEFAULT_HEURISTICS)
+    if has_app_context():
+        heuristics.update(current_app.config.get("ESTIMATE_HEURISTICS") or {})
+    return heuristics
+
+
+def recompute_estimates(estimates=None, chunk_size=DEFAULT_CHUNK_SIZE, heuristics=None):
+    """
+    Recompute estimate columns for all enrichments
+    Estimates whose inputs are missing keep their stored value.
+    Args:
+        estimates (list): Estimate columns to recompute, all registered ones when None
+        chunk_size (int): Number of enrichments read and written per round trip
+        heuristics (dict): Overrides of the configured heuristics
+    returns: {"estimates", "scanned": rows read, "updated": rows whose estimates changed}
+    """
+    selected = select_estimates(estimates)
+    heuristics = {**configured_heuristics(), **(heuristics or {})}
+
+    input_columns = []
+    for name in selected:
+        for input_column in ESTIMATE_REGISTRY[name][0]:
+            if input_column not in selected and input_column not in input_columns:
+                input_columns.append(input_column)
+
+    table = EnrichmentSimWeb.__table__
+    primary_key = table.c.enrichment_sim_web_id
+    column_types = {name: BigInteger() for name in selected}
+
+    scanned = 0
+    updated = 0
+    last_id = 0
+    while True:
+        chunk = db.session.execute(
+            select(
+                primary_key,
+                table.c.brand_id,
+                *[table.c[name] for name in selected],
+                *[table.c[name] for name in input_columns],
+            )
+            .where(primary_key > last_id)
+            .order_by(primary_key)
+            .limit(chunk_size)
+        ).all()
+        if not chunk:
+            break
+
+        # column-major view of the chunk: one tuple per selected column
+        columns = list(zip(*chunk))
+        ids, brand_ids = columns[0], columns[1]
+        stored = {
+            name: to_numeric_array(columns[index + 2])
+            for index, name in enumerate(selected)
+        }
+        metrics = {
+            name: to_numeric_array(columns[index + 2 + len(selected)])
+            for index, name in enumerate(input_columns)
+        }
+        with np.errstate(invalid="ignore", over="ignore"):
+            for name in selected:
+                inputs, formula = ESTIMATE_REGISTRY[name]
+                computed = np.asarray(
+                    formula({key: metrics[key] for key in inputs}, heuristics),
+                    dtype=np.float64,
+                )
+                # not computable here: keep (and build on) the stored value
+                metrics[name] = np.where(np.isnan(computed), stored[name], computed)
+
+        new_values = {name: to_bigint_values(metrics[name]) for name in selected}
+        old_values = {name: to_bigint_values(stored[name]) for name in selected}
+        rows = list(zip(ids, *[new_values[name] for name in selected]))
+        updated_ids = set(
+            bulk_update_from_values(
+                db.session, table, primary_key.name, column_types, rows
+            )
+        )
+        record_history(
+            db.session,
+            [
+                (
+                    enrichment_id,
+                    brand_id,
+                    {
+                        name: new_values[name][index]
+                        for name in selected
+                        if new_values[name][index] != old_values[name][index]
+                    },
+                )
+                for index, (enrichment_id, brand_id) in enumerate(zip(ids, brand_ids))
+                if enrichment_id in updated_ids
+            ],
+        )
+        db.session.commit()
+        updated += len(updated_ids)
+
+        scanned += len(ids)
+        last_id = ids[-1]
+
+    app_logger.info(
+        f"Recomputed {', '.join(selected)}: {scanned} scanned, {updated} updated"
+    )
+    app_metrics.increment("enrichment_estimates_updated_total", updated)
+    return {"estimates": selected, "scanned": scanned, "updated": updated}
+
+
+def is_recompute_running():
+    """
+    Whether a recompute holds the advisory lock, in any process
+    """
+    locks = table(
+        "pg_locks",
+        column("locktype"),
+        column("objid"),
+        column("granted"),
+        schema="pg_catalog",
+    )
+    return bool(
+        db.session.execute(
+            select(func.count())
+            .select_from(locks)
+            .where(
+                locks.c.locktype == "advisory",
+                locks.c.objid == RECOMPUTE_LOCK_KEY,
+                locks.c.granted.is_(True),
+            )
+        ).scalar()
+    )
+
+
+def recompute_estimates_exclusive(**kwargs):
+    """
+    recompute_estimates, unless one is already running
+    The advisory lock lives on its own connection, the recompute commits
+    chunk by chunk through the session.
+    returns: The recompute result, None when another recompute holds the lock
+    """
+    with db.engine.connect() as lock_connection:
+        locked = lock_connection.execute(
+            select(func.pg_try_advisory_lock(RECOMPUTE_LOCK_KEY))
+        ).scalar()
+        if not locked:
+            return None
+        try:
+            return recompute_estimates(**kwargs)
+        finally:
+            lock_connection.execute(select(func.pg_advisory_unlock(RECOMPUTE_LOCK_KEY)))
+            lock_connection.commit()
+
+
+def start_recompute(app, estimates=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Run recompute_estimates_exclusive in a background thread
+    Chunks are committed as they go, a recompute cut short by a restart is
+    simply run again.
+    Raises ValueError on unknown estimates
+    """
+    selected = select_estimates(estimates)
+
+    def run():
+        with app.app_context():
+            try:
+                result = recompute_estimates_exclusive(
+                    estimates=selected, chunk_size=chunk_size
+                )
+                if result is None:
+                    app_logger.info("Estimates recompute skipped, one is already running")
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                db.session.rollback()
+                app_logger.error(f"Error recomputing estimates: {str(e)}")
+
+    thread = threading.Thread(target=run, name="recompute-estimates", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,276 @@
+"""
+Typed columnar snapshots of EnrichmentSimWeb for analytics
+
+Rows are streamed by the server with COPY and parsed into Arrow record
+batches with the table's types, so Numeric/BigInteger columns stay numeric
+and NULLs stay NULL (unlike to_dict()). Snapshots are written either as a
+Parquet dataset partitioned by industry or as an Arrow IPC stream.
+
+Parquet layout: every export is its own export=<timestamp> directory, moved
+into place once complete. A full export replaces all the previous ones, an
+incremental export adds the rows changed since the previous watermark, so an
+enrichment can appear in several exports: readers keep, per
+enrichment_sim_web_id, the row of the latest export (read_export() does).
+Deleted enrichments disappear at the next full export.
+"""
+
+import io
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pa_compute
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as pa_dataset
+from sqlalchemy import func, select, text
+
+from app.extensions import db
+
+from .models import EnrichmentSimWeb
+
+DEFAULT_BLOCK_SIZE = 16 << 20
+PARTITION_COLUMN = "industry"
+EXPORT_PARTITION = "export"
+WATERMARK_FILE = "_watermark.json"
+# last_updated_at is the start time of the writing transaction, so a row can
+# commit after an export with an older timestamp. The stored watermark stays
+# before every transaction still open at export time, minus this lag for
+# sessions whose xact_start this role can't see in pg_stat_activity.
+DEFAULT_WATERMARK_LAG = timedelta(minutes=1)
+
+
+def _arrow_type(column):
+    """
+    Arrow type for a SQLAlchemy column of EnrichmentSimWeb
+    """
+    if isinstance(column.type, db.BigInteger):
+        return pa.int64()
+    if isinstance(column.type, db.Integer):
+        return pa.int32()
+    if isinstance(column.type, db.Numeric):
+        return pa.float64()
+    if isinstance(column.type, db.DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+_COLUMNS = list(EnrichmentSimWeb.__table__.columns)
+ARROW_SCHEMA = pa.schema(
+    [pa.field(column.name, _arrow_type(column)) for column in _COLUMNS]
+)
+
+
+def iter_record_batches(since=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Stream enrichments as Arrow record batches
+    Rows are streamed by the server with COPY ... TO STDOUT into a pipe that
+    pyarrow's CSV reader parses incrementally with ARROW_SCHEMA types, which
+    skips psycopg2's per-value type conversion entirely. The COPY is started
+    right away, so the returned iterator can be consumed outside the app
+    context (pyarrow's dataset writer reads it from its own thread).
+    Args:
+        since (datetime): Only rows updated after this watermark when given
+        block_size (int): Bytes of CSV parsed per record batch
+    returns: Iterator of pyarrow.RecordBatch following ARROW_SCHEMA
+    """
+    table = EnrichmentSimWeb.__table__
+    query = select(*_COLUMNS)
+    if since is not None:
+        query = query.where(table.c.last_updated_at > since)
+
+    connection = db.session.connection()
+    compiled = query.compile(dialect=connection.dialect)
+    cursor = connection.connection.cursor()
+    copy_sql = cursor.mogrify(
+        f"COPY ({compiled}) TO STDOUT WITH (FORMAT csv)", compiled.params
+    ).decode("utf-8")
+
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def copy_rows():
+        with os.fdopen(write_fd, "wb") as pipe_writer:
+            try:
+                cursor.copy_expert(copy_sql, pipe_writer)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                errors.append(e)
+
+    copy_thread = threading.Thread(target=copy_rows, daemon=True)
+    copy_thread.start()
+    return _read_record_batches(read_fd, copy_thread, cursor, errors, block_size)
+
+
+def _read_record_batches(read_fd, copy_thread, cursor, errors, block_size):
+    try:
+        with os.fdopen(read_fd, "rb") as pipe_reader:
+            # pyarrow refuses to open an empty CSV, which is what no rows look like
+            if pipe_reader.peek(1):
+                yield from pa_csv.open_csv(
+                    pipe_reader,
+                    read_options=pa_csv.ReadOptions(
+                        column_names=ARROW_SCHEMA.names, block_size=block_size
+                    ),
+                    parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=ARROW_SCHEMA,
+                        null_values=[""],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                    ),
+                )
+    finally:
+        copy_thread.join()
+        cursor.close()
+    if errors:
+        raise errors[0]
+
+
+def _watermark_bound(lag):
+    """
+    Latest watermark that can't skip rows committed after the export starts
+    Must run in the export's transaction, before the COPY.
+    """
+    oldest_open = db.session.execute(
+        text(
+            "SELECT min(xact_start) FROM pg_stat_activity "
+            "WHERE xact_start IS NOT NULL AND pid <> pg_backend_pid()"
+        )
+    ).scalar()
+    bound = func.least(func.now(), oldest_open) if oldest_open else func.now()
+    # last_updated_at is a timestamp without time zone, in the session's zone;
+    # exports take rows strictly after the watermark, hence the microsecond
+    bound = db.session.execute(select(db.cast(bound, db.DateTime))).scalar()
+    return bound - timedelta(microseconds=1) - lag
+
+
+def read_watermark(output_dir):
+    """
+    Watermark of the last snapshot written to output_dir, or None
+    """
+    path = os.path.join(output_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as watermark_file:
+        return datetime.fromisoformat(json.load(watermark_file)["watermark"])
+
+
+def export_parquet_snapshot(
+    output_dir,
+    since=None,
+    incremental=False,
+    block_size=DEFAULT_BLOCK_SIZE,
+    watermark_lag=DEFAULT_WATERMARK_LAG,
+):
+    """
+    Write enrichments as a Parquet dataset partitioned by export and industry
+    A full export (no `since`, not `incremental`) replaces the previous exports.
+    Args:
+        output_dir (str): Dataset root, one export=<timestamp> directory per export
+        since (datetime): Only export rows updated after this watermark
+        incremental (bool): Use the watermark stored by the previous snapshot
+        block_size (int): Bytes of CSV parsed per record batch
+        watermark_lag (timedelta): Safety margin kept behind the stored watermark
+    returns: {"rows", "watermark", "output_dir"}
+    """
+    if incremental and since is None:
+        since = read_watermark(output_dir)
+    full = since is None
+
+    bound = _watermark_bound(watermark_lag)
+    stats = {"rows": 0, "watermark": None}
+
+    batches = iter_record_batches(since=since, block_size=block_size)
+    last_updated_index = ARROW_SCHEMA.get_field_index("last_updated_at")
+
+    def tracked_batches():
+        for batch in batches:
+            stats["rows"] += batch.num_rows
+            batch_max = pa_compute.max(batch.column(last_updated_index)).as_py()
+            if batch_max and (stats["watermark"] is None or batch_max > stats["watermark"]):
+                stats["watermark"] = batch_max
+            yield batch
+
+    export_name = (
+        f"{EXPORT_PARTITION}={datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}"
+    )
+    # hidden until complete, dataset readers skip names starting with "."
+    staging_dir = os.path.join(output_dir, f".{export_name}")
+    # an export without rows writes no file, but still replaces older exports
+    os.makedirs(staging_dir)
+    pa_dataset.write_dataset(
+        tracked_batches(),
+        staging_dir,
+        schema=ARROW_SCHEMA,
+        format="parquet",
+        partitioning=[PARTITION_COLUMN],
+        partitioning_flavor="hive",
+        basename_template="part-{i}.parquet",
+    )
+    os.rename(staging_dir, os.path.join(output_dir, export_name))
+
+    if full:
+        for name in os.listdir(output_dir):
+            if name.startswith(f"{EXPORT_PARTITION}=") and name != export_name:
+                shutil.rmtree(os.path.join(output_dir, name))
+
+    watermark = stats["watermark"] or since
+    if watermark is not None:
+        watermark = min(watermark, bound)
+    if watermark is not None:
+        with open(
+            os.path.join(output_dir, WATERMARK_FILE), "w", encoding="utf-8"
+        ) as watermark_file:
+            json.dump({"watermark": watermark.isoformat()}, watermark_file)
+
+    return {
+        "rows": stats["rows"],
+        "watermark": watermark.isoformat() if watermark else None,
+        "output_dir": output_dir,
+    }
+
+
+def read_export(output_dir):
+    """
+    Read a Parquet export back, keeping each enrichment from its latest export
+    (not its latest last_updated_at, which is the transaction start time)
+    returns: pyarrow.Table following ARROW_SCHEMA
+    """
+    table = pa_dataset.dataset(
+        output_dir,
+        format="parquet",
+        partitioning="hive",
+        schema=ARROW_SCHEMA.append(pa.field(EXPORT_PARTITION, pa.string())),
+    ).to_table()
+    table = table.sort_by(
+        [("enrichment_sim_web_id", "ascending"), (EXPORT_PARTITION, "descending")]
+    ).drop_columns([EXPORT_PARTITION])
+    if not table.num_rows:
+        return table
+    ids = table.column("enrichment_sim_web_id").to_numpy()
+    first_of_id = np.ones(len(ids), dtype=bool)
+    first_of_id[1:] = ids[1:] != ids[:-1]
+    return table.filter(pa.array(first_of_id))
+
+
+def iter_arrow_stream(since=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Serialize enrichments as an Arrow IPC stream, one chunk per record batch
+    yields: bytes
+    """
+    sink = io.BytesIO()
+
+    def drain():
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate(0)
+        return chunk
+
+    with pa.ipc.new_stream(sink, ARROW_SCHEMA) as writer:
+        for batch in iter_record_batches(since=since, block_size=block_size):
+            writer.write_batch(batch)
+            yield drain()
+    yield drain()
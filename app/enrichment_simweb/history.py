@@ -0,0 +1,246 @@
+"""
+Append-only, delta encoded history of EnrichmentSimWeb rows
+
+Changes made through the ORM are captured in an after_flush hook, set-based
+jobs (e.g. the estimate recompute) call record_history directly. Only the
+columns that changed are stored per revision, with a full keyframe every
+KEYFRAME_INTERVAL revisions. Payloads are compact JSON compressed with zlib.
+All reads go through the (brand_id, captured_at) index.
+"""
+
+import json
+import zlib
+from decimal import Decimal
+
+from sqlalchemy import event, func, insert, inspect, select, tuple_
+
+from app.extensions import db
+
+from .models import EnrichmentHistory, EnrichmentSimWeb
+from .utils import EnrichmentSimWebUtility
+
+KEYFRAME_INTERVAL = 20
+COMPRESSION_LEVEL = 6
+
+TRACKED_COLUMNS = [
+    name
+    for name in EnrichmentSimWebUtility().get_initialization_attributes()
+    if name != "brand_id"
+]
+_NUMERIC_COLUMNS = {
+    column.name
+    for column in EnrichmentSimWeb.__table__.columns
+    if isinstance(column.type, db.Numeric)
+}
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Unsupported history value: {value!r}")
+
+
+def encode_changes(changes):
+    """
+    Serialize {column: value} into a compressed payload
+    """
+    serialized = json.dumps(changes, default=_json_default, separators=(",", ":"))
+    return zlib.compress(serialized.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decode_changes(payload):
+    """
+    Deserialize a compressed payload back into {column: value}
+    Numeric columns are restored as Decimal, like when read from the table
+    """
+    changes = json.loads(zlib.decompress(payload).decode("utf-8"))
+    for name, value in changes.items():
+        if name in _NUMERIC_COLUMNS and value is not None:
+            changes[name] = Decimal(str(value))
+    return changes
+
+
+def record_history(connection, entries):
+    """
+    Append one history revision per changed enrichment
+    Args:
+        connection: SQLAlchemy connection (or session) of the running transaction
+        entries (list): Tuples of (enrichment_sim_web_id, brand_id, changes) where
+            changes is {column: new_value}, or None to force a full keyframe
+    """
+    if not entries:
+        return
+
+    history = EnrichmentHistory.__table__
+    enrichments = EnrichmentSimWeb.__table__
+
+    latest_revisions = dict(
+        connection.execute(
+            select(history.c.brand_id, func.max(history.c.revision))
+            .where(history.c.brand_id.in_({brand_id for _, brand_id, _ in entries}))
+            .group_by(history.c.brand_id)
+        ).all()
+    )
+
+    rows = []
+    keyframe_ids = []
+    for enrichment_id, brand_id, changes in entries:
+        revision = latest_revisions.get(brand_id, -1) + 1
+        latest_revisions[brand_id] = revision
+        is_keyframe = changes is None or revision % KEYFRAME_INTERVAL == 0
+        if is_keyframe:
+            keyframe_ids.append(enrichment_id)
+        rows.append(
+            {
+                "brand_id": brand_id,
+                "enrichment_sim_web_id": enrichment_id,
+                "revision": revision,
+                "is_keyframe": is_keyframe,
+                "changes": changes,
+            }
+        )
+
+    # keyframes carry the full current row, read once for all of them
+    snapshots = {}
+    if keyframe_ids:
+        for row in connection.execute(
+            select(
+                enrichments.c.enrichment_sim_web_id,
+                *[enrichments.c[name] for name in TRACKED_COLUMNS],
+            ).where(enrichments.c.enrichment_sim_web_id.in_(keyframe_ids))
+        ):
+            snapshots[row[0]] = dict(zip(TRACKED_COLUMNS, row[1:]))
+
+    for row in rows:
+        if row["is_keyframe"]:
+            changes = snapshots.get(row["enrichment_sim_web_id"], {})
+        else:
+            changes = row["changes"]
+        row["changes"] = encode_changes(changes)
+
+    connection.execute(insert(history), rows)
+
+
+@event.listens_for(db.session, "after_flush")
+def capture_enrichment_changes(session, flush_context):
+    """
+    Record history for EnrichmentSimWeb rows inserted or updated in this flush
+    Runs while attribute history still holds the pre-flush values.
+    """
+    entries = []
+    for enrichment in session.new:
+        if isinstance(enrichment, EnrichmentSimWeb):
+            entries.append(
+                (enrichment.enrichment_sim_web_id, enrichment.brand_id, None)
+            )
+
+    for enrichment in session.dirty:
+        if not isinstance(enrichment, EnrichmentSimWeb):
+            continue
+        state = inspect(enrichment)
+        brand_history = state.attrs.brand_id.history
+        if brand_history.has_changes():
+            # moved to another brand: start a fresh chain for that brand
+            entries.append(
+                (enrichment.enrichment_sim_web_id, enrichment.brand_id, None)
+            )
+            continue
+
+        changes = {}
+        for name in TRACKED_COLUMNS:
+            attribute_history = state.attrs[name].history
+            if not attribute_history.has_changes():
+                continue
+            new_value = attribute_history.added[0] if attribute_history.added else None
+            if attribute_history.deleted and attribute_history.deleted[0] == new_value:
+                continue
+            changes[name] = new_value
+        if changes:
+            entries.append(
+                (enrichment.enrichment_sim_web_id, enrichment.brand_id, changes)
+            )
+
+    if entries:
+        record_history(session.connection(), entries)
+
+
+def _latest_keyframe(brand_id, before):
+    history = EnrichmentHistory.__table__
+    query = select(history.c.captured_at, history.c.history_id).where(
+        history.c.brand_id == brand_id, history.c.is_keyframe.is_(True)
+    )
+    if before is not None:
+        query = query.where(history.c.captured_at <= before)
+    return db.session.execute(
+        query.order_by(history.c.captured_at.desc(), history.c.history_id.desc()).limit(
+            1
+        )
+    ).first()
+
+
+def _entries_between(brand_id, keyframe, end):
+    history = EnrichmentHistory.__table__
+    query = select(history.c.captured_at, history.c.changes).where(
+        history.c.brand_id == brand_id
+    )
+    if keyframe is not None:
+        query = query.where(
+            tuple_(history.c.captured_at, history.c.history_id)
+            >= tuple_(keyframe.captured_at, keyframe.history_id)
+        )
+    if end is not None:
+        query = query.where(history.c.captured_at <= end)
+    return db.session.execute(
+        query.order_by(history.c.captured_at, history.c.history_id)
+    ).all()
+
+
+def enrichment_as_of(brand_id, as_of):
+    """
+    Reconstruct the enrichment of a brand as it was at `as_of`
+    returns: {"captured_at", "data"} or None when no history exists before `as_of`
+    """
+    keyframe = _latest_keyframe(brand_id, as_of)
+    if keyframe is None:
+        return None
+
+    state = {}
+    captured_at = None
+    for captured_at, payload in _entries_between(brand_id, keyframe, as_of):
+        state.update(decode_changes(payload))
+
+    for name, value in state.items():
+        if isinstance(value, Decimal):
+            state[name] = float(value)
+    state["brand_id"] = brand_id
+    return {"captured_at": captured_at.isoformat(), "data": state}
+
+
+def metric_history(brand_id, metric, start=None, end=None):
+    """
+    Time series of one enrichment column for a brand
+    Only points where the value changed are returned. When `start` is given,
+    the first point is the value in effect at `start`.
+    returns: List of {"captured_at", "value"}
+    """
+    if metric not in TRACKED_COLUMNS:
+        raise ValueError(f"Unknown enrichment metric: {metric}")
+
+    keyframe = _latest_keyframe(brand_id, start) if start is not None else None
+    points = []
+    for captured_at, payload in _entries_between(brand_id, keyframe, end):
+        changes = decode_changes(payload)
+        if metric not in changes:
+            continue
+        value = changes[metric]
+        if isinstance(value, Decimal):
+            value = float(value)
+        # anything before `start` only tells the value in effect at `start`
+        if start is not None and captured_at < start:
+            captured_at = start
+            if points:
+                points.pop()
+        if points and points[-1]["value"] == value:
+            continue
+        points.append({"captured_at": captured_at.isoformat(), "value": value})
+    return points
@@ -20,6 +20,14 @@ class EnrichmentSimWeb(db.Model):
     """
 
     __tablename__ = "enrichments_simweb"
+    # (id, last_updated_at) read by index-only scans for ETags (app/utility/caching.py)
+    __table_args__ = (
+        db.Index(
+            "ix_enrichments_simweb_enrichment_sim_web_id_last_updated_at",
+            "enrichment_sim_web_id",
+            postgresql_include=["last_updated_at"],
+        ),
+    )
 
     enrichment_sim_web_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     brand_id = db.Column(
@@ -190,6 +198,45 @@ class EnrichmentSimWeb(db.Model):
             self.extract_column_name(column) for column in self.__table__.columns
         ]  # pylint: disable=no-value-for-parameter
 
+    @classmethod
+    def normalize_value(cls, key, value):
+        """
+        Convert an incoming JSON value to the python type stored in column `key`
+        so it can be compared with the loaded value
+        Raises ValueError when the value does not fit the column type
+        """
+        if value is None:
+            return None
+
+        column_type = cls.__table__.c[key].type
+        try:
+            if isinstance(column_type, db.Numeric):
+                if isinstance(value, bool):
+                    raise ValueError
+                return Decimal(str(value))
+            if isinstance(column_type, db.Integer):
+                if isinstance(value, bool) or Decimal(str(value)) % 1:
+                    raise ValueError
+                return int(Decimal(str(value)))
+        except (ArithmeticError, ValueError) as e:
+            raise ValueError(f"Invalid value for {key}: {value!r}") from e
+        return str(value)
+
+    def get_changed_values(self, data):
+        """
+        Compare incoming data with the loaded row
+        returns: {attribute: normalized value} for initialization attributes whose
+        value actually differs, so updates only touch the changed columns
+        """
+        changed = {}
+        for key in EnrichmentSimWebUtility().get_initialization_attributes():
+            if key not in data:
+                continue
+            value = self.normalize_value(key, data[key])
+            if getattr(self, key) != value:
+                changed[key] = value
+        return changed
+
     def to_dict(self):
         """
         To convert class object to required python dictionary
@@ -222,3 +269,48 @@ class EnrichmentSimWeb(db.Model):
         )
 
         return response_data
+
+
+class EnrichmentHistory(db.Model):
+    """
+    DB entity for the append-only history of EnrichmentSimWeb rows
+    Each entry holds only the columns that changed in one refresh, as zlib
+    compressed JSON. Every KEYFRAME_INTERVAL revisions (and for the first one)
+    a full snapshot is stored instead, so a reconstruction never has to
+    replay more than KEYFRAME_INTERVAL entries.
+    returns: SQLAlchemy DB Model Object in EnrichmentHistory form
+    """
+
+    __tablename__ = "enrichment_history"
+    __table_args__ = (
+        db.Index(
+            "ix_enrichment_history_brand_id_captured_at", "brand_id", "captured_at"
+        ),
+    )
+
+    history_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    brand_id = db.Column(
+        db.Integer,
+        db.ForeignKey("brands.brand_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # no FK on purpose, history outlives a deleted or re-created enrichment
+    enrichment_sim_web_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    is_keyframe = db.Column(db.Boolean, nullable=False, default=False)
+    changes = db.Column(db.LargeBinary, nullable=False)
+    captured_at = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+    def __init__(
+        self,
+        brand_id,
+        enrichment_sim_web_id,
+        revision,
+        changes,
+        is_keyframe=False,
+    ):
+        self.brand_id = brand_id
+        self.enrichment_sim_web_id = enrichment_sim_web_id
+        self.revision = revision
+        self.changes = changes
+        self.is_keyframe = is_keyframe
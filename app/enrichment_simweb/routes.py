@@ -3,16 +3,28 @@ API Routes for EnrichmentSimWeb
 """
 
 from collections import defaultdict
+from datetime import datetime
 
-from flask import request
+from flask import Response, current_app, request, stream_with_context
 from flask_restx import Namespace, Resource, fields
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.brand.models import Brand
 from app.extensions import db
 from app.logger import app_logger
-from app.utility.utils import camel_to_snake
-
+from app.utility import metrics
+from app.utility.caching import conditional_get
+from app.utility.replicas import replica_read
+from app.utility.utils import parse_datetime_arg
+
+from .estimates import (
+    DEFAULT_CHUNK_SIZE,
+    is_recompute_running,
+    select_estimates,
+    start_recompute,
+)
+from .export import iter_arrow_stream
+from .history import enrichment_as_of, metric_history
 from .models import EnrichmentSimWeb
 from .utils import EnrichmentSimWebUtility
 
@@ -74,6 +86,7 @@ class EnrichmentSimWebResourceNoParams(Resource):
     """
 
     # @enrichment_sim_web_ns.marshal_with(pagination_model)
+    @replica_read
     def get(self):
         """Get a list of enrichment_sim_webs with pagination"""
         try:
@@ -209,6 +222,11 @@ class EnrichmentSimWebBulkResource(Resource):
 
             db.session.bulk_save_objects(new_enrichment_sim_webs)
             db.session.commit()
+            metrics.increment(
+                "bulk_ingest_rows_total",
+                len(new_enrichment_sim_webs),
+                kind="enrichment_simweb",
+            )
 
             return {
                 "message": f"{len(new_enrichment_sim_webs)} enrichment_sim_web entries successfully created.",
@@ -221,6 +239,143 @@ class EnrichmentSimWebBulkResource(Resource):
             return {"message": f"An error occurred while creating new enrichment_sim_web entries.  {str(e)}"}, 500
 
 
+@enrichment_sim_web_ns.route("/recompute-estimates")
+class EnrichmentSimWebRecomputeResource(Resource):
+    """
+    Endpoint to recompute the *_estimate columns of all enrichments in batches
+    The recompute scans the whole table, so it runs in the background; its
+    outcome is logged.
+    """
+
+    @enrichment_sim_web_ns.response(202, "Estimates recompute started.")
+    @enrichment_sim_web_ns.response(400, "Validation Error.")
+    @enrichment_sim_web_ns.response(409, "A recompute is already running.")
+    @enrichment_sim_web_ns.response(500, "Internal Server Error.")
+    def post(self):
+        """Start recomputing revenue, ad spend and licensing estimates"""
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return {"message": "Request body must be a JSON object."}, 400
+        chunk_size = data.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size < 1:
+            return {"message": "chunk_size must be a positive integer."}, 400
+
+        try:
+            estimates = select_estimates(data.get("estimates"))
+            if is_recompute_running():
+                return {"message": "A recompute of the estimates is already running."}, 409
+            start_recompute(
+                current_app._get_current_object(),  # pylint: disable=protected-access
+                estimates=estimates,
+                chunk_size=chunk_size,
+            )
+            return {
+                "message": "Estimates recompute started.",
+                "data": {"estimates": estimates, "chunk_size": chunk_size},
+            }, 202
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error recomputing estimates: {str(e)}")
+            return {
+                "message": f"An error occurred while recomputing the estimates.{str(e)}"
+            }, 500
+
+
+@enrichment_sim_web_ns.route("/history/<int:brand_id>")
+class EnrichmentSimWebHistoryResource(Resource):
+    """
+    Endpoint to reconstruct the enrichment of a brand at a point in time
+    """
+
+    @enrichment_sim_web_ns.doc(params={"as_of": "ISO-8601 datetime, defaults to now"})
+    @enrichment_sim_web_ns.response(404, "No history found.")
+    @replica_read
+    def get(self, brand_id):
+        """Get the enrichment of a brand as of a date"""
+        try:
+            as_of = parse_datetime_arg("as_of") or datetime.utcnow()
+            result = enrichment_as_of(brand_id, as_of)
+            if not result:
+                return {
+                    "message": f"No enrichment history for brand {brand_id} before {as_of.isoformat()}"
+                }, 404
+
+            return {
+                "message": "EnrichmentSimWeb history successfully fetched.",
+                "data": result,
+            }, 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except SQLAlchemyError as e:
+            app_logger.error(f"Error getting enrichment history: {str(e)}")
+            return {
+                "message": "An error occurred while getting the enrichment history."
+            }, 500
+
+
+@enrichment_sim_web_ns.route("/history/<int:brand_id>/<string:metric>")
+class EnrichmentSimWebMetricHistoryResource(Resource):
+    """
+    Endpoint to get the time series of one enrichment metric of a brand
+    """
+
+    @enrichment_sim_web_ns.doc(
+        params={"start": "ISO-8601 datetime", "end": "ISO-8601 datetime"}
+    )
+    @replica_read
+    def get(self, brand_id, metric):
+        """Get the history of an enrichment metric as a time series"""
+        try:
+            series = metric_history(
+                brand_id,
+                metric,
+                start=parse_datetime_arg("start"),
+                end=parse_datetime_arg("end"),
+            )
+            return {
+                "message": "EnrichmentSimWeb metric history successfully fetched.",
+                "data": {"brand_id": brand_id, "metric": metric, "series": series},
+            }, 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except SQLAlchemyError as e:
+            app_logger.error(f"Error getting enrichment metric history: {str(e)}")
+            return {
+                "message": "An error occurred while getting the enrichment metric history."
+            }, 500
+
+
+@enrichment_sim_web_ns.route("/export")
+class EnrichmentSimWebExportResource(Resource):
+    """
+    Endpoint to export enrichments as a typed Arrow IPC stream
+    """
+
+    @enrichment_sim_web_ns.doc(
+        params={"since": "ISO-8601 watermark, only rows updated after it"}
+    )
+    @enrichment_sim_web_ns.produces(["application/vnd.apache.arrow.stream"])
+    @replica_read
+    def get(self):
+        """Stream a columnar snapshot of all (or recently changed) enrichments"""
+        try:
+            since = parse_datetime_arg("since")
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        return Response(
+            stream_with_context(iter_arrow_stream(since=since)),
+            mimetype="application/vnd.apache.arrow.stream",
+            headers={
+                "Content-Disposition": "attachment; filename=enrichments_simweb.arrows"
+            },
+        )
+
+
 @enrichment_sim_web_ns.route("/<int:enrichment_sim_web_id>")
 class EnrichmentSimWebResourceWithParam(Resource):
     """
@@ -228,7 +383,10 @@ class EnrichmentSimWebResourceWithParam(Resource):
     """
 
     # @enrichment_sim_web_ns.marshal_with(enrichment_sim_web_model)
+    @enrichment_sim_web_ns.response(304, "EnrichmentSimWeb not modified.")
     @enrichment_sim_web_ns.response(404, "EnrichmentSimWeb not found.")
+    @replica_read
+    @conditional_get(EnrichmentSimWeb, "enrichment_sim_web_id")
     def get(self, enrichment_sim_web_id):
         """Get a enrichment_sim_web by its ID"""
         try:
@@ -285,24 +443,99 @@ class EnrichmentSimWebResourceWithParam(Resource):
                     "message": "Fields like created_at, last_updated_at and enrichment_sim_web_id cannot be changed."
                 }, 403
 
+            # only changed columns are set, so identical values don't bump last_updated_at
+            changed_values = enrichment_sim_web.get_changed_values(data)
+            for key, value in changed_values.items():
+                setattr(enrichment_sim_web, key, value)
+
+            db.session.commit()
+
+            return {
+                "message": "EnrichmentSimWeb successfully updated.",
+                "data": enrichment_sim_web.to_dict(),
+            }, 200
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
+        except Exception as e:
+            db.session.rollback()
+            app_logger.error(
+                f"Error updating enrichment_sim_web {enrichment_sim_web_id}: {str(e)}"
+            )
+            return {
+                "message": f"An error occurred while updating the enrichment_sim_web.{str(e)}"
+            }, 500
+
+    @enrichment_sim_web_ns.response(200, "EnrichmentSimWeb successfully updated.")
+    @enrichment_sim_web_ns.response(400, "Validation Error.")
+    @enrichment_sim_web_ns.response(404, "EnrichmentSimWeb not found.")
+    @enrichment_sim_web_ns.response(500, "Internal Server Error.")
+    def patch(self, enrichment_sim_web_id):
+        """Partially update an enrichment_sim_web, writing only the changed columns"""
+        data = request.get_json(silent=True)
+
+        try:
+            if not isinstance(data, dict):
+                return {"message": "Input data should be an object of attributes."}, 400
+
+            if (
+                "created_at" in data
+                or "last_updated_at" in data
+                or "enrichment_sim_web_id" in data
+            ):
+                return {
+                    "message": "Fields like created_at, last_updated_at and enrichment_sim_web_id cannot be changed."
+                }, 403
+
             initialization_attrs = (
                 EnrichmentSimWebUtility().get_initialization_attributes()
             )
+            unknown_attrs = [key for key in data if key not in initialization_attrs]
+            if unknown_attrs:
+                return {
+                    "message": f"Unknown attributes: {', '.join(unknown_attrs)}"
+                }, 400
 
-            for x in initialization_attrs:
-                if x in data.keys():
-                    setattr(enrichment_sim_web, x, data[camel_to_snake(x)])
+            enrichment_sim_web = EnrichmentSimWeb.query.get(enrichment_sim_web_id)
+            if not enrichment_sim_web:
+                app_logger.info(
+                    f"EnrichmentSimWeb with id: {enrichment_sim_web_id} not found"
+                )
+                return {
+                    "message": f"EnrichmentSimWeb with id: {enrichment_sim_web_id} not found"
+                }, 404
 
+            changed_values = enrichment_sim_web.get_changed_values(data)
+            if not changed_values:
+                return {
+                    "message": "EnrichmentSimWeb already up to date.",
+                    "data": enrichment_sim_web.to_dict(),
+                }, 200
+
+            # Brand is only validated when the enrichment moves to another brand
+            if "brand_id" in changed_values:
+                brand = Brand.query.get(changed_values["brand_id"])
+                if not brand:
+                    return {
+                        "message": f"Brand with ID {changed_values['brand_id']} not found."
+                    }, 404
+
+            for key, value in changed_values.items():
+                setattr(enrichment_sim_web, key, value)
             db.session.commit()
 
             return {
                 "message": "EnrichmentSimWeb successfully updated.",
+                "updated_attributes": list(changed_values),
                 "data": enrichment_sim_web.to_dict(),
             }, 200
-        except Exception as e:
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
+        except SQLAlchemyError as e:
             db.session.rollback()
             app_logger.error(
-                f"Error updating enrichment_sim_web {enrichment_sim_web_id}: {str(e)}"
+                f"Error patching enrichment_sim_web {enrichment_sim_web_id}: {str(e)}"
             )
             return {
                 "message": f"An error occurred while updating the enrichment_sim_web.{str(e)}"
@@ -9,9 +9,15 @@ from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 
+from app.utility.json_encoding import output_json
+from app.utility.replicas import RoutingSession
+
 print("In extension", os.getenv("SQLALCHEMY_SCHEMA"))
 metadata = MetaData(schema=os.getenv("SQLALCHEMY_SCHEMA"))
 
-db = SQLAlchemy(metadata=metadata)
+# reads of @replica_read views go to the replicas, see app/utility/replicas.py
+db = SQLAlchemy(metadata=metadata, session_options={"class_": RoutingSession})
 migrate = Migrate()
 api = Api(validate=True)
+# orjson when installed, see app/utility/json_encoding.py
+api.representations["application/json"] = output_json
@@ -1,23 +1,274 @@
 """
 App level logger module based on runtime environment development or production
+
+Records of every logger go through a QueueHandler: the thread logging only
+puts them on a bounded queue (LOG_QUEUE_SIZE), and a QueueListener thread per
+process writes them to LOG_FILE as JSON lines. When the queue is full, the
+record is dropped rather than the request waiting, and the next one written
+says how many were ("dropped"). LOG_FILE is rotated by size (LOG_MAX_BYTES,
+LOG_BACKUP_COUNT), or by time with LOG_ROTATE_WHEN ("midnight", "H", ...);
+a "{pid}" in it gives each (forked) worker process its own file. The
+pipeline is set up by init_app (create_app), once per process; importing the
+module only defines the loggers.
+
+Records carry the id of the request logging them ("request_id", from its
+X-Request-Id header or generated, and sent back in the response, see
+init_app). Below WARNING, records of a same call site (logger, file and line)
+beyond LOG_SAMPLE_PER_SECOND in a second are left out, the next one kept
+saying how many were ("sampled_out"); 0 keeps them all.
 """
 
+import atexit
+import contextvars
+import copy
+import datetime
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+LOG_FORMAT_FIELDS = ("request_id", "sampled_out", "dropped")
+REQUEST_ID_HEADER = "X-Request-Id"
+
+# id of the request being handled, in its thread (Flask) or task (async reads)
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, tz=datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for field in LOG_FORMAT_FIELDS:
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the id of the current request to the records, in the logging thread
+    """
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps at most `per_second` records below WARNING per call site and second
+    """
+
+    def __init__(self, per_second):
+        super().__init__()
+        self.per_second = per_second
+        # call site: [second, records kept in it, records left out]
+        self._windows = {}
+        # the filter runs in every logging thread
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not self.per_second or record.levelno >= logging.WARNING:
+            return True
+        second = int(record.created)
+        key = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or window[0] != second:
+                skipped = window[2] if window is not None else 0
+                self._windows[key] = [second, 1, 0]
+                if skipped:
+                    record.sampled_out = skipped
+                return True
+            if window[1] < self.per_second:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler dropping the records the queue has no room for
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the message and traceback are rendered here, the arguments may
+        # change once the logging thread moves on
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.dropped, self.dropped = self.dropped, 0
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1 + (getattr(record, "dropped", None) or 0)
+
+
+def _file_handler():
+    """Handler writing LOG_FILE, rotated by size or time"""
+    path = os.getenv("LOG_FILE", "./logs/app.log").format(pid=os.getpid())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    when = os.getenv("LOG_ROTATE_WHEN")
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count, utc=True, delay=True
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+            backupCount=backup_count,
+            delay=True,
+        )
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+class _Pipeline:
+    """
+    Queue, handler and listener thread of this process
+    """
+
+    def __init__(self):
+        self.handler = NonBlockingQueueHandler(
+            queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        )
+        self.handler.addFilter(
+            SamplingFilter(int(os.getenv("LOG_SAMPLE_PER_SECOND", "10")))
+        )
+        self.handler.addFilter(RequestIdFilter())
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the listener thread writing the queued records"""
+        self.listener = logging.handlers.QueueListener(
+            self.handler.queue, _file_handler(), respect_handler_level=True
+        )
+        self.listener.start()
+
+    def stop(self):
+        """Write the queued records and stop the listener thread"""
+        with self._lock:
+            listener, self.listener = self.listener, None
+        if listener is None:
+            return
+        while True:
+            try:
+                listener.stop()
+                break
+            except queue.Full:
+                # no room for the sentinel yet, the listener is draining
+                time.sleep(0.01)
+        for handler in listener.handlers:
+            handler.close()
+
+    def restart_in_child(self):
+        """
+        A forked process has a copy of the queue but no listener thread (nor
+        its lock state), it starts over with its own
+        """
+        self._lock = threading.Lock()
+        self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+        self.handler.dropped = 0
+        self.start()
+
+
+def _configure():
+    """Start the pipeline of this process, the root logger writing to it"""
+    level = logging.INFO if os.getenv("FLASK_ENV") == "production" else logging.DEBUG
+    pipeline = _Pipeline()
+    pipeline.start()
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", logging.getLevelName(level)).upper())
+    root.addHandler(pipeline.handler)
+    atexit.register(pipeline.stop)
+    os.register_at_fork(after_in_child=pipeline.restart_in_child)
+    return pipeline
+
+
+# queued logging of this process, once configure() ran
+pipeline = None
+_configure_lock = threading.Lock()
+
+
+def configure():
+    """Set the logging pipeline up, the first time only"""
+    global pipeline  # pylint: disable=global-statement
+    with _configure_lock:
+        if pipeline is None:
+            pipeline = _configure()
+    return pipeline
 
-if os.getenv("FLASK_ENV") == "production":
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        filename="./logs/app.log",
-    )
-else:
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        filename="./logs/app.log",
-    )
 
 # Whenever a logger object is required, app_logger can be imported by
 # other files
 app_logger = logging.getLogger("companydb_app")
+
+
+def new_request_id(header_value=None):
+    """Id of a request, the one its client sent when usable"""
+    if header_value and len(header_value) <= 128 and header_value.isprintable():
+        return header_value
+    return uuid.uuid4().hex
+
+
+def init_app(app):
+    """
+    Set the logging pipeline up (see configure) and give every request of
+    `app` an id, logged with its records
+    """
+    configure()
+
+    @app.before_request
+    def set_request_id():
+        g.request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+        g.request_id_token = request_id.set(g.request_id)
+
+    @app.after_request
+    def send_request_id(response):
+        if "request_id" in g:
+            response.headers.setdefault(REQUEST_ID_HEADER, g.request_id)
+        return response
+
+    @app.teardown_request
+    def reset_request_id(_exception):
+        token = g.pop("request_id_token", None)
+        if token is not None:
+            request_id.reset(token)
@@ -4,9 +4,12 @@ API Routes for Core Functions
 
 import os
 
-from flask import jsonify
+from flask import Response, current_app, jsonify, request
 
+from app.extensions import db
 from app.logger import app_logger
+from app.utility import memory, metrics, prometheus
+from app.utility.pool import pool_stats
 
 from . import main
 
@@ -25,3 +28,96 @@ def main_index():
     # return jsonify({"status": 200, "message": "success"})
 
     return jsonify({"status": 200, "message": os.getenv("SQLALCHEMY_SCHEMA")})
+
+
+@main.route("/internal/metrics", methods=["GET"])
+def internal_metrics():
+    """Counters and gauges recorded by this process"""
+    return jsonify(metrics.snapshot())
+
+
+@main.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Request, DB and ingest metrics of all workers in Prometheus format"""
+    body, content_type = prometheus.render()
+    return Response(body, content_type=content_type)
+
+
+@main.route("/internal/pool", methods=["GET"])
+def internal_pool():
+    """Connection pool state and checkout wait times of this process"""
+    return jsonify(pool_stats(db.engines))
+
+
+@main.route("/internal/memory", methods=["GET"])
+@memory.for_worker
+def internal_memory():
+    """Allocation tracing state and peak memory of bulk and paged requests"""
+    return jsonify(memory.status())
+
+
+@main.route("/internal/memory/start", methods=["POST"])
+@memory.for_worker
+def internal_memory_start():
+    """Start tracing the allocations of this process"""
+    frames = request.args.get("frames", memory.DEFAULT_FRAMES, type=int)
+    if frames < 1:
+        return {"message": "frames should be a positive integer."}, 400
+    return jsonify(memory.start(frames))
+
+
+@main.route("/internal/memory/stop", methods=["POST"])
+@memory.for_worker
+def internal_memory_stop():
+    """Stop tracing and drop the snapshots"""
+    return jsonify(memory.stop())
+
+
+@main.route("/internal/memory/snapshots", methods=["POST"])
+@memory.for_worker
+def internal_memory_snapshot():
+    """Keep a snapshot of the traced allocations"""
+    try:
+        return jsonify({"snapshot": memory.take_snapshot(), "pid": os.getpid()}), 201
+    except ValueError as e:
+        return {"message": str(e)}, 400
+
+
+@main.route("/internal/memory/top", methods=["GET"])
+@memory.for_worker
+def internal_memory_top():
+    """Largest allocation sites of a snapshot or of the current heap"""
+    try:
+        sites = memory.top(
+            limit=request.args.get("limit", memory.DEFAULT_LIMIT, type=int),
+            key_type=request.args.get("key_type", "lineno"),
+            snapshot=request.args.get("snapshot"),
+        )
+    except ValueError as e:
+        return {"message": str(e)}, 400
+    return jsonify({"sites": sites, "pid": os.getpid()})
+
+
+@main.route("/internal/memory/diff", methods=["GET"])
+@memory.for_worker
+def internal_memory_diff():
+    """Allocation sites that grew the most between two snapshots"""
+    if not request.args.get("from"):
+        return {"message": "from is required."}, 400
+    try:
+        sites = memory.diff(
+            request.args["from"],
+            to_snapshot=request.args.get("to"),
+            limit=request.args.get("limit", memory.DEFAULT_LIMIT, type=int),
+            key_type=request.args.get("key_type", "lineno"),
+        )
+    except ValueError as e:
+        return {"message": str(e)}, 400
+    return jsonify({"sites": sites, "pid": os.getpid()})
+
+
+@main.route("/internal/replicas", methods=["GET"])
+def internal_replicas():
+    """Health of the read replicas as seen by this process"""
+    router = current_app.extensions.get("replica_router")
+    return jsonify(router.to_dict() if router else {})
@@ -8,6 +8,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from app.extensions import db
 from app.logger import app_logger
+from app.utility.replicas import replica_read
 
 from .models import Publisher, PublisherUtility
 
@@ -63,6 +64,7 @@ class PublisherResourceNoParams(Resource):
     """
 
     @publisher_ns.marshal_with(pagination_model)
+    @replica_read
     def get(self):
         """Get a list of publishers with pagination"""
         try:
@@ -135,6 +137,7 @@ class PublisherResourceWithParam(Resource):
     """
 
     @publisher_ns.response(404, "Publisher not found.")
+    @replica_read
     def get(self, publisher_id):
         """Get a publisher by its ID"""
         try:
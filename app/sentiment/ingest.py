@@ -0,0 +1,267 @@
+"""
+Bulk ingestion of sentiments
+
+Rows are validated in python (labels normalized with normalize_label), every
+referenced publisher, article, brand and batch id is checked with one IN query
+per table, and valid rows are inserted with multi-row INSERT ... RETURNING
+statements. Invalid rows don't stop the ingest, they are reported back with
+their index. NDJSON streams are committed block by block: when a block fails,
+the blocks before it stay committed and SentimentIngestError says how far the
+ingest got.
+"""
+
+import json
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.article.models import Article
+from app.batch_status.models import BatchStatus
+from app.brand.models import Brand
+from app.extensions import db
+from app.logger import app_logger
+from app.publisher.models import Publisher
+from app.utility import metrics
+from app.utility.labels import normalize_label
+
+from .models import Sentiment
+
+INSERT_CHUNK_SIZE = 1000
+STREAM_BLOCK_SIZE = 10000
+
+LABEL_FIELDS = ["link_source", "sentiment", "licensability"]
+TEXT_FIELDS = ["sentiment_version", "summary", "remarks"]
+# (field, model, primary key column, required)
+REFERENCE_FIELDS = [
+    ("publisher_id", Publisher, Publisher.__table__.c.publisher_id, False),
+    ("article_id", Article, Article.__table__.c.article_id, False),
+    ("brand_id", Brand, Brand.__table__.c.brand_id, True),
+    ("batch_id", BatchStatus, BatchStatus.__table__.c.batch_id, False),
+]
+
+
+class SentimentIngestResult:
+    """
+    Accumulates created ids and per-row errors of a bulk ingest
+    """
+
+    def __init__(self):
+        self.created = []
+        self.errors = []
+        # rows of the request up to this index are committed (NDJSON)
+        self.committed_until = 0
+        self.committed = 0
+
+    def mark_committed(self, next_index):
+        """Record that everything before the row at `next_index` is committed"""
+        self.committed_until = next_index
+        self.committed = len(self.created)
+
+    def add_error(self, index, message):
+        """Record an error for the row at `index`"""
+        self.errors.append({"index": index, "error": message})
+
+    def to_dict(self):
+        """
+        returns: Result in python dictionary
+        """
+        return {
+            "inserted": len(self.created),
+            "failed": len(self.errors),
+            "created": self.created,
+            "errors": sorted(self.errors, key=lambda error: error["index"]),
+        }
+
+
+class SentimentIngestError(Exception):
+    """
+    A block of an NDJSON ingest failed after earlier blocks were committed
+    """
+
+    def __init__(self, result, cause):
+        super().__init__(str(cause))
+        self.result = result
+
+    def to_dict(self):
+        """
+        returns: What was committed before the failure, and where to resume
+        """
+        return {
+            "committed": self.result.committed,
+            "created": self.result.created[: self.result.committed],
+            "resume_from_index": self.result.committed_until,
+        }
+
+
+def clean_sentiment_row(row, batch_id=None):
+    """
+    Validate one incoming sentiment and convert it to insertable column values
+    Raises ValueError with a readable message when the row is invalid
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Sentiment should be an object.")
+
+    values = {"batch_id": row.get("batch_id") or batch_id or None}
+    if values["batch_id"] is not None and not isinstance(values["batch_id"], str):
+        raise ValueError("batch_id should be a string.")
+    for field, _, _, required in REFERENCE_FIELDS:
+        if field == "batch_id":
+            continue
+        value = row.get(field)
+        if value in (None, ""):
+            if required:
+                raise ValueError(f"{field} is required.")
+            value = None
+        elif isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{field} should be an integer.")
+        values[field] = value
+
+    for field in LABEL_FIELDS:
+        values[field] = normalize_label(field, row.get(field))
+
+    for field in TEXT_FIELDS:
+        value = row.get(field)
+        values[field] = None if value is None else str(value)
+
+    is_manually_verified = row.get("is_manually_verified", False)
+    if not isinstance(is_manually_verified, bool):
+        raise ValueError("is_manually_verified should be a boolean.")
+    values["is_manually_verified"] = is_manually_verified
+    return values
+
+
+def find_missing_references(rows):
+    """
+    Check all referenced ids with one IN query per table
+    Args:
+        rows (list): Tuples of (index, values) from clean_sentiment_row
+    returns: {index: error message} for rows referencing unknown ids
+    """
+    missing = {}
+    for field, model, primary_key, _ in REFERENCE_FIELDS:
+        referenced = {values[field] for _, values in rows if values[field] is not None}
+        if not referenced:
+            continue
+        existing = set(
+            db.session.execute(select(primary_key).where(primary_key.in_(referenced)))
+            .scalars()
+            .all()
+        )
+        for index, values in rows:
+            if values[field] is not None and values[field] not in existing:
+                missing.setdefault(
+                    index,
+                    f"{model.__name__} with ID {values[field]} not found.",
+                )
+    return missing
+
+
+def insert_sentiment_rows(rows, result):
+    """
+    Insert validated rows with multi-row INSERT ... RETURNING, chunk by chunk
+    Each chunk runs in a savepoint, a failing chunk only fails its own rows.
+    Args:
+        rows (list): Tuples of (index, values) already checked for references
+        result (SentimentIngestResult): Collects created ids and chunk errors
+    """
+    statement = insert(Sentiment.__table__).returning(
+        Sentiment.__table__.c.sentiment_id, sort_by_parameter_order=True
+    )
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start : start + INSERT_CHUNK_SIZE]
+        try:
+            with db.session.begin_nested():
+                sentiment_ids = (
+                    db.session.execute(statement, [values for _, values in chunk])
+                    .scalars()
+                    .all()
+                )
+        except SQLAlchemyError as e:
+            app_logger.error(f"Error inserting sentiment chunk: {str(e)}")
+            for index, _ in chunk:
+                result.add_error(index, "Database error while inserting sentiment.")
+            continue
+        result.created.extend(
+            {"index": index, "sentiment_id": sentiment_id}
+            for (index, _), sentiment_id in zip(chunk, sentiment_ids)
+        )
+        metrics.increment(
+            "bulk_ingest_rows_total", len(sentiment_ids), kind="sentiment"
+        )
+
+
+def ingest_sentiments(indexed_rows, result=None, batch_id=None):
+    """
+    Validate and insert one block of incoming sentiments
+    Args:
+        indexed_rows (list): Tuples of (index, raw row) from the request
+        result (SentimentIngestResult): Result to add to, a new one when None
+        batch_id (str): Default batch_id for rows that don't carry one
+    returns: SentimentIngestResult
+    """
+    result = result or SentimentIngestResult()
+
+    cleaned = []
+    for index, row in indexed_rows:
+        try:
+            cleaned.append((index, clean_sentiment_row(row, batch_id=batch_id)))
+        except ValueError as e:
+            result.add_error(index, str(e))
+
+    missing = find_missing_references(cleaned)
+    for index, message in missing.items():
+        result.add_error(index, message)
+
+    insert_sentiment_rows(
+        [(index, values) for index, values in cleaned if index not in missing],
+        result,
+    )
+    return result
+
+
+def iter_ndjson_blocks(lines, block_size=STREAM_BLOCK_SIZE, start_index=0):
+    """
+    Group NDJSON lines into blocks of (index, row) tuples
+    Lines that are not valid JSON are yielded with an exception as row,
+    blank lines are skipped but still count towards the index.
+    """
+    block = []
+    for index, line in enumerate(lines, start=start_index):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except UnicodeDecodeError:
+            row = ValueError(f"Line {index} is not valid UTF-8.")
+        except ValueError:
+            row = ValueError(f"Line {index} is not valid JSON.")
+        block.append((index, row))
+        if len(block) >= block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def ingest_ndjson(lines, batch_id=None):
+    """
+    Ingest a stream of NDJSON sentiments block by block, committing each block
+    Raises SentimentIngestError when a block fails, its rows are rolled back
+    returns: SentimentIngestResult
+    """
+    result = SentimentIngestResult()
+    for block in iter_ndjson_blocks(lines, block_size=STREAM_BLOCK_SIZE):
+        valid_rows = []
+        for index, row in block:
+            if isinstance(row, ValueError):
+                result.add_error(index, str(row))
+            else:
+                valid_rows.append((index, row))
+        try:
+            ingest_sentiments(valid_rows, result=result, batch_id=batch_id)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise SentimentIngestError(result, e) from e
+        result.mark_committed(block[-1][0] + 1)
+    return result
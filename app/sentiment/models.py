@@ -29,6 +29,36 @@ class UrlSourceEnum(enum.Enum):
 
 class Sentiment(db.Model):
     __tablename__ = "sentiments"
+    # (<filter>, sentiment_id) indexes serve the filtered list in keyset order
+    # and the FK cascades on brand, publisher, article and batch deletes
+    __table_args__ = (
+        db.Index("ix_sentiments_brand_id_sentiment_id", "brand_id", "sentiment_id"),
+        db.Index(
+            "ix_sentiments_publisher_id_sentiment_id", "publisher_id", "sentiment_id"
+        ),
+        db.Index("ix_sentiments_article_id_sentiment_id", "article_id", "sentiment_id"),
+        db.Index("ix_sentiments_batch_id", "batch_id"),
+        db.Index(
+            "ix_sentiments_brand_id_labels_sentiment_id",
+            "brand_id",
+            "sentiment",
+            "licensability",
+            "sentiment_id",
+        ),
+        db.Index(
+            "ix_sentiments_labels_sentiment_id",
+            "sentiment",
+            "licensability",
+            "sentiment_id",
+        ),
+        db.Index(
+            "ix_sentiments_unverified_brand_id_sentiment_id",
+            "brand_id",
+            "sentiment_id",
+            postgresql_where=db.text("is_manually_verified = false"),
+        ),
+        db.Index("ix_sentiments_created_at", "created_at"),
+    )
 
     sentiment_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
@@ -109,9 +139,9 @@ class Sentiment(db.Model):
             "article_id": self.article_id,
             "brand_id": self.brand_id,
             "sentiment_version": self.sentiment_version,
-            "link_source": self.link_source,
-            "sentiment": self.sentiment,
-            "licensability": self.licensability,
+            "link_source": self.link_source.value if self.link_source else None,
+            "sentiment": self.sentiment.value if self.sentiment else None,
+            "licensability": self.licensability.value if self.licensability else None,
             "summary": self.summary,
             "is_manually_verified": self.is_manually_verified,
             "remarks": self.remarks,
@@ -120,3 +150,42 @@ class Sentiment(db.Model):
                 self.last_updated_at.isoformat() if self.last_updated_at else None
             ),
         }
+
+
+class SentimentRollup(db.Model):
+    """
+    Number of sentiments per (brand, publisher, day, sentiment, licensability)
+    Maintained by database triggers on sentiments, see app/sentiment/rollup.py
+    """
+
+    __tablename__ = "sentiment_rollups"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "brand_id",
+            "publisher_id",
+            "day",
+            "sentiment",
+            "licensability",
+            name="uq_sentiment_rollups_group",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    rollup_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    # no foreign keys: rows are derived data, written from inside the triggers
+    brand_id = db.Column(db.Integer, nullable=False)
+    publisher_id = db.Column(db.Integer, nullable=True)
+    day = db.Column(db.Date, nullable=False)
+    sentiment = db.Column(db.Enum(SentimentEnum), nullable=True)
+    licensability = db.Column(db.Enum(LicensabilityEnum), nullable=True)
+    sentiment_count = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "brand_id": self.brand_id,
+            "publisher_id": self.publisher_id,
+            "day": self.day.isoformat(),
+            "sentiment": self.sentiment.value if self.sentiment else None,
+            "licensability": self.licensability.value if self.licensability else None,
+            "sentiment_count": self.sentiment_count,
+        }
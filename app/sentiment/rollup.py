@@ -0,0 +1,201 @@
+"""
+Sentiment rollup maintained by database triggers
+
+sentiment_rollups holds the number of sentiments per (brand, publisher, day,
+sentiment, licensability). Statement level triggers on sentiments apply the
+net change of each INSERT/UPDATE/DELETE from its transition tables, so a bulk
+insert costs one upsert per touched group instead of one per row, and writes
+made outside the ORM (bulk ingest, raw SQL, cascades) are counted as well.
+Aggregates are then read from the rollup in O(groups).
+
+The trigger DDL below is also what migration 8b41e6c0d2f7 runs, keep it
+compatible with existing databases. It needs PostgreSQL 15 or later
+(NULLS NOT DISTINCT on the rollup group, CREATE OR REPLACE TRIGGER).
+"""
+
+from sqlalchemy import event, func, select
+
+from app.extensions import db
+
+from .models import Sentiment, SentimentRollup
+
+GROUP_BY_FIELDS = ["brand_id", "publisher_id", "day"]
+TRIGGER_EVENTS = ("insert", "update", "delete", "truncate")
+UNKNOWN_VALUE = "unknown"
+
+_GROUP_COLUMNS = "brand_id, publisher_id, day, sentiment, licensability"
+_SOURCE_COLUMNS = "brand_id, publisher_id, created_at::date AS day, sentiment, licensability"
+
+
+def rollup_trigger_statements(sentiments_table, rollups_table):
+    """
+    DDL creating the rollup trigger function and triggers
+    Args:
+        sentiments_table (str): Schema qualified name of the sentiments table
+        rollups_table (str): Schema qualified name of the rollup table
+    returns: List of SQL statements
+    """
+    function_name = f"{sentiments_table}_rollup_apply"
+    upsert = f"""
+        INSERT INTO {rollups_table} AS r ({_GROUP_COLUMNS}, sentiment_count)
+        SELECT {_GROUP_COLUMNS}, sum(delta) FROM (%s) AS changes
+        GROUP BY {_GROUP_COLUMNS}
+        HAVING sum(delta) <> 0
+        ORDER BY {_GROUP_COLUMNS}
+        ON CONFLICT ON CONSTRAINT uq_sentiment_rollups_group
+        DO UPDATE SET sentiment_count = r.sentiment_count + EXCLUDED.sentiment_count;
+    """
+    new_rows = f"SELECT {_SOURCE_COLUMNS}, 1 AS delta FROM new_rows"
+    old_rows = f"SELECT {_SOURCE_COLUMNS}, -1 AS delta FROM old_rows"
+
+    # transition tables are only visible to the trigger of their own event,
+    # plpgsql plans each branch lazily so the other branches never see them
+    statements = [
+        f"""
+        CREATE OR REPLACE FUNCTION {function_name}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {upsert % new_rows}
+            ELSIF TG_OP = 'DELETE' THEN
+                {upsert % old_rows}
+            ELSIF TG_OP = 'UPDATE' THEN
+                {upsert % f"{new_rows} UNION ALL {old_rows}"}
+            ELSIF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM {rollups_table};
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    ]
+    for event_name, transition in (
+        ("insert", "NEW TABLE AS new_rows"),
+        ("update", "NEW TABLE AS new_rows OLD TABLE AS old_rows"),
+        ("delete", "OLD TABLE AS old_rows"),
+    ):
+        statements.append(
+            f"CREATE OR REPLACE TRIGGER sentiments_rollup_{event_name} "
+            f"AFTER {event_name.upper()} ON {sentiments_table} "
+            f"REFERENCING {transition} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {function_name}()"
+        )
+    statements.append(
+        f"CREATE OR REPLACE TRIGGER sentiments_rollup_truncate "
+        f"AFTER TRUNCATE ON {sentiments_table} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION {function_name}()"
+    )
+    return statements
+
+
+def drop_rollup_trigger_statements(sentiments_table):
+    """
+    DDL dropping what rollup_trigger_statements creates
+    """
+    return [
+        *[
+            f"DROP TRIGGER IF EXISTS sentiments_rollup_{event_name} ON {sentiments_table}"
+            for event_name in TRIGGER_EVENTS
+        ],
+        f"DROP FUNCTION IF EXISTS {sentiments_table}_rollup_apply()",
+    ]
+
+
+def rebuild_statements(sentiments_table, rollups_table):
+    """
+    SQL recomputing the whole rollup from sentiments
+    """
+    return [
+        f"DELETE FROM {rollups_table}",
+        f"""
+        INSERT INTO {rollups_table} ({_GROUP_COLUMNS}, sentiment_count)
+        SELECT {_SOURCE_COLUMNS}, count(*) FROM {sentiments_table}
+        GROUP BY {_GROUP_COLUMNS}
+        """,
+    ]
+
+
+@event.listens_for(db.metadata, "after_create")
+def create_rollup_triggers(metadata, connection, tables=(), **kw):
+    """
+    Databases created with db.create_all() (init-db) get the triggers too,
+    once both tables exist
+    """
+    if connection.dialect.name != "postgresql" or SentimentRollup.__table__ not in tables:
+        return
+    for statement in rollup_trigger_statements(
+        Sentiment.__table__.fullname, SentimentRollup.__table__.fullname
+    ):
+        connection.exec_driver_sql(statement)
+
+
+def rebuild_sentiment_rollup():
+    """
+    Recompute the rollup from scratch, e.g. after loading data with triggers disabled
+    returns: Number of groups in the rollup
+    """
+    for statement in rebuild_statements(
+        Sentiment.__table__.fullname, SentimentRollup.__table__.fullname
+    ):
+        db.session.execute(db.text(statement))
+    db.session.commit()
+    return db.session.execute(select(func.count()).select_from(SentimentRollup)).scalar()
+
+
+def sentiment_stats(
+    group_by, brand_id=None, publisher_id=None, start_day=None, end_day=None
+):
+    """
+    Sentiment and licensability counts read from the rollup
+    Args:
+        group_by (list): Subset of GROUP_BY_FIELDS, an empty list gives one overall group
+        brand_id (int): Only count sentiments of this brand
+        publisher_id (int): Only count sentiments of this publisher
+        start_day (date): First day included
+        end_day (date): Last day included
+    returns: List of {<group_by fields>, "total", "sentiment": {value: count},
+        "licensability": {value: count}}
+    """
+    unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise ValueError(f"Cannot group sentiments by: {', '.join(unknown)}")
+
+    table = SentimentRollup.__table__
+    dimensions = [table.c[field] for field in group_by]
+    query = (
+        select(
+            *dimensions,
+            table.c.sentiment,
+            table.c.licensability,
+            func.sum(table.c.sentiment_count),
+        )
+        .where(table.c.sentiment_count > 0)
+        .group_by(*dimensions, table.c.sentiment, table.c.licensability)
+        .order_by(*dimensions)
+    )
+    if brand_id is not None:
+        query = query.where(table.c.brand_id == brand_id)
+    if publisher_id is not None:
+        query = query.where(table.c.publisher_id == publisher_id)
+    if start_day is not None:
+        query = query.where(table.c.day >= start_day)
+    if end_day is not None:
+        query = query.where(table.c.day <= end_day)
+
+    groups = {}
+    for row in db.session.execute(query):
+        key = tuple(row[: len(group_by)])
+        sentiment, licensability, count = row[len(group_by) :]
+        group = groups.get(key)
+        if group is None:
+            group = dict(zip(group_by, key))
+            if "day" in group:
+                group["day"] = group["day"].isoformat()
+            group.update({"total": 0, "sentiment": {}, "licensability": {}})
+            groups[key] = group
+
+        count = int(count)
+        group["total"] += count
+        for name, value in (("sentiment", sentiment), ("licensability", licensability)):
+            label = value.value if value is not None else UNKNOWN_VALUE
+            group[name][label] = group[name].get(label, 0) + count
+    return list(groups.values())
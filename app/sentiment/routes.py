@@ -2,6 +2,8 @@
 sentiment_ns Routes for Sentiment
 """
 
+from datetime import date
+
 from flask import request
 from flask_restx import Namespace, Resource, fields
 from sqlalchemy.exc import SQLAlchemyError
@@ -11,8 +13,13 @@ from app.brand.models import Brand
 from app.extensions import db
 from app.logger import app_logger
 from app.publisher.models import Publisher
+from app.utility.labels import normalize_label
+from app.utility.replicas import replica_read
+from app.utility.utils import EnumValue, parse_datetime_arg
 
-from .models import Sentiment
+from .ingest import SentimentIngestError, ingest_ndjson, ingest_sentiments
+from .models import LicensabilityEnum, Sentiment, SentimentEnum
+from .rollup import GROUP_BY_FIELDS, sentiment_stats
 
 sentiment_ns = Namespace("sentiments", description="Sentiment related operations")
 
@@ -30,8 +37,9 @@ sentiment_model = sentiment_ns.model(
         "sentiment_version": fields.String(
             description="Version of the sentiment analysis"
         ),
-        "link_source": fields.String(description="Source link of the sentiment"),
-        "sentiment": fields.String(description="The sentiment value"),
+        "link_source": EnumValue(description="Source link of the sentiment"),
+        "sentiment": EnumValue(description="The sentiment value"),
+        "licensability": EnumValue(description="The licensability value"),
         "summary": fields.String(description="Summary of the sentiment"),
         "is_manually_verified": fields.Boolean(
             description="Whether the sentiment is manually verified"
@@ -54,6 +62,9 @@ pagination_model = sentiment_ns.model(
         "total_items": fields.Integer(description="Total number of items available."),
         "total_pages": fields.Integer(description="Total number of pages available."),
         "current_page": fields.Integer(description="The current page number."),
+        "next_cursor": fields.Integer(
+            description="Pass as cursor to fetch the next page, null on the last page."
+        ),
         "sentiments": fields.List(
             fields.Nested(sentiment_model), description="List of sentiments."
         ),
@@ -61,39 +72,133 @@ pagination_model = sentiment_ns.model(
 )
 
 
+def get_sentiment_filters():
+    """
+    Build SQLAlchemy filters for the sentiment list from the query arguments
+    Every combination is served by one of the indexes in __table_args__ of Sentiment.
+    Raises ValueError on invalid values
+    """
+    filters = []
+    for field in ("brand_id", "publisher_id", "article_id"):
+        value = request.args.get(field)
+        if value is None:
+            continue
+        try:
+            filters.append(getattr(Sentiment, field) == int(value))
+        except ValueError as e:
+            raise ValueError(f"{field} should be an integer: {value}") from e
+
+    for field, enum_type in (
+        ("sentiment", SentimentEnum),
+        ("licensability", LicensabilityEnum),
+    ):
+        value = request.args.get(field)
+        if value is None:
+            continue
+        try:
+            filters.append(getattr(Sentiment, field) == enum_type(value))
+        except ValueError as e:
+            raise ValueError(f"Invalid {field}: {value}") from e
+
+    is_manually_verified = request.args.get("is_manually_verified")
+    if is_manually_verified is not None:
+        if is_manually_verified.lower() not in ("true", "false"):
+            raise ValueError("is_manually_verified should be true or false.")
+        filters.append(
+            Sentiment.is_manually_verified == (is_manually_verified.lower() == "true")
+        )
+
+    created_from = parse_datetime_arg("created_from")
+    if created_from:
+        filters.append(Sentiment.created_at >= created_from)
+    created_to = parse_datetime_arg("created_to")
+    if created_to:
+        filters.append(Sentiment.created_at < created_to)
+    return filters
+
+
 @sentiment_ns.route("/")
 class SentimentListResource(Resource):
     """
     Endpoints related to Sentiment without ID param
     """
 
-    @sentiment_ns.marshal_list_with(pagination_model)
+    @sentiment_ns.doc(
+        params={
+            "page": "Page number (ignored when cursor is given)",
+            "page_size": "Number of sentiments per page",
+            "cursor": "Return sentiments with an ID below this one (next_cursor of the previous page)",
+            "brand_id": "Filter by brand",
+            "publisher_id": "Filter by publisher",
+            "article_id": "Filter by article",
+            "sentiment": "Filter by sentiment value",
+            "licensability": "Filter by licensability value",
+            "is_manually_verified": "Filter by verification state (true/false)",
+            "created_from": "Created at or after this ISO-8601 datetime",
+            "created_to": "Created before this ISO-8601 datetime",
+        }
+    )
+    @sentiment_ns.response(200, "Success", pagination_model)
+    @sentiment_ns.response(400, "Validation Error.")
+    @replica_read
     def get(self):
-        """Get a list of sentiments with pagination"""
+        """Get a list of sentiments with filters and pagination"""
         try:
             page_number = request.args.get("page", 1, type=int)
             page_size = request.args.get("page_size", 10, type=int)
+            cursor = request.args.get("cursor")
+            if cursor is not None:
+                try:
+                    cursor = int(cursor)
+                except ValueError:
+                    return {"message": f"cursor should be an integer: {cursor}"}, 400
+
+            try:
+                filters = get_sentiment_filters()
+            except ValueError as e:
+                return {"message": str(e)}, 400
 
             # Query sentiments in descending order by ID
-            query = Sentiment.query.order_by(Sentiment.sentiment_id.desc())
-            pagination = query.paginate(
-                page=page_number, per_page=page_size, error_out=False
+            query = Sentiment.query.filter(*filters).order_by(
+                Sentiment.sentiment_id.desc()
             )
 
-            sentiments = pagination.items
-            total_items = pagination.total
-            total_pages = pagination.pages
-            first_page_number = 1
-            last_page_number = total_pages
-
-            return {
-                "first_page_number": first_page_number,
-                "last_page_number": last_page_number,
-                "total_items": total_items,
-                "total_pages": total_pages,
-                "current_page": page_number,
-                "sentiments": sentiments,
-            }
+            if cursor is not None:
+                # Keyset pagination: no OFFSET and no COUNT(*), cost stays flat on deep pages
+                sentiments = (
+                    query.filter(Sentiment.sentiment_id < cursor)
+                    .limit(page_size + 1)
+                    .all()
+                )
+                has_more = len(sentiments) > page_size
+                sentiments = sentiments[:page_size]
+                total_items = None
+                total_pages = None
+                current_page = None
+            else:
+                pagination = query.paginate(
+                    page=page_number, per_page=page_size, error_out=False
+                )
+                sentiments = pagination.items
+                has_more = pagination.has_next
+                total_items = pagination.total
+                total_pages = pagination.pages
+                current_page = page_number
+
+            return sentiment_ns.marshal(
+                {
+                    "first_page_number": 1,
+                    "last_page_number": total_pages,
+                    "total_items": total_items,
+                    "total_pages": total_pages,
+                    "current_page": current_page,
+                    "next_cursor": (
+                        sentiments[-1].sentiment_id if has_more and sentiments else None
+                    ),
+                    "sentiments": sentiments,
+                },
+                pagination_model,
+            )
         except SQLAlchemyError as e:
             db.session.rollback()
             app_logger.error(f"Error while fetching sentiments: {str(e)}")
@@ -130,8 +235,11 @@ class SentimentListResource(Resource):
                 article_id=data.get("article_id"),
                 brand_id=data.get("brand_id"),
                 sentiment_version=data.get("sentiment_version"),
-                link_source=data.get("link_source"),
-                sentiment=data.get("sentiment"),
+                link_source=normalize_label("link_source", data.get("link_source")),
+                sentiment=normalize_label("sentiment", data.get("sentiment")),
+                licensability=normalize_label(
+                    "licensability", data.get("licensability")
+                ),
                 summary=data.get("summary"),
                 is_manually_verified=data.get("is_manually_verified", False),
                 remarks=data.get("remarks", ""),
@@ -145,6 +253,9 @@ class SentimentListResource(Resource):
                 "message": "Sentiment successfully created.",
                 "sentiment": new_sentiment.to_dict(),
             }, 201
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
         except SQLAlchemyError as e:
             db.session.rollback()
             app_logger.error(f"Error creating brand: {str(e)}")
@@ -153,6 +264,113 @@ class SentimentListResource(Resource):
             }, 500
 
 
+@sentiment_ns.route("/bulk")
+class SentimentBulkResource(Resource):
+    """
+    Endpoint to ingest many sentiments at once
+    Accepts a JSON array, or NDJSON (one sentiment per line) streamed with
+    Content-Type: application/x-ndjson. Invalid rows are reported per index.
+    NDJSON is committed block by block, a failing block answers 500 with the
+    number of rows committed before it and the index to resume from.
+    """
+
+    @sentiment_ns.doc(params={"batch_id": "Default batch_id for the sentiments"})
+    @sentiment_ns.response(201, "Sentiments successfully created.")
+    @sentiment_ns.response(207, "Some sentiments could not be created.")
+    @sentiment_ns.response(400, "Validation Error.")
+    @sentiment_ns.response(500, "Internal Server Error.")
+    def post(self):
+        """Create sentiments in bulk"""
+        batch_id = request.args.get("batch_id") or None
+
+        try:
+            if request.mimetype == "application/x-ndjson":
+                result = ingest_ndjson(request.stream, batch_id=batch_id)
+            else:
+                data = request.get_json(silent=True)
+                if not isinstance(data, list):
+                    return {"message": "Input data should be a list of sentiments."}, 400
+
+                # Limit the number of sentiments in a single JSON array, use NDJSON above it
+                MAX_SENTIMENTS = 100000
+                if len(data) > MAX_SENTIMENTS:
+                    return {
+                        "message": f"You can submit a maximum of {MAX_SENTIMENTS} sentiments at a time. Use NDJSON for larger loads."
+                    }, 400
+
+                result = ingest_sentiments(list(enumerate(data)), batch_id=batch_id)
+                db.session.commit()
+
+            status = 207 if result.errors else 201
+            return {
+                "message": f"{len(result.created)} sentiments successfully created.",
+                **result.to_dict(),
+            }, status
+        except SentimentIngestError as e:
+            app_logger.error(f"Error creating sentiments in bulk: {str(e)}")
+            return {
+                "message": (
+                    f"An error occurred while creating sentiments, "
+                    f"{e.result.committed} were committed before it.{str(e)}"
+                ),
+                **e.to_dict(),
+            }, 500
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error creating sentiments in bulk: {str(e)}")
+            return {
+                "message": f"An error occurred while creating sentiments.{str(e)}"
+            }, 500
+
+
+@sentiment_ns.route("/stats")
+class SentimentStatsResource(Resource):
+    """
+    Endpoint for aggregated sentiment counts, read from the sentiment rollup
+    """
+
+    @sentiment_ns.doc(
+        params={
+            "group_by": f"Comma separated subset of {', '.join(GROUP_BY_FIELDS)}",
+            "brand_id": "Only count sentiments of this brand",
+            "publisher_id": "Only count sentiments of this publisher",
+            "start_day": "First day included (YYYY-MM-DD)",
+            "end_day": "Last day included (YYYY-MM-DD)",
+        }
+    )
+    @sentiment_ns.response(200, "Sentiment stats successfully fetched.")
+    @sentiment_ns.response(400, "Validation Error.")
+    @replica_read
+    def get(self):
+        """Get sentiment and licensability counts per brand, publisher and/or day"""
+        try:
+            group_by = [
+                field.strip()
+                for field in request.args.get("group_by", "brand_id").split(",")
+                if field.strip()
+            ]
+            start_day = request.args.get("start_day")
+            end_day = request.args.get("end_day")
+            stats = sentiment_stats(
+                group_by,
+                brand_id=request.args.get("brand_id", type=int),
+                publisher_id=request.args.get("publisher_id", type=int),
+                start_day=date.fromisoformat(start_day) if start_day else None,
+                end_day=date.fromisoformat(end_day) if end_day else None,
+            )
+            return {
+                "message": "Sentiment stats successfully fetched.",
+                "group_by": group_by,
+                "data": stats,
+            }, 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            app_logger.error(f"Error while fetching sentiment stats: {str(e)}")
+            return {"message": "An error occurred while fetching sentiment stats."}, 500
+
+
 @sentiment_ns.route("/<int:sentiment_id>")
 class SentimentResource(Resource):
     """
@@ -160,6 +378,7 @@ class SentimentResource(Resource):
     """
 
     @sentiment_ns.response(404, "Sentiment not found.")
+    @replica_read
     def get(self, sentiment_id):
         """Get a sentiment by its ID"""
         try:
@@ -217,8 +436,10 @@ class SentimentResource(Resource):
             sentiment.sentiment_version = data.get(
                 "sentiment_version", sentiment.sentiment_version
             )
-            sentiment.link_source = data.get("link_source", sentiment.link_source)
-            sentiment.sentiment = data.get("sentiment", sentiment.sentiment)
+            # labels are normalized so misspelled values never land in the enum columns
+            for label in ("link_source", "sentiment", "licensability"):
+                if label in data:
+                    setattr(sentiment, label, normalize_label(label, data[label]))
             sentiment.summary = data.get("summary", sentiment.summary)
             sentiment.is_manually_verified = data.get(
                 "is_manually_verified", sentiment.is_manually_verified
@@ -232,6 +453,9 @@ class SentimentResource(Resource):
                 "message": "Sentiment successfully updated.",
                 "sentiment": sentiment.to_dict(),
             }
+        except ValueError as e:
+            db.session.rollback()
+            return {"message": str(e)}, 400
         except SQLAlchemyError as e:
             db.session.rollback()
             app_logger.error(
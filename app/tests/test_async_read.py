@@ -0,0 +1,97 @@
+"""
+Tests of the read-only ASGI app: same answers as the Flask GETs
+"""
+
+import pytest
+from sqlalchemy import insert
+from starlette.testclient import TestClient
+
+from app.article.models import Article
+from app.async_read import create_asgi_app
+from app.async_read.db import async_database_uri
+from app.brand.models import Brand
+from app.enrichment_simweb.models import EnrichmentSimWeb
+from app.publisher.models import Publisher
+
+
+@pytest.fixture()
+def asgi_client(app, session):  # pylint: disable=unused-argument
+    with TestClient(create_asgi_app(app), client=("127.0.0.1", 50000)) as test_client:
+        yield test_client
+
+
+@pytest.fixture()
+def rows(session):
+    publisher_id = session.execute(
+        insert(Publisher.__table__)
+        .values(name="async")
+        .returning(Publisher.publisher_id)
+    ).scalar_one()
+    session.execute(
+        insert(Article.__table__),
+        [
+            {"publisher_id": publisher_id, "url": f"https://async.example/{index}"}
+            for index in range(3)
+        ],
+    )
+    brand_ids = [
+        session.execute(
+            insert(Brand.__table__)
+            .values(name=f"async {index}", website=f"async{index}.example")
+            .returning(Brand.brand_id)
+        ).scalar_one()
+        for index in range(3)
+    ]
+    session.execute(
+        insert(EnrichmentSimWeb.__table__),
+        [
+            {"brand_id": brand_id, "rank": 10, "ppc_spend": 1.5}
+            for brand_id in brand_ids
+        ],
+    )
+    session.commit()
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/article/?page=2&page_size=2",
+        "/article/?page=zero",
+        "/article/1",
+        "/article/999",
+        "/brand/?page_size=10",
+        "/brand/3",
+        "/brand/999",
+        "/enrichmentsimweb/?page_size=2",
+        "/enrichmentsimweb/2",
+        "/enrichmentsimweb/999",
+    ],
+)
+def test_reads_answer_like_the_flask_app(client, asgi_client, rows, path):
+    expected = client.get(path)
+
+    response = asgi_client.get(path)
+
+    assert response.status_code == expected.status_code
+    assert response.json() == expected.json
+
+
+def test_other_requests_go_to_the_flask_app(asgi_client, rows):
+    response = asgi_client.get("/health-check")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": 200, "message": "success"}
+
+
+def test_other_clients_are_refused(app):
+    with TestClient(create_asgi_app(app), client=("10.0.0.1", 50000)) as test_client:
+        assert test_client.get("/article/1").status_code == 403
+
+
+def test_async_database_uri():
+    assert (
+        async_database_uri("postgresql://user:pw@db/app").render_as_string(False)
+        == "postgresql+asyncpg://user:pw@db/app"
+    )
+    with pytest.raises(ValueError):
+        async_database_uri("sqlite://")
@@ -0,0 +1,202 @@
+"""
+Tests of BatchJob leasing and of the batch expiry sweeper
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select, text, update
+
+from app.batch_status import jobs
+from app.batch_status.expiry import expire_batches
+from app.batch_status.models import (
+    EXPIRABLE_STATUSES,
+    EXPIRED_STATUS,
+    JOB_FAILED,
+    JOB_LEASED,
+    JOB_PENDING,
+    BatchJob,
+    BatchStatus,
+)
+from app.extensions import db
+from app.publisher.models import Publisher
+
+BATCH_IDS = ["batch_1", "batch_2", "batch_3"]
+
+
+@pytest.fixture()
+def batch_ids(session):
+    publisher_id = session.execute(
+        insert(Publisher.__table__)
+        .values(name="jobs publisher")
+        .returning(Publisher.publisher_id)
+    ).scalar_one()
+    session.execute(
+        insert(BatchStatus.__table__),
+        [
+            {"batch_id": batch_id, "publisher_id": publisher_id, "status": "completed"}
+            for batch_id in BATCH_IDS
+        ],
+    )
+    session.commit()
+    return BATCH_IDS
+
+
+def _job(session, job_id):
+    table = BatchJob.__table__
+    session.expire_all()
+    return session.execute(select(table).where(table.c.job_id == job_id)).mappings().one()
+
+
+def _expire_leases(session):
+    table = BatchJob.__table__
+    past = db.func.now() - timedelta(seconds=1)
+    session.execute(update(table).values(lease_expires_at=past, available_at=past))
+    session.commit()
+
+
+def test_enqueue_is_idempotent_while_active(session, batch_ids):
+    job, created = jobs.enqueue_job(batch_ids[0], jobs.LOAD_RESULTS)
+    again, created_again = jobs.enqueue_job(batch_ids[0], jobs.LOAD_RESULTS)
+
+    assert created and not created_again
+    assert again.job_id == job.job_id
+    with pytest.raises(ValueError):
+        jobs.enqueue_job(batch_ids[0], "not_a_kind")
+
+
+def test_leased_jobs_are_not_leased_twice(session, batch_ids):
+    for batch_id in batch_ids:
+        jobs.enqueue_job(batch_id, jobs.LOAD_RESULTS)
+
+    first = jobs.lease_jobs("worker-1", limit=2)
+    second = jobs.lease_jobs("worker-2", limit=2)
+    third = jobs.lease_jobs("worker-3", limit=2)
+
+    leased = [job["job_id"] for job in first + second]
+    assert len(first) == 2 and len(second) == 1 and third == []
+    assert len(set(leased)) == 3
+    assert _job(session, second[0]["job_id"])["leased_by"] == "worker-2"
+
+
+def test_concurrent_leases_skip_locked_rows(app, session, batch_ids):
+    for batch_id in batch_ids:
+        jobs.enqueue_job(batch_id, jobs.LOAD_RESULTS)
+    leased = []
+    start = threading.Barrier(len(batch_ids))
+
+    def lease(worker_id):
+        with app.app_context():
+            start.wait()
+            leased.extend(jobs.lease_jobs(worker_id, limit=1))
+
+    threads = [
+        threading.Thread(target=lease, args=(f"worker-{index}",))
+        for index in range(len(batch_ids))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every lease got a job of its own: no job twice, none blocked
+    assert sorted(job["batch_id"] for job in leased) == batch_ids
+
+
+def test_expired_lease_is_taken_over(session, batch_ids):
+    job, _ = jobs.enqueue_job(batch_ids[0], jobs.LOAD_RESULTS)
+    [first] = jobs.lease_jobs("worker-1")
+    _expire_leases(session)
+
+    [second] = jobs.lease_jobs("worker-2")
+
+    assert second["job_id"] == job.job_id
+    assert second["attempts"] == 2
+    assert second["lease_token"] != first["lease_token"]
+    # the first worker's late outcome is ignored
+    assert not jobs.complete_job(first["job_id"], first["lease_token"])
+    assert jobs.fail_job(first["job_id"], first["lease_token"], "late", 1, 5) is None
+    assert jobs.complete_job(second["job_id"], second["lease_token"])
+    done = _job(session, job.job_id)
+    assert done["leased_by"] is None and done["lease_token"] is None
+
+
+def test_exhausted_expired_job_fails_without_lease(session, batch_ids):
+    job, _ = jobs.enqueue_job(batch_ids[0], jobs.LOAD_RESULTS, max_attempts=1)
+    jobs.lease_jobs("worker-1")
+    _expire_leases(session)
+
+    assert jobs.lease_jobs("worker-2") == []
+
+    failed = _job(session, job.job_id)
+    assert failed["state"] == JOB_FAILED
+    assert failed["attempts"] == 1
+    assert failed["leased_by"] is None
+    assert failed["lease_token"] is None
+    assert failed["lease_expires_at"] is None
+    assert failed["finished_at"] is not None
+
+
+def test_failed_attempt_is_retried_later(session, batch_ids):
+    job, _ = jobs.enqueue_job(batch_ids[0], jobs.LOAD_RESULTS, max_attempts=2)
+    [leased] = jobs.lease_jobs("worker-1")
+
+    state = jobs.fail_job(job.job_id, leased["lease_token"], ValueError("boom"), 1, 2)
+
+    retried = _job(session, job.job_id)
+    assert state == JOB_PENDING
+    assert retried["leased_by"] is None and retried["lease_token"] is None
+    assert retried["last_error"] == "boom"
+    assert retried["available_at"] > datetime.utcnow() - timedelta(minutes=1)
+    # not due before its retry delay
+    assert jobs.lease_jobs("worker-2") == []
+
+    _expire_leases(session)
+    [again] = jobs.lease_jobs("worker-2")
+    assert _job(session, again["job_id"])["state"] == JOB_LEASED
+    state = jobs.fail_job(job.job_id, again["lease_token"], "boom", 2, 2)
+    assert state == JOB_FAILED
+
+
+def test_expire_batches_only_touches_overdue_running_batches(session, batch_ids):
+    table = BatchStatus.__table__
+    now = session.execute(select(db.func.now())).scalar().replace(tzinfo=None)
+    for batch_id, status, expires_at in (
+        ("batch_1", "in_progress", now - timedelta(hours=1)),
+        ("batch_2", "validating", now + timedelta(hours=1)),
+        ("batch_3", "completed", now - timedelta(hours=1)),
+    ):
+        session.execute(
+            update(table)
+            .where(table.c.batch_id == batch_id)
+            .values(status=status, expires_at=expires_at)
+        )
+    session.commit()
+
+    result = expire_batches(batch_size=1)
+
+    statuses = dict(session.execute(select(table.c.batch_id, table.c.status)).all())
+    assert result["expired"] == 1 and result["remaining"] == 0
+    assert statuses == {
+        "batch_1": EXPIRED_STATUS,
+        "batch_2": "validating",
+        "batch_3": "completed",
+    }
+    assert expire_batches()["expired"] == 0
+
+
+def test_expiry_sweep_uses_the_partial_index(session, batch_ids):
+    table = BatchStatus.__table__
+    session.execute(text("SET LOCAL enable_seqscan = off"))
+    overdue = select(table.c.batch_id).where(
+        table.c.status.in_(EXPIRABLE_STATUSES),
+        table.c.expires_at < db.func.now(),
+    )
+    compiled = overdue.compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+
+    plan = "\n".join(session.execute(text(f"EXPLAIN {compiled}")).scalars())
+
+    assert "ix_batch_statuses_expirable_expires_at" in plan
@@ -0,0 +1,67 @@
+"""
+Tests of the loading of batch output files into sentiments
+"""
+
+import json
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.batch_status.loader import load_batch_results
+from app.batch_status.models import BatchStatus
+from app.brand.models import Brand
+from app.publisher.models import Publisher
+from app.sentiment.models import Sentiment
+
+BATCH_ID = "batch_loaded"
+
+
+@pytest.fixture()
+def batch_id(app, session, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "BATCH_FILE_STORE", "local")
+    monkeypatch.setitem(app.config, "BATCH_FILE_STORE_ROOT", str(tmp_path))
+    publisher_id = session.execute(
+        insert(Publisher.__table__)
+        .values(name="loaded publisher")
+        .returning(Publisher.publisher_id)
+    ).scalar_one()
+    brand_id = session.execute(
+        insert(Brand.__table__)
+        .values(name="loaded", website="loaded.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    rows = [{"brand_id": brand_id, "sentiment": "positive"} for _ in range(5)]
+    (tmp_path / "output.jsonl").write_text(
+        "".join(json.dumps(row) + "\n" for row in rows)
+    )
+    session.execute(
+        insert(BatchStatus.__table__).values(
+            batch_id=BATCH_ID,
+            publisher_id=publisher_id,
+            status="completed",
+            output_file_id="output.jsonl",
+        )
+    )
+    session.commit()
+    return BATCH_ID
+
+
+def _loaded(session):
+    return session.execute(
+        select(func.count())
+        .select_from(Sentiment.__table__)
+        .where(Sentiment.__table__.c.batch_id == BATCH_ID)
+    ).scalar()
+
+
+def test_restarts_replace_the_loaded_sentiments(app, session, batch_id):
+    with app.app_context():
+        first = load_batch_results(batch_id, block_size=2)
+        resumed = load_batch_results(batch_id, block_size=2)
+        restarted = load_batch_results(batch_id, block_size=2, restart=True)
+
+    assert first["inserted"] == 5
+    assert resumed["inserted"] == 0
+    assert restarted["deleted"] == 5
+    assert restarted["inserted"] == 5
+    assert _loaded(session) == 5
@@ -0,0 +1,86 @@
+"""
+Tests of the BatchStatus create and bulk update endpoints
+"""
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.batch_status.models import BatchStatus
+from app.publisher.models import Publisher
+
+
+@pytest.fixture()
+def publisher_id(session):
+    created = session.execute(
+        insert(Publisher.__table__)
+        .values(name="batch publisher")
+        .returning(Publisher.publisher_id)
+    ).scalar_one()
+    session.execute(
+        insert(BatchStatus.__table__),
+        [
+            {"batch_id": batch_id, "publisher_id": created, "status": "validating"}
+            for batch_id in ("batch_a", "batch_b")
+        ],
+    )
+    session.commit()
+    return created
+
+
+def _statuses(session):
+    table = BatchStatus.__table__
+    return dict(session.execute(select(table.c.batch_id, table.c.status)).all())
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"json": ["batch_c"]},
+        {"data": "not json", "content_type": "application/json"},
+    ],
+)
+def test_create_rejects_non_object_bodies(client, publisher_id, kwargs):
+    response = client.post("/batchstatus/", **kwargs)
+
+    assert response.status_code == 400
+
+
+def test_create(client, session, publisher_id):
+    response = client.post(
+        "/batchstatus/",
+        json={"batch_id": "batch_c", "publisher_id": publisher_id, "status": "validating"},
+    )
+
+    assert response.status_code == 201
+    assert _statuses(session)["batch_c"] == "validating"
+
+
+def test_bulk_update_reports_updated_missing_and_skipped(client, session, publisher_id):
+    response = client.patch(
+        "/batchstatus/bulk",
+        json=[
+            {"batch_id": "batch_a", "status": "in_progress"},
+            {"batch_id": "batch_b"},
+            {"batch_id": "batch_z", "status": "completed"},
+        ],
+    )
+
+    assert response.status_code == 200
+    assert response.json["updated"] == ["batch_a"]
+    assert response.json["not_found"] == ["batch_z"]
+    assert response.json["skipped"] == ["batch_b"]
+    assert _statuses(session) == {"batch_a": "in_progress", "batch_b": "validating"}
+
+
+@pytest.mark.parametrize("publisher", [999999, None, "1", True])
+def test_bulk_update_rejects_invalid_publishers(client, session, publisher_id, publisher):
+    response = client.patch(
+        "/batchstatus/bulk",
+        json=[
+            {"batch_id": "batch_a", "status": "in_progress"},
+            {"batch_id": "batch_b", "publisher_id": publisher},
+        ],
+    )
+
+    assert response.status_code == 400
+    assert _statuses(session) == {"batch_a": "validating", "batch_b": "validating"}
@@ -0,0 +1,81 @@
+"""
+Tests of the ETags, conditional GETs and Cache-Control policies
+"""
+
+import pytest
+from sqlalchemy import insert
+from starlette.testclient import TestClient
+
+from app.async_read import create_asgi_app
+from app.brand.models import Brand
+from app.utility.query_stats import query_budget
+
+
+@pytest.fixture()
+def brand_id(session):
+    created = session.execute(
+        insert(Brand.__table__)
+        .values(name="cached", website="cached.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    session.commit()
+    return created
+
+
+def test_etag_and_not_modified(client, brand_id):
+    with query_budget(1):
+        response = client.get(f"/brand/{brand_id}")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    etag = response.headers["ETag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+
+    with query_budget(1):
+        cached = client.get(f"/brand/{brand_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.data == b""
+    assert cached.headers["ETag"] == etag
+    assert cached.headers["Cache-Control"] == "private, no-cache"
+
+    stale = client.get(f"/brand/{brand_id}", headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200
+    assert stale.headers["ETag"] == etag
+
+
+def test_updates_change_the_etag(client, brand_id):
+    etag = client.get(f"/brand/{brand_id}").headers["ETag"]
+
+    client.put(f"/brand/{brand_id}", json={"name": "renamed"})
+    response = client.get(f"/brand/{brand_id}", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json["data"]["name"] == "renamed"
+    assert response.headers["ETag"] != etag
+
+
+def test_missing_rows_have_no_etag(client, session):  # pylint: disable=unused-argument
+    response = client.get("/brand/999", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+    assert "Cache-Control" not in response.headers
+
+
+# pylint: disable-next=unused-argument
+def test_cache_control_per_namespace(client, session):
+    assert client.get("/article/").headers["Cache-Control"] == "private, max-age=60"
+    assert client.get("/batchstatus/").headers["Cache-Control"] == "no-store"
+    assert "Cache-Control" not in client.get("/health-check").headers
+
+
+def test_async_reads_send_the_same_etags(app, client, brand_id):
+    etag = client.get(f"/brand/{brand_id}").headers["ETag"]
+
+    with TestClient(create_asgi_app(app), client=("127.0.0.1", 50000)) as asgi_client:
+        response = asgi_client.get(f"/brand/{brand_id}")
+        cached = asgi_client.get(f"/brand/{brand_id}", headers={"If-None-Match": etag})
+
+    assert response.headers["ETag"] == etag
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
@@ -0,0 +1,126 @@
+"""
+Tests of the single-flight of identical concurrent GETs
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import insert
+
+from app.brand.models import Brand
+from app.utility import metrics
+from app.utility.coalescing import AsyncSingleFlight, SingleFlight
+
+
+def coalesced_count(source):
+    return sum(
+        counter["value"]
+        for counter in metrics.snapshot()["counters"]
+        if counter["name"] == "http_coalesced_requests_total"
+        and counter["labels"] == {"namespace": "brands", "source": source}
+    )
+
+
+@pytest.fixture()
+def brand_id(session):
+    created = session.execute(
+        insert(Brand.__table__)
+        .values(name="coalesced", website="coalesced.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    session.commit()
+    return created
+
+
+def test_followers_share_the_leader_result():
+    flights = SingleFlight()
+    flight, leader = flights.join("key")
+    joined, follower_leads = flights.join("key")
+
+    assert leader and not follower_leads and joined is flight
+    flights.finish("key", flight, "result")
+    assert joined.done.is_set() and joined.result == "result"
+    assert flights.join("key")[1] is True
+
+
+def test_results_are_reused_for_the_ttl():
+    flights = SingleFlight(ttl=0.05)
+    flight, _ = flights.join("key")
+    flights.finish("key", flight, "result", cache=True)
+
+    assert flights.cached("key") == "result"
+    time.sleep(0.06)
+    assert flights.cached("key") is None
+
+
+def test_concurrent_identical_gets_run_once(app, brand_id, monkeypatch):
+    calls = []
+    to_dict = Brand.to_dict
+
+    def slow_to_dict(brand):
+        calls.append(threading.get_ident())
+        time.sleep(0.3)
+        return to_dict(brand)
+
+    monkeypatch.setattr(Brand, "to_dict", slow_to_dict)
+    before = coalesced_count("in_flight")
+
+    def get(_):
+        return app.test_client().get(f"/brand/{brand_id}")
+
+    with ThreadPoolExecutor(5) as pool:
+        leader = pool.submit(get, None)
+        time.sleep(0.1)
+        followers = list(pool.map(get, range(4)))
+        responses = [leader.result(), *followers]
+
+    assert len(calls) == 1
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.data for response in responses}) == 1
+    assert all("ETag" in response.headers for response in responses)
+    assert coalesced_count("in_flight") - before == 4
+
+
+def test_different_queries_are_not_coalesced(app, brand_id, monkeypatch):
+    calls = []
+    to_dict = Brand.to_dict
+
+    def counted_to_dict(brand):
+        calls.append(brand.brand_id)
+        return to_dict(brand)
+
+    monkeypatch.setattr(Brand, "to_dict", counted_to_dict)
+    client = app.test_client()
+
+    client.get(f"/brand/{brand_id}")
+    client.get(f"/brand/{brand_id}", headers={"X-Profile": "cprofile"})
+
+    assert len(calls) == 2
+
+
+def test_async_single_flight():
+    flights = AsyncSingleFlight(ttl=10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return (200, {}, b"body")
+
+    async def run_all():
+        return await asyncio.gather(*(flights.run("key", compute) for _ in range(5)))
+
+    results = asyncio.run(run_all())
+
+    assert len(calls) == 1
+    assert sorted(source or "leader" for _, source in results) == [
+        "in_flight",
+        "in_flight",
+        "in_flight",
+        "in_flight",
+        "leader",
+    ]
+    assert asyncio.run(flights.run("key", compute))[1] == "cached"
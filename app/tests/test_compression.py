@@ -0,0 +1,142 @@
+"""
+Tests of the compression of the responses negotiated with Accept-Encoding
+"""
+
+import gzip
+import zlib
+
+import pyarrow as pa
+import pytest
+from sqlalchemy import insert
+from starlette.testclient import TestClient
+
+from app.async_read import create_asgi_app
+from app.brand.models import Brand
+from app.enrichment_simweb.models import EnrichmentSimWeb
+from app.utility import compression
+
+
+@pytest.fixture()
+def brand_ids(session):
+    created = session.execute(
+        insert(Brand.__table__)
+        .values(
+            [
+                {"name": f"brand {index} " + "x" * 1500, "website": f"{index}.example"}
+                for index in range(10)
+            ]
+        )
+        .returning(Brand.brand_id)
+    ).scalars()
+    ids = list(created)
+    session.commit()
+    return ids
+
+
+def test_negotiation():
+    encodings = ("zstd", "br", "gzip")
+
+    assert compression.negotiate("gzip, br", encodings) == "br"
+    assert compression.negotiate("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+    assert compression.negotiate("*", encodings) == "zstd"
+    assert compression.negotiate("gzip;q=0, identity", encodings) is None
+    assert compression.negotiate("deflate", encodings) is None
+    assert compression.negotiate(None, encodings) is None
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+def test_streams_decompress_to_the_data(encoding):
+    if encoding not in compression.AVAILABLE_ENCODINGS:
+        pytest.skip(f"{encoding} isn't installed")
+    chunks = [b'{"rows": [', b"1, 2, 3" * 1000, b"]}"]
+
+    streamed = b"".join(compression.iter_compressed(iter(chunks), encoding, 6))
+
+    assert streamed != b"".join(chunks)
+    assert decompress(streamed, encoding) == b"".join(chunks)
+
+
+def decompress(data, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        return compression.brotli.decompress(data)
+    return compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+# pylint: disable-next=unused-argument
+def test_large_responses_are_compressed(client, brand_ids):
+    plain = client.get("/brand/?page_size=10")
+    compressed = client.get("/brand/?page_size=10", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["Vary"] == "Accept-Encoding"
+    assert int(compressed.headers["Content-Length"]) < len(plain.data) / 10
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_small_responses_are_not(client, session):  # pylint: disable=unused-argument
+    response = client.get("/brand/", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+
+
+def test_etags_differ_per_encoding(client, brand_ids):
+    url = f"/brand/{brand_ids[0]}"
+    plain = client.get(url)
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    cached = client.get(
+        url,
+        headers={
+            "Accept-Encoding": "gzip",
+            "If-None-Match": compressed.headers["ETag"],
+        },
+    )
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == compressed.headers["ETag"]
+
+
+def test_exports_are_compressed_as_streamed(client, session):
+    brand_id = session.execute(
+        insert(Brand.__table__)
+        .values(name="exported", website="exported.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    session.execute(
+        insert(EnrichmentSimWeb.__table__).values(
+            [{"brand_id": brand_id, "rank": index} for index in range(50)]
+        )
+    )
+    session.commit()
+
+    response = client.get(
+        "/enrichmentsimweb/export", headers={"Accept-Encoding": "gzip"}
+    )
+
+    assert response.is_streamed
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(response.data)
+    assert pa.ipc.open_stream(data).read_all().num_rows == 50
+
+
+def test_async_reads_are_compressed(app, client, brand_ids):
+    url = f"/brand/{brand_ids[0]}"
+    etag = client.get(url, headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    with TestClient(create_asgi_app(app), client=("127.0.0.1", 50000)) as asgi_client:
+        response = asgi_client.get("/brand/?page_size=10")
+        detail = asgi_client.get(url)
+        cached = asgi_client.get(url, headers={"If-None-Match": etag})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.json()["brands"]) == 10
+    assert detail.headers["ETag"] == etag
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
@@ -0,0 +1,90 @@
+"""
+Tests of PATCH /enrichmentsimweb/<id>
+"""
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.brand.models import Brand
+from app.enrichment_simweb.models import EnrichmentHistory, EnrichmentSimWeb
+
+
+@pytest.fixture()
+def enrichment_id(session):
+    brand_id = session.execute(
+        insert(Brand.__table__)
+        .values(name="patched", website="patched.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    enrichment = EnrichmentSimWeb.__table__
+    created = session.execute(
+        insert(enrichment)
+        .values(brand_id=brand_id, rank=7, ppc_spend=1.5, industry="news")
+        .returning(enrichment.c.enrichment_sim_web_id)
+    ).scalar_one()
+    session.commit()
+    return created
+
+
+def _history_count(session):
+    return session.execute(
+        select(func.count()).select_from(EnrichmentHistory.__table__)
+    ).scalar()
+
+
+def test_patch_without_changes_is_a_no_op(client, session, enrichment_id):
+    before = client.get(f"/enrichmentsimweb/{enrichment_id}").json["data"]
+    history_before = _history_count(session)
+
+    response = client.patch(
+        f"/enrichmentsimweb/{enrichment_id}",
+        json={"rank": "7", "ppc_spend": "1.50", "industry": "news"},
+    )
+
+    assert response.status_code == 200
+    assert response.json["message"] == "EnrichmentSimWeb already up to date."
+    assert response.json["data"]["last_updated_at"] == before["last_updated_at"]
+    assert _history_count(session) == history_before
+
+
+def test_patch_writes_only_changed_columns(client, session, enrichment_id):
+    response = client.patch(
+        f"/enrichmentsimweb/{enrichment_id}",
+        json={"rank": 7, "ppc_spend": 2.25, "company_name": "Patched Inc"},
+    )
+
+    assert response.status_code == 200
+    assert sorted(response.json["updated_attributes"]) == ["company_name", "ppc_spend"]
+    assert response.json["data"]["ppc_spend"] == 2.25
+    row = session.execute(
+        select(EnrichmentSimWeb.__table__).where(
+            EnrichmentSimWeb.enrichment_sim_web_id == enrichment_id
+        )
+    ).mappings().one()
+    assert row["company_name"] == "Patched Inc"
+    assert row["rank"] == 7
+
+
+@pytest.mark.parametrize(
+    "payload, status",
+    [
+        (["rank", 1], 400),
+        ({"not_a_column": 1}, 400),
+        ({"rank": 1.5}, 400),
+        ({"rank": True}, 400),
+        ({"ppc_spend": "a lot"}, 400),
+        ({"last_updated_at": "2024-01-01"}, 403),
+        ({"enrichment_sim_web_id": 1}, 403),
+        ({"brand_id": 999999}, 404),
+    ],
+)
+def test_patch_validation(client, enrichment_id, payload, status):
+    response = client.patch(f"/enrichmentsimweb/{enrichment_id}", json=payload)
+
+    assert response.status_code == status
+
+
+def test_patch_unknown_enrichment(client, session):
+    response = client.patch("/enrichmentsimweb/424242", json={"rank": 1})
+
+    assert response.status_code == 404
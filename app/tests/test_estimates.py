@@ -0,0 +1,128 @@
+"""
+Tests of the enrichment estimates
+"""
+
+import math
+
+import numpy as np
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.brand.models import Brand
+from app.enrichment_simweb.estimates import (
+    RECOMPUTE_LOCK_KEY,
+    parse_metric,
+    recompute_estimates,
+    recompute_estimates_exclusive,
+    to_bigint_values,
+)
+from app.enrichment_simweb.models import EnrichmentSimWeb
+from app.extensions import db
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("12,345", 12345),
+        ("1.2M", 1.2e6),
+        ("1.2 m", 1.2e6),
+        ("3k", 3000),
+        ("3.4e6", 3.4e6),
+        ("2E-3", 0.002),
+        ("$10M - $50M", 30e6),
+        ("51-200", 125.5),
+        ("12.5%", 0.125),
+        ("-4.5", -4.5),
+        ("100 monthly visits", 100),
+        ("5 billion", 5e9),
+        ("2 Trillion users", 2e12),
+        ("10 mobile users", 10),
+        (42, 42),
+    ],
+)
+def test_parse_metric(value, expected):
+    assert parse_metric(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", [None, "", "n/a", "unknown"])
+def test_parse_metric_unparseable(value):
+    assert math.isnan(parse_metric(value))
+
+
+def test_to_bigint_values_rejects_out_of_range():
+    int64_max = np.iinfo(np.int64).max
+    values = to_bigint_values(
+        np.array([1.4, -2.6, np.nan, np.inf, 1e30, -1e30, 2.0**63, 2.0**62])
+    )
+    assert values == [1, -3, None, None, None, None, None, 2**62]
+    assert all(value is None or abs(value) <= int64_max for value in values)
+
+
+def _insert_enrichment(session, website, **metrics):
+    brand_id = session.execute(
+        insert(Brand.__table__).values(name=website, website=website).returning(
+            Brand.brand_id
+        )
+    ).scalar_one()
+    session.execute(
+        insert(EnrichmentSimWeb.__table__).values(brand_id=brand_id, **metrics)
+    )
+    session.commit()
+    return brand_id
+
+
+def _estimates(session, brand_id):
+    table = EnrichmentSimWeb.__table__
+    return session.execute(
+        select(table).where(table.c.brand_id == brand_id)
+    ).mappings().one()
+
+
+def test_recompute_estimates_keeps_values_it_cannot_compute(session):
+    brand_id = _insert_enrichment(
+        session,
+        "kept.example",
+        monthly_visits="1.5M",
+        web_traffic_revenue_estimate=1,
+        ad_spend_estimate=777,
+        ip_ad_spend_estimate=77,
+    )
+
+    result = recompute_estimates(heuristics={"revenue_per_visit_usd": 2})
+
+    row = _estimates(session, brand_id)
+    assert result["scanned"] == 1 and result["updated"] == 1
+    assert row["web_traffic_revenue_estimate"] == 1.5e6 * 12 * 2
+    # no ppc_spend: the stored ad spend stays, and its dependents build on it
+    assert row["ad_spend_estimate"] == 777
+    assert row["ip_ad_spend_estimate"] == 78
+    assert row["company_revenue_estimate"] is None
+
+
+def test_recompute_estimates_overflow_is_null(session):
+    brand_id = _insert_enrichment(session, "huge.example", annual_revenue="9e30")
+
+    recompute_estimates(estimates=["company_revenue_estimate"])
+
+    assert _estimates(session, brand_id)["company_revenue_estimate"] is None
+
+
+def test_recompute_estimates_rejects_unknown_estimates(session):
+    with pytest.raises(ValueError):
+        recompute_estimates(estimates=["not_an_estimate"])
+
+
+def test_recompute_endpoint_validates_and_refuses_concurrent_runs(app, client):
+    url = "/enrichmentsimweb/recompute-estimates"
+    assert client.post(url, json={"estimates": ["nope"]}).status_code == 400
+    assert client.post(url, json={"chunk_size": 0}).status_code == 400
+
+    with app.app_context(), db.engine.connect() as connection:
+        connection.execute(select(func.pg_advisory_lock(RECOMPUTE_LOCK_KEY)))
+        assert client.post(url, json={}).status_code == 409
+        assert recompute_estimates_exclusive() is None
+        connection.execute(select(func.pg_advisory_unlock(RECOMPUTE_LOCK_KEY)))
+
+    response = client.post(url, json={"estimates": ["ad_spend_estimate"]})
+    assert response.status_code == 202
+    assert response.json["data"]["estimates"] == ["ad_spend_estimate"]
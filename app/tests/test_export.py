@@ -0,0 +1,120 @@
+"""
+Tests of the Parquet export of enrichments
+"""
+
+import os
+from datetime import timedelta
+
+from sqlalchemy import func, insert, select, update
+
+from app.brand.models import Brand
+from app.enrichment_simweb.export import (
+    EXPORT_PARTITION,
+    export_parquet_snapshot,
+    read_export,
+    read_watermark,
+)
+from app.enrichment_simweb.models import EnrichmentSimWeb
+from app.extensions import db
+
+
+def _insert_enrichments(session, count, **values):
+    table = EnrichmentSimWeb.__table__
+    for index in range(count):
+        brand_id = session.execute(
+            insert(Brand.__table__)
+            .values(name=f"brand {index}", website=f"{index}.example")
+            .returning(Brand.brand_id)
+        ).scalar_one()
+        session.execute(
+            insert(table).values(
+                brand_id=brand_id,
+                industry=None if index % 3 == 0 else f"industry {index % 3}",
+                rank=index,
+                ppc_spend=index / 4,
+                **values,
+            )
+        )
+    session.commit()
+
+
+def _exports(output_dir):
+    return sorted(
+        name for name in os.listdir(output_dir) if name.startswith(f"{EXPORT_PARTITION}=")
+    )
+
+
+def test_export_round_trip(session, tmp_path):
+    _insert_enrichments(session, 10, monthly_visits="1.2M")
+
+    result = export_parquet_snapshot(str(tmp_path), watermark_lag=timedelta(0))
+
+    table = read_export(str(tmp_path))
+    assert result["rows"] == 10
+    assert table.num_rows == 10
+    rows = {row["rank"]: row for row in table.to_pylist()}
+    assert rows[4]["ppc_spend"] == 1.0
+    assert rows[4]["industry"] == "industry 1"
+    assert rows[3]["industry"] is None
+    assert rows[3]["monthly_visits"] == "1.2M"
+    assert rows[3]["annual_revenue"] is None
+
+
+def test_full_exports_replace_previous_ones(session, tmp_path):
+    _insert_enrichments(session, 5)
+
+    export_parquet_snapshot(str(tmp_path))
+    export_parquet_snapshot(str(tmp_path))
+
+    assert len(_exports(str(tmp_path))) == 1
+    assert read_export(str(tmp_path)).num_rows == 5
+
+
+def test_incremental_export_keeps_latest_version(session, tmp_path):
+    _insert_enrichments(session, 5)
+    table = EnrichmentSimWeb.__table__
+    # backdate the rows so the watermark lag doesn't re-export them
+    session.execute(
+        update(table).values(last_updated_at=func.now() - timedelta(hours=1))
+    )
+    session.commit()
+    export_parquet_snapshot(str(tmp_path))
+    watermark = read_watermark(str(tmp_path))
+
+    session.execute(update(table).where(table.c.rank == 2).values(company_name="new"))
+    session.commit()
+    result = export_parquet_snapshot(str(tmp_path), incremental=True)
+
+    assert result["rows"] == 1
+    assert len(_exports(str(tmp_path))) == 2
+    assert read_watermark(str(tmp_path)) >= watermark
+    exported = read_export(str(tmp_path))
+    assert exported.num_rows == 5
+    names = dict(
+        zip(exported.column("rank").to_pylist(), exported.column("company_name").to_pylist())
+    )
+    assert names[2] == "new"
+
+
+def test_incremental_export_sees_rows_of_transactions_open_during_export(
+    session, tmp_path
+):
+    table = EnrichmentSimWeb.__table__
+    _insert_enrichments(session, 1)
+
+    with db.engine.connect() as writer:
+        # the writer's transaction starts before the export, its rows get
+        # that start time as last_updated_at but commit after the export
+        writer.execute(select(1))
+        session.execute(update(table).values(rank=100))
+        session.commit()
+        export_parquet_snapshot(str(tmp_path), watermark_lag=timedelta(0))
+        writer.execute(update(table).values(company_name="late"))
+        writer.commit()
+
+    export_parquet_snapshot(
+        str(tmp_path), incremental=True, watermark_lag=timedelta(0)
+    )
+
+    exported = read_export(str(tmp_path)).to_pylist()
+    assert [(row["rank"], row["company_name"]) for row in exported] == [(100, "late")]
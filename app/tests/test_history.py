@@ -0,0 +1,91 @@
+"""
+Tests of the enrichment history
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+
+from app.brand.models import Brand
+from app.enrichment_simweb.history import (
+    KEYFRAME_INTERVAL,
+    enrichment_as_of,
+    metric_history,
+    record_history,
+)
+from app.enrichment_simweb.models import EnrichmentHistory, EnrichmentSimWeb
+
+START = datetime(2024, 1, 1)
+
+
+def _record_revisions(session, revisions):
+    """
+    Store a full keyframe of {rank: 0, industry: "news"}, then one revision per
+    changes dict, the n-th one captured n days after START
+    returns: brand_id
+    """
+    brand_id = session.execute(
+        insert(Brand.__table__)
+        .values(name="history", website="history.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    enrichment_id = session.execute(
+        insert(EnrichmentSimWeb.__table__)
+        .values(brand_id=brand_id, rank=0, industry="news")
+        .returning(EnrichmentSimWeb.enrichment_sim_web_id)
+    ).scalar_one()
+    history = EnrichmentHistory.__table__
+    enrichments = EnrichmentSimWeb.__table__
+    for day, changes in enumerate([None, *revisions]):
+        # like the callers, change the row first: keyframes snapshot it
+        if changes:
+            session.execute(update(enrichments).values(**changes))
+        record_history(session, [(enrichment_id, brand_id, changes)])
+        session.execute(
+            update(history)
+            .where(history.c.revision == day)
+            .values(captured_at=START + timedelta(days=day))
+        )
+    session.commit()
+    return brand_id
+
+
+def test_enrichment_as_of_replays_changes_since_the_keyframe(session):
+    brand_id = _record_revisions(
+        session, [{"rank": 10}, {"industry": "sports"}, {"rank": 30}]
+    )
+
+    assert enrichment_as_of(brand_id, START - timedelta(seconds=1)) is None
+    as_of_start = enrichment_as_of(brand_id, START)
+    assert as_of_start["data"]["rank"] == 0
+    assert as_of_start["data"]["industry"] == "news"
+
+    between = enrichment_as_of(brand_id, START + timedelta(days=2, hours=12))
+    assert between["captured_at"] == (START + timedelta(days=2)).isoformat()
+    assert between["data"]["rank"] == 10
+    assert between["data"]["industry"] == "sports"
+
+    latest = enrichment_as_of(brand_id, START + timedelta(days=30))
+    assert latest["data"]["rank"] == 30
+    assert latest["data"]["brand_id"] == brand_id
+
+
+def test_enrichment_as_of_across_keyframes(session):
+    revisions = [{"rank": day} for day in range(1, KEYFRAME_INTERVAL + 5)]
+    brand_id = _record_revisions(session, revisions)
+
+    for day in (KEYFRAME_INTERVAL - 1, KEYFRAME_INTERVAL, KEYFRAME_INTERVAL + 3):
+        as_of = START + timedelta(days=day, hours=1)
+        assert enrichment_as_of(brand_id, as_of)["data"]["rank"] == day
+
+
+def test_metric_history_collapses_unchanged_values(session):
+    brand_id = _record_revisions(
+        session, [{"rank": 10}, {"industry": "sports"}, {"rank": 10}, {"rank": 40}]
+    )
+
+    points = metric_history(brand_id, "rank", start=START + timedelta(days=2))
+    assert points == [
+        {"captured_at": (START + timedelta(days=2)).isoformat(), "value": 10},
+        {"captured_at": (START + timedelta(days=4)).isoformat(), "value": 40},
+    ]
@@ -0,0 +1,82 @@
+"""
+Tests of the JSON encoding of the responses, with orjson and the fallback
+"""
+
+import datetime
+import decimal
+import importlib
+import json
+import sys
+
+import pytest
+from sqlalchemy import insert
+
+from app.brand.models import Brand, FixedEntityTypeEnum
+from app.sentiment.models import LicensabilityEnum, SentimentEnum, UrlSourceEnum
+from app.utility import json_encoding
+
+VALUES = {
+    "created_at": datetime.datetime(2024, 1, 2, 3, 4, 5, 6000),
+    "day": datetime.date(2024, 1, 2),
+    "score": decimal.Decimal("0.125"),
+    "sentiment": SentimentEnum.positive,
+    "licensability": LicensabilityEnum.likely,
+    "url_source": UrlSourceEnum.google_url_tool,
+    "entity_type": list(FixedEntityTypeEnum)[0],
+    "name": "Crème brûlée",
+    1: [None, True, 1.5],
+}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoding(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setitem(sys.modules, "orjson", None)
+    yield importlib.reload(json_encoding)
+    monkeypatch.undo()
+    importlib.reload(json_encoding)
+
+
+def test_encodes_the_project_types(encoding):
+    assert json.loads(encoding.dumps(VALUES)) == {
+        "created_at": "2024-01-02T03:04:05.006000",
+        "day": "2024-01-02",
+        "score": 0.125,
+        "sentiment": "positive",
+        "licensability": "likely",
+        "url_source": "google_url_tool",
+        "entity_type": list(FixedEntityTypeEnum)[0].value,
+        "name": "Crème brûlée",
+        "1": [None, True, 1.5],
+    }
+
+
+def test_both_encoders_write_the_same_bytes(monkeypatch):
+    data = {key: value for key, value in VALUES.items() if key != 1}
+    fast = json_encoding.dumps(data), json_encoding.dumps(data, indent=True)
+
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    fallback = importlib.reload(json_encoding)
+    try:
+        assert (fallback.dumps(data), fallback.dumps(data, indent=True)) == fast
+    finally:
+        monkeypatch.undo()
+        importlib.reload(json_encoding)
+    assert "Crème".encode() in fast[0]
+
+
+def test_unsupported_types_raise(encoding):
+    with pytest.raises(TypeError):
+        encoding.dumps({"value": object()})
+
+
+def test_api_responses(client, session):
+    session.execute(insert(Brand.__table__).values(name="encoded", website="e.x"))
+    session.commit()
+
+    response = client.get("/brand/")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert response.data.endswith(b"\n")
+    assert response.json["brands"][0]["name"] == "encoded"
@@ -0,0 +1,61 @@
+"""
+Tests of the normalization of the incoming labels
+"""
+
+import pytest
+from sqlalchemy import insert
+
+from app.brand.models import Brand
+from app.sentiment.models import Sentiment, SentimentEnum
+from app.utility.labels import normalize_label
+
+
+def test_normalize_label():
+    assert normalize_label("sentiment", " POSITIVE ") == SentimentEnum.positive
+    assert (
+        normalize_label("sentiment", SentimentEnum.negative) == SentimentEnum.negative
+    )
+    assert normalize_label("sentiment", "") is None
+    assert normalize_label("sentiment", None) is None
+
+
+@pytest.mark.parametrize("value", [["positive"], {"value": "positive"}, 1])
+def test_non_string_labels_raise(value):
+    with pytest.raises(ValueError, match="sentiment should be a string."):
+        normalize_label("sentiment", value)
+
+
+def test_list_labels_are_rejected(client, session):
+    brand_id = session.execute(
+        insert(Brand.__table__)
+        .values(name="stored", website="stored.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    sentiment_id = session.execute(
+        insert(Sentiment.__table__)
+        .values(brand_id=brand_id, sentiment="positive")
+        .returning(Sentiment.sentiment_id)
+    ).scalar_one()
+    session.commit()
+    brand = {"name": "labelled", "website": "labelled.example", "entity_type": ["x"]}
+
+    # the payloads with a model are validated against it first
+    created = client.post("/brand/", json=brand)
+    bulk = client.post("/brand/bulk", json=[brand])
+    sentiment_update = client.put(
+        f"/sentiment/{sentiment_id}", json={"sentiment": ["negative"]}
+    )
+    brand_update = client.put(f"/brand/{brand_id}", json={"entity_type": ["x"]})
+    ingested = client.post(
+        "/sentiment/bulk", json=[{"brand_id": brand_id, "sentiment": ["negative"]}]
+    )
+
+    assert created.status_code == bulk.status_code == 400
+    assert sentiment_update.status_code == 400
+    assert brand_update.status_code == 400
+    assert brand_update.json == {"message": "entity_type should be a string."}
+    assert ingested.json["errors"] == [
+        {"index": 0, "error": "sentiment should be a string."}
+    ]
+    assert session.get(Brand, brand_id).entity_type is None
+    assert session.get(Sentiment, sentiment_id).sentiment == SentimentEnum.positive
@@ -0,0 +1,157 @@
+"""
+Tests of the queued JSON logging, its sampling and the request ids
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+from starlette.testclient import TestClient
+
+from app import logger
+from app.async_read import create_asgi_app
+
+
+def make_record(message="message", created=1000.0, level=logging.INFO, lineno=1):
+    record = logging.LogRecord("test", level, "test.py", lineno, message, None, None)
+    record.created = created
+    return record
+
+
+def test_records_are_json_lines(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_FILE", str(tmp_path / "logs" / "app-{pid}.log"))
+    pipeline = logger._Pipeline()  # pylint: disable=protected-access
+    pipeline.start()
+    token = logger.request_id.set("abc")
+    try:
+        test_logger = logging.getLogger("test_records_are_json_lines")
+        test_logger.addHandler(pipeline.handler)
+        test_logger.warning("written %s", "later")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            test_logger.exception("failed")
+    finally:
+        logger.request_id.reset(token)
+        test_logger.removeHandler(pipeline.handler)
+        pipeline.stop()
+
+    (path,) = (tmp_path / "logs").iterdir()
+    written, failed = [json.loads(line) for line in path.read_text().splitlines()]
+    assert written["message"] == "written later"
+    assert written["level"] == "WARNING"
+    assert written["request_id"] == "abc"
+    assert failed["message"] == "failed"
+    assert "ValueError: boom" in failed["exception"]
+
+
+def test_sampling_per_call_site():
+    sampling = logger.SamplingFilter(per_second=2)
+
+    kept = [sampling.filter(make_record()) for _ in range(5)]
+    other_site = sampling.filter(make_record(lineno=2))
+    warning = sampling.filter(make_record(level=logging.WARNING))
+    next_second = make_record(created=1001.0)
+
+    assert kept == [True, True, False, False, False]
+    assert other_site and warning
+    assert sampling.filter(next_second)
+    assert next_second.sampled_out == 3
+
+
+def test_sampling_across_threads():
+    sampling = logger.SamplingFilter(per_second=50)
+    barrier = threading.Barrier(8)
+    kept = []
+
+    def log():
+        barrier.wait()
+        kept.extend(sampling.filter(make_record()) for _ in range(1000))
+
+    threads = [threading.Thread(target=log) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert kept.count(True) == 50
+    next_second = make_record(created=1001.0)
+    assert sampling.filter(next_second)
+    assert next_second.sampled_out == 8000 - 50
+
+
+def test_full_queues_drop_records():
+    handler = logger.NonBlockingQueueHandler(queue.Queue(1))
+
+    for _ in range(3):
+        handler.handle(make_record())
+    assert handler.dropped == 2
+
+    handler.queue.get_nowait()
+    handler.handle(make_record())
+    assert handler.queue.get_nowait().dropped == 2
+    assert handler.dropped == 0
+
+
+def test_rotation(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_FILE", str(tmp_path / "app.log"))
+    monkeypatch.setenv("LOG_MAX_BYTES", "1024")
+    handler = logger._file_handler()  # pylint: disable=protected-access
+    assert isinstance(handler, logging.handlers.RotatingFileHandler)
+    assert handler.maxBytes == 1024
+
+    monkeypatch.setenv("LOG_ROTATE_WHEN", "midnight")
+    handler = logger._file_handler()  # pylint: disable=protected-access
+    assert isinstance(handler, logging.handlers.TimedRotatingFileHandler)
+
+
+def test_configured_once_by_the_app(app):  # pylint: disable=unused-argument
+    assert logger.configure() is logger.configure() is logger.pipeline
+    assert logging.getLogger().handlers.count(logger.pipeline.handler) == 1
+
+
+def test_import_configures_nothing(tmp_path):
+    code = (
+        "import logging, app.logger; "
+        "print(app.logger.pipeline, len(logging.getLogger().handlers))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=dict(os.environ, LOG_FILE=str(tmp_path / "logs" / "app.log")),
+    )
+    assert result.stdout.splitlines()[-1] == "None 0"
+    assert not (tmp_path / "logs").exists()
+
+
+def test_request_ids(client):
+    records = queue.Queue()
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(logger.RequestIdFilter())
+    logger.app_logger.addHandler(handler)
+    try:
+        sent = client.get("/health-check", headers={"X-Request-Id": "abc-123"})
+        generated = client.get("/health-check")
+    finally:
+        logger.app_logger.removeHandler(handler)
+
+    assert sent.headers["X-Request-Id"] == "abc-123"
+    assert records.get_nowait().request_id == "abc-123"
+    assert len(generated.headers["X-Request-Id"]) == 32
+    assert records.get_nowait().request_id == generated.headers["X-Request-Id"]
+
+
+def test_async_request_ids(app, session):  # pylint: disable=unused-argument
+    with TestClient(create_asgi_app(app), client=("127.0.0.1", 50000)) as asgi_client:
+        async_read = asgi_client.get("/brand/", headers={"X-Request-Id": "abc-123"})
+        flask_read = asgi_client.get("/health-check")
+
+    assert async_read.headers.get_list("X-Request-Id") == ["abc-123"]
+    assert len(flask_read.headers.get_list("X-Request-Id")) == 1
@@ -0,0 +1,119 @@
+"""
+Tests of the tracemalloc routes and the peak memory of bulk requests
+"""
+
+import io
+import urllib.error
+
+import pytest
+
+from app.utility import memory
+
+
+@pytest.fixture()
+def tracing():
+    memory.start(5)
+    try:
+        yield
+    finally:
+        memory.stop()
+
+
+def test_routes_need_tracing(client):
+    assert client.get("/internal/memory").get_json()["tracing"] is False
+    response = client.post("/internal/memory/snapshots")
+    assert response.status_code == 400
+    assert "start it first" in response.get_json()["message"]
+
+
+def test_snapshots_and_diff(client, tracing):
+    first = client.post("/internal/memory/snapshots").get_json()["snapshot"]
+    kept = [bytearray(10_000) for _ in range(50)]
+    second = client.post("/internal/memory/snapshots").get_json()["snapshot"]
+
+    status = client.get("/internal/memory").get_json()
+    assert status["tracing"] is True
+    assert status["frames"] == 5
+    assert status["snapshots"] == [first, second]
+
+    top = client.get(f"/internal/memory/top?snapshot={second}&limit=5")
+    assert len(top.get_json()["sites"]) == 5
+    sites = client.get(
+        f"/internal/memory/diff?from={first}&to={second}&limit=3"
+    ).get_json()["sites"]
+    assert "test_memory.py" in sites[0]["site"][0]
+    assert sites[0]["size_diff_bytes"] >= 500_000
+    assert len(kept) == 50
+
+
+def test_unknown_snapshot_and_key_type(client, tracing):
+    response = client.get("/internal/memory/diff?from=snapshot-404")
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Unknown snapshot: snapshot-404"
+    response = client.get("/internal/memory/top?key_type=module")
+    assert response.status_code == 400
+
+
+def test_bulk_request_peak(client, tracing):
+    brands = [
+        {"name": f"brand {i}", "website": f"brand{i}.example"} for i in range(200)
+    ]
+    response = client.post("/brand/bulk", json=brands)
+    assert response.status_code == 201
+    peak = int(response.headers["X-Peak-Memory-Bytes"])
+    assert peak > 0
+
+    peaks = memory.status()["request_peaks"]["brands_brand_bulk_resource"]
+    assert peaks["requests"] == 1
+    assert peaks["peak_bytes_max"] == peak
+    assert peaks["rows_max"] == 200
+    assert peaks["bytes_per_row_max"] == peak // 200
+    assert "X-Peak-Memory-Bytes" not in client.get("/brand/1").headers
+
+
+def test_stop_drops_the_snapshots(client):
+    client.post("/internal/memory/start?frames=3")
+    client.post("/internal/memory/snapshots")
+    status = client.post("/internal/memory/stop").get_json()
+    assert status["tracing"] is False
+    assert status["snapshots"] == []
+
+
+def test_calls_for_another_worker_are_refused(client):
+    pid = client.get("/internal/memory").get_json()["pid"]
+
+    assert client.get(f"/internal/memory?pid={pid}").status_code == 200
+    response = client.post(f"/internal/memory/snapshots?pid={pid + 1}")
+    assert response.status_code == 409
+    assert response.get_json() == {
+        "message": f"Reached worker {pid}, not {pid + 1}.",
+        "pid": pid,
+    }
+
+
+def test_call_server_retries_until_the_worker_answers(monkeypatch):
+    answers = iter([409, 409, 200])
+    targets = []
+
+    class Response(io.BytesIO):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+    def urlopen(req, timeout):  # pylint: disable=unused-argument
+        targets.append(req.full_url)
+        status = next(answers)
+        if status == 409:
+            raise urllib.error.HTTPError(
+                req.full_url, 409, "Conflict", {}, io.BytesIO(b'{"pid": 1}')
+            )
+        return Response(b'{"snapshot": "snapshot-1", "pid": 42}')
+
+    monkeypatch.setattr(memory.urllib.request, "urlopen", urlopen)
+
+    result = memory.call_server("http://server", "POST", "/snapshots", pid=42)
+
+    assert result == {"snapshot": "snapshot-1", "pid": 42}
+    assert targets == ["http://server/internal/memory/snapshots?pid=42"] * 3
@@ -0,0 +1,72 @@
+"""
+Tests of the instrumented connection pool setup
+"""
+
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import engine_from_config, exc, text
+from sqlalchemy.pool import QueuePool
+
+from app.tests.conftest import TEST_DATABASE_URI
+from app.utility import pool
+
+POOL_OPTIONS = {"pool_size": 1, "max_overflow": 0, "pool_timeout": 0.25}
+
+
+@pytest.fixture(autouse=True)
+def restore_pool_class(monkeypatch):
+    # init_app configures the pool class, keep the session app's settings
+    monkeypatch.setattr(pool.InstrumentedQueuePool, "timeout_seconds", None)
+    monkeypatch.setattr(
+        pool.InstrumentedQueuePool,
+        "wait_warning_seconds",
+        pool.DEFAULT_WAIT_WARNING_SECONDS,
+    )
+
+
+def _configured_engine(uri):
+    """Engine built from the app config the way Flask-SQLAlchemy does"""
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=uri,
+        SQLALCHEMY_ENGINE_OPTIONS={"pool_pre_ping": True},
+        SQLALCHEMY_POOL_OPTIONS=dict(POOL_OPTIONS),
+    )
+    pool.init_app(app)
+    return engine_from_config(
+        {**app.config["SQLALCHEMY_ENGINE_OPTIONS"], "url": uri}, prefix=""
+    )
+
+
+def test_sqlite_keeps_its_default_pool():
+    engine = _configured_engine("sqlite://")
+
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE t (x INTEGER)"))
+        connection.execute(text("INSERT INTO t VALUES (1)"))
+        connection.commit()
+    # the in-memory database survived the connection being returned
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM t")).scalar() == 1
+    assert not isinstance(engine.pool, QueuePool)
+
+
+def test_server_databases_get_the_instrumented_pool_with_fractional_timeout():
+    if not TEST_DATABASE_URI:
+        pytest.skip("TEST_DATABASE_URI is not set")
+    engine = _configured_engine(TEST_DATABASE_URI)
+
+    assert isinstance(engine.pool, pool.InstrumentedQueuePool)
+    assert engine.pool.timeout() == 0.25
+    with engine.connect():
+        started = time.perf_counter()
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        assert 0.2 <= time.perf_counter() - started < 1
+    assert engine.pool.stats.counts["timeouts"] == 1
+    engine.dispose()
+    # the counters and the timeout survive a re-created pool
+    assert engine.pool.timeout() == 0.25
+    assert engine.pool.stats.counts["timeouts"] == 1
@@ -0,0 +1,124 @@
+"""
+Tests of the on-demand and background request profiles
+"""
+
+import json
+import marshal
+import threading
+import time
+
+import pytest
+from sqlalchemy import insert
+
+from app.brand.models import Brand
+from app.utility.profiling import (
+    BackgroundProfiler,
+    Sampler,
+    SlowestRequests,
+    StackSamples,
+)
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@pytest.fixture()
+def brand_id(session):
+    created = session.execute(
+        insert(Brand.__table__)
+        .values(name="profiled", website="profiled.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    session.commit()
+    return created
+
+
+def test_sampler_collects_the_stacks_of_a_thread():
+    sampler = Sampler(0.001)
+    samples = sampler.watch(threading.get_ident())
+    sampler.start()
+    busy_loop(0.05)
+    sampler.stop()
+
+    collapsed = samples.collapsed()
+    assert "test_sampler_collects_the_stacks_of_a_thread" in collapsed
+    assert ";busy_loop (test_profiling.py:" in collapsed
+    speedscope = samples.speedscope("busy")
+    assert speedscope["profiles"][0]["endValue"] == pytest.approx(
+        sum(samples.stacks.values())
+    )
+
+
+def test_sampling_profile_of_a_request(client, brand_id):
+    response = client.get(
+        f"/brand/{brand_id}",
+        headers={"X-Profile": "sampling", "X-Profile-Interval-Ms": "0.1"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Profiled-Status"] == "200"
+    assert float(response.headers["X-Profiled-Duration-Ms"]) > 0
+    profile = json.loads(response.get_data())
+    assert profile["profiles"][0]["type"] == "sampled"
+
+
+def test_collapsed_profile_of_a_request(client):
+    response = client.get(
+        "/brand/999",
+        headers={"X-Profile": "sampling", "X-Profile-Format": "collapsed"},
+    )
+
+    assert response.mimetype == "text/plain"
+    assert response.headers["X-Profiled-Status"] == "404"
+
+
+def test_cprofile_of_a_request(client, brand_id):
+    response = client.get(f"/brand/{brand_id}", headers={"X-Profile": "cprofile"})
+
+    stats = marshal.loads(response.get_data())
+    functions = {(file.rsplit("/", 1)[-1], name) for file, _, name in stats}
+    assert ("routes.py", "get") in functions
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"X-Profile": "everything"},
+        {"X-Profile": "sampling", "X-Profile-Format": "svg"},
+        {"X-Profile": "sampling", "X-Profile-Interval-Ms": "fast"},
+    ],
+)
+def test_invalid_profile_headers(client, headers):
+    assert client.get("/health-check", headers=headers).status_code == 400
+
+
+def test_only_the_slowest_requests_are_written(tmp_path):
+    slowest = SlowestRequests(str(tmp_path), limit=2)
+    for seconds in (0.3, 0.1, 0.2):
+        samples = StackSamples(0.01)
+        samples.stacks[(("view", "routes.py", 1),)] = 3
+        slowest.offer(seconds, f"GET /brand/{seconds}", samples)
+
+    assert slowest.flush() == []
+    paths = slowest.flush(force=True)
+
+    assert [path.rsplit("/", 1)[-1] for path in paths] == [
+        "0000300.0ms-1-GET_brand_0.3.collapsed.txt",
+        "0000200.0ms-3-GET_brand_0.2.collapsed.txt",
+    ]
+    with open(paths[0], encoding="utf-8") as file:
+        assert file.read() == "view (routes.py:1) 3\n"
+
+
+def test_background_profiler_samples_requests(tmp_path):
+    profiler = BackgroundProfiler(str(tmp_path), limit=1, interval=0.001)
+    samples = profiler.sampler().watch(threading.get_ident())
+    busy_loop(0.05)
+    profiler.finish(threading.get_ident(), 0.05, "GET /slow", samples)
+
+    [path] = profiler.slowest.flush(force=True)
+    with open(path, encoding="utf-8") as file:
+        assert "busy_loop" in file.read()
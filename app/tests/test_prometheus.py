@@ -0,0 +1,117 @@
+"""
+Tests of the Prometheus metrics on /metrics
+"""
+
+import os
+import subprocess
+import sys
+
+from prometheus_client import REGISTRY
+from starlette.testclient import TestClient
+
+from app.async_read import create_asgi_app
+
+BRAND_LABELS = {
+    "namespace": "brands",
+    "resource": "BrandResourceWithParam",
+    "method": "GET",
+}
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_are_counted_per_resource(client):
+    requests = _value("http_requests_total", **BRAND_LABELS, status="404")
+    latencies = _value("http_request_duration_seconds_count", **BRAND_LABELS)
+    queries = _value("http_request_db_queries_sum", **BRAND_LABELS)
+
+    client.get("/brand/999")
+    client.get("/brand/999")
+    client.get("/no-such-route")
+
+    assert _value("http_requests_total", **BRAND_LABELS, status="404") == requests + 2
+    assert (
+        _value("http_request_duration_seconds_count", **BRAND_LABELS) == latencies + 2
+    )
+    assert _value("http_request_db_queries_sum", **BRAND_LABELS) == queries + 2
+    assert _value(
+        "http_requests_total",
+        namespace="unmatched",
+        resource="unmatched",
+        method="GET",
+        status="404",
+    )
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert (
+        'http_request_db_seconds_bucket{le="0.005",method="GET",namespace="brands"'
+        in body
+    )
+    assert "db_pool_checkout_wait_seconds_count" in body
+
+
+def test_bulk_ingest_rows_are_counted(client):
+    rows = _value("bulk_ingest_rows_total", kind="brand")
+
+    client.post(
+        "/brand/bulk",
+        json=[
+            {"name": f"metric {i}", "website": f"metric{i}.example"} for i in range(3)
+        ],
+    )
+
+    assert _value("bulk_ingest_rows_total", kind="brand") == rows + 3
+
+
+def test_workers_values_are_added_up(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    record = (
+        "from app.utility import prometheus; "
+        "prometheus.REQUESTS.labels('brands', 'Brand', 'GET', 200).inc(); "
+        "prometheus.increment_counter('bulk_ingest_rows_total', 5, {'kind': 'brand'})"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", record], env=env, check=True)
+
+    body = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from app.utility import prometheus; print(prometheus.render()[0].decode())",
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    assert (
+        'http_requests_total{method="GET",namespace="brands",resource="Brand",'
+        'status="200"} 2.0' in body
+    )
+    assert 'bulk_ingest_rows_total{kind="brand"} 10.0' in body
+
+
+def test_async_reads_are_counted(app, session):  # pylint: disable=unused-argument
+    requests = _value("http_requests_total", **BRAND_LABELS, status="404")
+    latencies = _value("http_request_duration_seconds_count", **BRAND_LABELS)
+    health_labels = {
+        "namespace": "main",
+        "resource": "index",
+        "method": "GET",
+        "status": "200",
+    }
+    health_checks = _value("http_requests_total", **health_labels)
+
+    with TestClient(create_asgi_app(app), client=("127.0.0.1", 50000)) as asgi_client:
+        assert asgi_client.get("/brand/999").status_code == 404
+        assert asgi_client.get("/health-check").status_code == 200
+
+    assert _value("http_requests_total", **BRAND_LABELS, status="404") == requests + 1
+    assert (
+        _value("http_request_duration_seconds_count", **BRAND_LABELS) == latencies + 1
+    )
+    # passed on to the Flask app, which records it once
+    assert _value("http_requests_total", **health_labels) == health_checks + 1
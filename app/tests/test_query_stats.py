@@ -0,0 +1,92 @@
+"""
+Tests of the per-request SQL statement counts, N+1 detection and budgets
+"""
+
+import logging
+
+import pytest
+from sqlalchemy import insert, text
+
+from app.brand.models import Brand
+from app.utility import query_stats
+from app.utility.query_stats import QueryBudgetExceeded, query_budget
+
+
+@pytest.fixture()
+def brand_id(session):
+    created = session.execute(
+        insert(Brand.__table__)
+        .values(name="counted", website="counted.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    session.commit()
+    return created
+
+
+@pytest.fixture()
+def sql_headers(monkeypatch):
+    monkeypatch.setattr(query_stats, "header_ips", frozenset({"127.0.0.1"}))
+
+
+def test_statement_shape_collapses_in_lists():
+    one = "SELECT x FROM t\n WHERE id IN (%(id_1_1)s)"
+    three = "SELECT x FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)"
+
+    assert query_stats.statement_shape(one) == query_stats.statement_shape(three)
+    assert query_stats.parameters_shape({"id": 1, "name": "secret"}) == (
+        "{id: int, name: str}"
+    )
+
+
+# pylint: disable-next=unused-argument
+def test_request_counts_are_sent_as_headers(client, brand_id, sql_headers):
+    response = client.get(f"/brand/{brand_id}")
+
+    assert response.status_code == 200
+    assert response.headers["X-SQL-Queries"] == "1"
+    assert float(response.headers["X-SQL-Time-Ms"]) > 0
+    assert response.headers["X-SQL-N-Plus-One"] == "0"
+
+
+def test_headers_are_opt_in(client, brand_id):
+    response = client.get(f"/brand/{brand_id}")
+
+    assert response.status_code == 200
+    assert "X-SQL-Queries" not in response.headers
+
+
+# pylint: disable-next=unused-argument
+def test_per_row_lookups_are_flagged(client, caplog, sql_headers):
+    brands = [
+        {"name": f"bulk {index}", "website": f"bulk{index}.example"}
+        for index in range(6)
+    ]
+
+    with caplog.at_level(logging.WARNING):
+        response = client.post("/brand/bulk", json=brands)
+
+    assert response.status_code == 201
+    assert response.headers["X-SQL-N-Plus-One"] == "1"
+    assert "Possible N+1 in POST /brand/bulk: statement run 6 times" in caplog.text
+
+
+def test_query_budget(client, brand_id):
+    with query_budget(1) as stats:
+        client.get(f"/brand/{brand_id}")
+    assert stats.count == 1
+
+    with pytest.raises(QueryBudgetExceeded, match="2 statements ran, the budget is 1"):
+        with query_budget(1):
+            client.get(f"/brand/{brand_id}")
+            client.get(f"/brand/{brand_id}")
+
+
+def test_slow_statements_are_logged_without_values(session, caplog, monkeypatch):
+    monkeypatch.setattr(query_stats, "slow_query_seconds", 0)
+
+    with caplog.at_level(logging.WARNING):
+        session.execute(text("SELECT CAST(:secret AS text)"), {"secret": "hunter2"})
+
+    assert "Slow SQL statement" in caplog.text
+    assert "parameters: {secret: str}" in caplog.text
+    assert "hunter2" not in caplog.text
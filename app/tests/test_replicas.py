@@ -0,0 +1,187 @@
+"""
+Tests of the read replica routing, stickiness and failover, on two SQLite
+databases standing for the primary and its replica
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine, insert, select
+from starlette.testclient import TestClient
+
+import config
+from app import create_app
+from app.async_read import create_asgi_app
+from app.brand.models import Brand
+from app.extensions import db
+from app.utility import metrics
+from app.utility.replicas import (
+    COOKIE,
+    HEADER,
+    ReplicaRouter,
+    format_lsn,
+    parse_lsn,
+    read_after_token,
+)
+
+
+@pytest.fixture()
+def replica_app(app, tmp_path, monkeypatch):  # pylint: disable=unused-argument
+    monkeypatch.setattr(
+        config.Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path}/primary.db"
+    )
+    monkeypatch.setattr(
+        config.Config, "SQLALCHEMY_REPLICA_URIS", [f"sqlite:///{tmp_path}/replica.db"]
+    )
+    monkeypatch.setattr(config.Config, "REPLICA_STICKY_SECONDS", 0.5)
+    test_app = create_app()
+    test_app.config["TESTING"] = True
+    with test_app.app_context():
+        db.metadata.create_all(db.engines[None])
+        db.metadata.create_all(db.engines["replica_0"])
+        for key, name in ((None, "on primary"), ("replica_0", "on replica")):
+            with db.engines[key].begin() as connection:
+                connection.execute(
+                    insert(Brand.__table__).values(
+                        name=name, website=f"{name.split()[1]}.example"
+                    )
+                )
+    yield test_app
+    # db is shared by the apps, the bind's (empty) metadata would outlive this one
+    db.metadatas.pop("replica_0", None)
+
+
+def brand_names(client, **kwargs):
+    response = client.get("/brand/", **kwargs)
+    assert response.status_code == 200
+    return [brand["name"] for brand in response.json["brands"]]
+
+
+def test_reads_go_to_the_replica(replica_app):
+    client = replica_app.test_client()
+
+    assert brand_names(client) == ["on replica"]
+    assert client.get("/brand/1").json["data"]["name"] == "on replica"
+
+
+def test_writers_read_their_writes_from_the_primary(replica_app):
+    client = replica_app.test_client()
+
+    created = client.post(
+        "/brand/", json={"name": "written", "website": "written.example"}
+    )
+    assert created.status_code == 201
+    assert client.get_cookie(COOKIE) is not None
+    token = created.headers[HEADER]
+
+    assert brand_names(client) == ["written", "on primary"]
+    # clients without cookies send the token back as a header
+    other = replica_app.test_client(use_cookies=False)
+    assert brand_names(other) == ["on replica"]
+    assert brand_names(other, headers={HEADER: token}) == ["written", "on primary"]
+
+    time.sleep(0.5)
+    assert brand_names(other, headers={HEADER: token}) == ["on replica"]
+
+
+def test_flushes_go_to_the_primary(replica_app):
+    with replica_app.test_request_context():
+        g.db_replica = "replica_0"
+        db.session.add(Brand(name="flushed", website="flushed.example"))
+        db.session.commit()
+        with db.engines[None].connect() as connection:
+            names = connection.execute(select(Brand.name)).scalars().all()
+
+    assert "flushed" in names
+
+
+def test_unhealthy_replicas_fail_over_to_the_primary(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/missing/replica.db")
+    router = ReplicaRouter({"replica_0": engine}, interval=3600)
+
+    assert router.choose() == ("replica_0", "replica")
+    router.check("replica_0")
+    assert router.to_dict()["replica_0"]["healthy"] is False
+    assert router.choose() == (None, "no_replica")
+
+    (tmp_path / "missing").mkdir()
+    router.check("replica_0")
+    assert router.choose() == ("replica_0", "replica")
+
+
+def test_lsn_stickiness():
+    router = ReplicaRouter(
+        {"replica_0": create_engine("sqlite://")}, sticky_seconds=60, interval=3600
+    )
+    router.replicas["replica_0"].lsn = parse_lsn("16/B374D848")
+    assert format_lsn(parse_lsn("16/B374D848")) == "16/B374D848"
+
+    caught_up = read_after_token(time.time(), parse_lsn("16/B374D848"))
+    ahead = read_after_token(time.time(), parse_lsn("16/B374D849"))
+    expired = read_after_token(time.time() - 120, parse_lsn("17/0"))
+
+    assert router.choose(caught_up) == ("replica_0", "replica")
+    assert router.choose(ahead) == (None, "sticky")
+    assert router.choose(expired) == ("replica_0", "replica")
+    assert router.choose("garbage") == ("replica_0", "replica")
+
+
+def test_writers_never_join_a_replica_flight(replica_app, monkeypatch):
+    to_dict = Brand.to_dict
+
+    def slow_to_dict(brand):
+        time.sleep(0.2)
+        return to_dict(brand)
+
+    monkeypatch.setattr(Brand, "to_dict", slow_to_dict)
+    writer = replica_app.test_client()
+    token = writer.put("/brand/1", json={"name": "written"}).headers[HEADER]
+
+    def get(headers):
+        client = replica_app.test_client(use_cookies=False)
+        return client.get("/brand/1", headers=headers).json["data"]["name"]
+
+    with ThreadPoolExecutor(2) as pool:
+        reader = pool.submit(get, {})
+        time.sleep(0.05)
+        follow_up = pool.submit(get, {HEADER: token})
+
+        assert reader.result() == "on replica"
+        assert follow_up.result() == "written"
+
+
+def db_reads(bind, reason):
+    return sum(
+        counter["value"]
+        for counter in metrics.snapshot()["counters"]
+        if counter["name"] == "db_reads_total"
+        and counter["labels"] == {"bind": bind, "reason": reason}
+    )
+
+
+def test_async_reads_use_the_router(app, session, monkeypatch):
+    # pylint: disable=unused-argument
+    # the test database stands for its own replica
+    monkeypatch.setattr(
+        config.Config,
+        "SQLALCHEMY_REPLICA_URIS",
+        [app.config["SQLALCHEMY_DATABASE_URI"]],
+    )
+    replicated_app = create_app()
+    replicated_app.config["TESTING"] = True
+    before = db_reads("replica_0", "replica"), db_reads("primary", "sticky")
+    try:
+        asgi_app = create_asgi_app(replicated_app)
+        with TestClient(asgi_app, client=("127.0.0.1", 50000)) as asgi_client:
+            assert asgi_client.get("/brand/").status_code == 200
+            assert set(asgi_app.state.replica_sessionmakers) == {"replica_0"}
+            token = read_after_token(time.time())
+            response = asgi_client.get("/brand/", headers={HEADER: token})
+            assert response.status_code == 200
+    finally:
+        db.metadatas.pop("replica_0", None)
+
+    assert db_reads("replica_0", "replica") == before[0] + 1
+    assert db_reads("primary", "sticky") == before[1] + 1
@@ -0,0 +1,109 @@
+"""
+Tests of POST /sentiment/bulk
+"""
+
+import json
+
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from app.brand.models import Brand
+from app.sentiment import ingest
+from app.sentiment.models import Sentiment
+
+
+@pytest.fixture()
+def brand_id(session):
+    created = session.execute(
+        insert(Brand.__table__)
+        .values(name="ingested", website="ingested.example")
+        .returning(Brand.brand_id)
+    ).scalar_one()
+    session.commit()
+    return created
+
+
+def _sentiment_count(session):
+    return session.execute(
+        select(func.count()).select_from(Sentiment.__table__)
+    ).scalar()
+
+
+def test_bulk_reports_errors_per_row(client, session, brand_id):
+    rows = [
+        {"brand_id": brand_id, "sentiment": "Positive", "summary": "fine"},
+        {"sentiment": "positive"},
+        {"brand_id": 999999},
+        {"brand_id": "one"},
+        {"brand_id": brand_id, "is_manually_verified": "yes"},
+        "not an object",
+        {"brand_id": brand_id, "licensability": "Very Likely"},
+    ]
+
+    response = client.post("/sentiment/bulk", json=rows)
+
+    assert response.status_code == 207
+    assert response.json["inserted"] == 2
+    assert [created["index"] for created in response.json["created"]] == [0, 6]
+    assert {error["index"]: error["error"] for error in response.json["errors"]} == {
+        1: "brand_id is required.",
+        2: "Brand with ID 999999 not found.",
+        3: "brand_id should be an integer.",
+        4: "is_manually_verified should be a boolean.",
+        5: "Sentiment should be an object.",
+    }
+    assert _sentiment_count(session) == 2
+
+
+def test_bulk_rejects_non_list_body(client):
+    response = client.post("/sentiment/bulk", json={"brand_id": 1})
+
+    assert response.status_code == 400
+
+
+def test_bulk_ndjson_reports_bad_lines(client, session, brand_id):
+    lines = [
+        json.dumps({"brand_id": brand_id}),
+        "{not json",
+        "",
+        json.dumps({"brand_id": brand_id, "sentiment": "negative"}),
+    ]
+
+    response = client.post(
+        "/sentiment/bulk",
+        data="\n".join(lines).encode("utf-8") + b"\n\xff\xfe\n",
+        content_type="application/x-ndjson",
+    )
+
+    assert response.status_code == 207
+    assert response.json["inserted"] == 2
+    assert [error["index"] for error in response.json["errors"]] == [1, 4]
+    assert _sentiment_count(session) == 2
+
+
+def test_bulk_ndjson_failure_reports_committed_blocks(
+    client, session, brand_id, monkeypatch
+):
+    monkeypatch.setattr(ingest, "STREAM_BLOCK_SIZE", 2)
+    calls = []
+    find_missing_references = ingest.find_missing_references
+
+    def failing_on_second_block(rows):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise OperationalError("SELECT", {}, Exception("connection lost"))
+        return find_missing_references(rows)
+
+    monkeypatch.setattr(ingest, "find_missing_references", failing_on_second_block)
+    lines = "\n".join(json.dumps({"brand_id": brand_id}) for _ in range(5))
+
+    response = client.post(
+        "/sentiment/bulk", data=lines, content_type="application/x-ndjson"
+    )
+
+    assert response.status_code == 500
+    assert response.json["committed"] == 2
+    assert response.json["resume_from_index"] == 2
+    assert [created["index"] for created in response.json["created"]] == [0, 1]
+    assert _sentiment_count(session) == 2
@@ -0,0 +1,108 @@
+"""
+Tests of the filters and pagination of GET /sentiment/
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from app.brand.models import Brand
+from app.sentiment.models import Sentiment, SentimentEnum, UrlSourceEnum
+
+
+@pytest.fixture()
+def brand_ids(session):
+    ids = [
+        session.execute(
+            insert(Brand.__table__)
+            .values(name=f"listed {index}", website=f"listed{index}.example")
+            .returning(Brand.brand_id)
+        ).scalar_one()
+        for index in range(2)
+    ]
+    rows = [
+        {
+            "brand_id": ids[index % 2],
+            "sentiment": SentimentEnum.positive if index % 3 else SentimentEnum.negative,
+            "is_manually_verified": index % 4 == 0,
+            "created_at": datetime(2024, 1, 1 + index),
+        }
+        for index in range(10)
+    ]
+    session.execute(insert(Sentiment.__table__), rows)
+    session.commit()
+    return ids
+
+
+def _list(client, **params):
+    response = client.get("/sentiment/", query_string=params)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def test_cursor_pages_walk_every_match_once(client, brand_ids):
+    first = _list(client, brand_id=brand_ids[0], page_size=2)
+    assert first["total_items"] == 5
+    seen = [sentiment["sentiment_id"] for sentiment in first["sentiments"]]
+    cursor = first["next_cursor"]
+    while cursor is not None:
+        page = _list(client, brand_id=brand_ids[0], page_size=2, cursor=cursor)
+        assert page["total_items"] is None
+        seen.extend(sentiment["sentiment_id"] for sentiment in page["sentiments"])
+        cursor = page["next_cursor"]
+
+    assert seen == [9, 7, 5, 3, 1]
+
+
+def test_filters_combine(client, brand_ids):
+    result = _list(
+        client,
+        sentiment="positive",
+        is_manually_verified="false",
+        created_from="2024-01-02T00:00:00",
+        created_to="2024-01-08T00:00:00",
+    )
+
+    assert [sentiment["sentiment_id"] for sentiment in result["sentiments"]] == [
+        6,
+        3,
+        2,
+    ]
+    assert {sentiment["sentiment"] for sentiment in result["sentiments"]} == {
+        "positive"
+    }
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "abc"},
+        {"brand_id": "one"},
+        {"sentiment": "great"},
+        {"is_manually_verified": "maybe"},
+        {"created_from": "yesterday"},
+    ],
+)
+def test_invalid_arguments_are_rejected(client, params):
+    response = client.get("/sentiment/", query_string=params)
+
+    assert response.status_code == 400
+
+
+def test_labels_are_marshalled_as_values(client, session, brand_ids):
+    client.post(
+        "/sentiment/bulk",
+        json=[
+            {
+                "brand_id": brand_ids[0],
+                "licensability": "Very Likely",
+                "link_source": "HTML Extract",
+            }
+        ],
+    )
+
+    listed = _list(client, brand_id=brand_ids[0], page_size=1)["sentiments"][0]
+
+    assert listed["licensability"] == "verylikely"
+    assert listed["link_source"] == UrlSourceEnum.parsed.value
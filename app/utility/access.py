@@ -0,0 +1,17 @@
+"""
+Client addresses allowed to use the API
+
+Every request from another address is refused with 403 (see create_app). The
+same list gates the diagnostic outputs of the app.
+"""
+
+ALLOWED_IPS = {
+    "44.220.242.243",  # company-vpc-public-subnet-nat-ip
+    "127.0.0.1",  # internal localhost access
+    "99.231.69.240",
+}
+
+
+def is_allowed_ip(client_ip):
+    """Whether requests from `client_ip` are served"""
+    return client_ip in ALLOWED_IPS
@@ -0,0 +1,136 @@
+"""
+Conditional GETs and Cache-Control of the API
+
+The detail GETs of articles, brands and enrichments carry a strong ETag built
+from the primary key and last_updated_at of the row. For requests with an
+If-None-Match, conditional_get() reads that version first, with an index-only
+scan of the (id) INCLUDE (last_updated_at) index of the table, and answers
+304 Not Modified when it holds the current ETag, without loading the row. For
+this to hold, every change of a column shown by those GETs bumps
+last_updated_at (the ORM onupdate, bulk_update_from_values and the label
+normalization do).
+
+GET responses get the Cache-Control policy of their namespace (CACHE_CONTROL).
+"""
+
+import functools
+import hashlib
+
+from flask import current_app, request
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.http import parse_etags, quote_etag
+
+from app.extensions import db
+from app.logger import app_logger
+from app.utility import metrics, prometheus
+from app.utility.compression import etag_variants
+
+# part of every ETag, bump it when the representation of the rows changes
+ETAG_VERSION = "1"
+# only successful reads are worth caching
+CACHEABLE_STATUSES = (200, 304)
+
+
+def entity_etag(model, object_id, last_updated_at):
+    """
+    Strong ETag (unquoted) of a row of `model` at its last_updated_at, given as
+    a datetime or as its isoformat() (how the GETs send it)
+    """
+    if hasattr(last_updated_at, "isoformat"):
+        last_updated_at = last_updated_at.isoformat()
+    version = last_updated_at or ""
+    key = f"{ETAG_VERSION}:{model.__tablename__}:{object_id}:{version}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def version_statement(model, object_id):
+    """SELECT of the last_updated_at of a row of `model`, index-only"""
+    primary_key = model.__mapper__.primary_key[0]
+    return select(model.last_updated_at).where(primary_key == object_id)
+
+
+def not_modified(if_none_match, etag):
+    """
+    Whether an If-None-Match header value matches `etag`, in any of its
+    encodings (see app/utility/compression.py)
+    """
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return any(etags.contains_weak(variant) for variant in etag_variants(etag))
+
+
+def _last_updated_at(model, object_id, body):
+    """last_updated_at of a row, from the body of its GET when it's there"""
+    data = body.get("data") if isinstance(body, dict) else None
+    if isinstance(data, dict) and "last_updated_at" in data:
+        return data["last_updated_at"]
+    row = db.session.execute(version_statement(model, object_id)).first()
+    return row.last_updated_at if row is not None else None
+
+
+def conditional_get(model, id_arg):
+    """
+    Decorate the GET of a `model` row, whose id is the `id_arg` view argument,
+    to answer 304 when If-None-Match holds the row's ETag, and to send that
+    ETag with the row otherwise (taken from the body the view built, so no
+    statement is added to unconditional GETs).
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            object_id = kwargs[id_arg]
+            if_none_match = request.headers.get("If-None-Match")
+            if if_none_match:
+                try:
+                    row = db.session.execute(
+                        version_statement(model, object_id)
+                    ).first()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    app_logger.error(
+                        f"Error looking up the version of {model.__tablename__} "
+                        f"{object_id}: {str(e)}"
+                    )
+                    row = None
+                if row is not None:
+                    etag = entity_etag(model, object_id, row.last_updated_at)
+                    if not_modified(if_none_match, etag):
+                        metrics.increment(
+                            "http_not_modified_total", table=model.__tablename__
+                        )
+                        return current_app.response_class(
+                            status=304, headers={"ETag": quote_etag(etag)}
+                        )
+
+            result = view(*args, **kwargs)
+            if isinstance(result, tuple) and len(result) == 2 and result[1] == 200:
+                etag = entity_etag(
+                    model, object_id, _last_updated_at(model, object_id, result[0])
+                )
+                return (*result, {"ETag": quote_etag(etag)})
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def init_app(app, api):
+    """Set the Cache-Control policy of their namespace on GET responses of `app`"""
+    policies = app.config.get("CACHE_CONTROL") or {}
+
+    @app.after_request
+    def set_cache_control(response):
+        if (
+            request.method in ("GET", "HEAD")
+            and response.status_code in CACHEABLE_STATUSES
+            and "Cache-Control" not in response.headers
+        ):
+            namespace, _ = prometheus.route_labels(app, api, request.endpoint)
+            policy = policies.get(namespace)
+            if policy:
+                response.headers["Cache-Control"] = policy
+        return response
@@ -0,0 +1,238 @@
+"""
+Single-flight of identical concurrent GETs
+
+Requests with the same method, path, query string, RELEVANT_HEADERS and
+read-your-writes token (replicas.read_after) that arrive while one of them
+(the leader) is being computed wait for it and get a copy of its response
+instead of running the same queries again. With
+COALESCE_TTL_SECONDS, successful responses are also reused by identical
+requests for that long after they are computed (stale by as much). Each
+worker process coalesces its own threads (or tasks, for the async reads);
+`http_coalesced_requests_total{namespace,source}` counts the requests served
+from another one's response.
+
+Only GETs of the API resources are coalesced, never profiled requests
+(X-Profile) nor streamed responses, and a request whose leader fails or takes
+longer than COALESCE_WAIT_SECONDS computes its own response.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+
+from app.utility import metrics, prometheus, replicas
+
+DEFAULT_WAIT_SECONDS = 30.0
+# headers changing the response of a GET
+RELEVANT_HEADERS = ("Accept", "Accept-Encoding", "If-None-Match", "If-Modified-Since")
+# responses kept for the TTL reuse
+MAX_CACHED = 1024
+
+
+def request_key(method, path, query_string, headers, read_after=None):
+    """
+    Key of the requests that get the same response
+    `read_after` is the client's read-your-writes token (see
+    app/utility/replicas.py): a client that just wrote never shares the
+    response of a read that may have run on a lagging replica.
+    """
+    return (
+        method,
+        path,
+        query_string,
+        tuple(headers.get(name, "") for name in RELEVANT_HEADERS),
+        read_after,
+    )
+
+
+class Flight:
+    """
+    One computation of a response, shared by the requests joining it
+    `result` is None until finished, and stays None if it failed.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """
+    In-flight computations and recent results by request key, for threads
+    """
+
+    def __init__(self, ttl=0.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._cached = OrderedDict()
+
+    def cached(self, key):
+        """Result computed less than `ttl` seconds ago, None otherwise"""
+        if not self.ttl:
+            return None
+        with self._lock:
+            entry = self._cached.get(key)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires < time.monotonic():
+                del self._cached[key]
+                return None
+            return result
+
+    def join(self, key):
+        """
+        Flight computing `key`, started if there is none
+        returns: (flight, leader), the leader must finish() it
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def finish(self, key, flight, result, cache=False):
+        """
+        End a flight with its result (None when failed), wake up the requests
+        waiting for it, and keep the result for `ttl` seconds if `cache`
+        """
+        flight.result = result
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if cache and self.ttl and result is not None:
+                self._cache(key, result)
+        flight.done.set()
+
+    def _cache(self, key, result):
+        now = time.monotonic()
+        self._cached.pop(key, None)
+        self._cached[key] = (now + self.ttl, result)
+        # entries share the ttl, the oldest expire first
+        while self._cached and (
+            len(self._cached) > MAX_CACHED or next(iter(self._cached.values()))[0] < now
+        ):
+            self._cached.popitem(last=False)
+
+
+class AsyncSingleFlight(SingleFlight):
+    """
+    SingleFlight for the tasks of an event loop
+    """
+
+    def __init__(self, ttl=0.0):
+        super().__init__(ttl)
+        self._futures = {}
+
+    async def run(self, key, compute, cacheable=None):
+        """
+        Result of `await compute()`, shared with the identical calls running
+        concurrently (or cached when `cacheable(result)`, default always),
+        None results aren't shared
+        returns: (result, source), source being None when computed by this call
+        """
+        result = self.cached(key)
+        if result is not None:
+            return result, "cached"
+        future = self._futures.get(key)
+        if future is not None:
+            result = await asyncio.shield(future)
+            if result is not None:
+                return result, "in_flight"
+            return await compute(), None
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        result = None
+        try:
+            result = await compute()
+            return result, None
+        finally:
+            del self._futures[key]
+            future.set_result(result)
+            if (
+                result is not None
+                and self.ttl
+                and (cacheable is None or cacheable(result))
+            ):
+                with self._lock:
+                    self._cache(key, result)
+
+
+def _coalescable(app):
+    view = app.view_functions.get(request.endpoint)
+    return (
+        request.method == "GET"
+        and getattr(view, "view_class", None) is not None
+        and "X-Profile" not in request.headers
+    )
+
+
+def _shared_response(app, api, result, source):
+    status, headers, body = result
+    namespace, _ = prometheus.route_labels(app, api, request.endpoint)
+    metrics.increment(
+        "http_coalesced_requests_total", namespace=namespace, source=source
+    )
+    return app.response_class(body, status=status, headers=headers)
+
+
+def init_app(app, api):
+    """
+    Coalesce the identical GETs of `app` (COALESCE_GETS, default true)
+    Registered last but for compression, so its after_request function sees
+    the (compressed) response of the view before the others add their
+    headers, which the requests served a copy get from their own run of those
+    functions.
+    """
+    if not app.config.get("COALESCE_GETS", True):
+        return
+    flights = SingleFlight(app.config.get("COALESCE_TTL_SECONDS", 0.0))
+    wait_seconds = app.config.get("COALESCE_WAIT_SECONDS", DEFAULT_WAIT_SECONDS)
+
+    @app.before_request
+    def join_flight():
+        if not _coalescable(app):
+            return None
+        key = request_key(
+            request.method,
+            request.path,
+            request.query_string,
+            request.headers,
+            replicas.read_after(request),
+        )
+        result = flights.cached(key)
+        if result is not None:
+            return _shared_response(app, api, result, "cached")
+        flight, leader = flights.join(key)
+        if leader:
+            g.flight = (key, flight)
+            return None
+        if flight.done.wait(wait_seconds) and flight.result is not None:
+            return _shared_response(app, api, flight.result, "in_flight")
+        return None
+
+    @app.after_request
+    def share_response(response):
+        flight = g.pop("flight", None)
+        if flight is not None:
+            key, current = flight
+            result = None
+            if not response.is_streamed:
+                result = (
+                    response.status_code,
+                    list(response.headers),
+                    response.get_data(),
+                )
+            flights.finish(key, current, result, cache=response.status_code == 200)
+        return response
+
+    @app.teardown_request
+    def release_flight(_exception):
+        # requests whose after_request functions didn't run
+        flight = g.pop("flight", None)
+        if flight is not None:
+            flights.finish(*flight, None)
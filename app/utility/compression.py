@@ -0,0 +1,267 @@
+"""
+Compression of the responses negotiated with Accept-Encoding
+
+Responses of a COMPRESSIBLE_TYPES type get the best encoding the client
+accepts among zstd (with the zstandard package), br (with brotli) and gzip,
+at the level of their namespace (COMPRESSION_LEVELS, 0 to send them as is).
+Bodies under COMPRESSION_MIN_SIZE bytes are sent as is, and streamed bodies
+(the exports) are compressed chunk by chunk as they are produced, each chunk
+flushed so the client gets it without the stream being buffered.
+
+The ETag of a compressed response names its encoding ("<etag>-gzip"), the
+bytes differing from the identity ones; caching.not_modified() matches the
+ETag of every encoding of a row, and a 304 answers with the one the client
+sent. Every response that could be compressed varies on Accept-Encoding.
+"""
+
+import zlib
+
+from flask import request
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag, unquote_etag
+
+from app.utility import prometheus
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+# by preference, on ties of the client's quality values
+ENCODINGS = ("zstd", "br", "gzip")
+AVAILABLE_ENCODINGS = tuple(
+    encoding
+    for encoding, module in (("zstd", zstandard), ("br", brotli), ("gzip", zlib))
+    if module is not None
+)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/vnd.apache.arrow.stream",
+    "application/x-ndjson",
+    "application/xml",
+    "text/",
+)
+# long-lived streams of small events, left to the proxies
+INCOMPRESSIBLE_TYPES = ("text/event-stream",)
+DEFAULT_LEVEL = 6
+DEFAULT_MIN_SIZE = 1024
+# brotli takes qualities up to 11, zstd levels up to 22, gzip up to 9
+MAX_LEVELS = {"gzip": 9, "br": 11, "zstd": 22}
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+_COMPRESSORS = {
+    "gzip": _GzipCompressor,
+    "br": _BrotliCompressor,
+    "zstd": _ZstdCompressor,
+}
+
+
+def compressor(encoding, level):
+    """
+    Incremental compressor of an available `encoding`, with compress(data),
+    flush() (everything compressed so far, the stream going on) and finish()
+    """
+    return _COMPRESSORS[encoding](min(max(level, 1), MAX_LEVELS[encoding]))
+
+
+def compress(data, encoding, level):
+    """`data` compressed in one go"""
+    stream = compressor(encoding, level)
+    return stream.compress(data) + stream.finish()
+
+
+def iter_compressed(chunks, encoding, level):
+    """Compressed stream of `chunks`, every chunk flushed as it comes"""
+    stream = compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            compressed = stream.compress(chunk) + stream.flush()
+            if compressed:
+                yield compressed
+        yield stream.finish()
+    finally:
+        # ends the stream's context (stream_with_context) when the client leaves
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def negotiate(accept_encoding, encodings=AVAILABLE_ENCODINGS):
+    """Encoding of `encodings` the Accept-Encoding header prefers, or None"""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best, best_quality = None, 0
+    for encoding in encodings:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(mimetype):
+    """Whether responses of `mimetype` are worth compressing"""
+    return bool(mimetype) and (
+        mimetype.startswith(COMPRESSIBLE_TYPES)
+        and not mimetype.startswith(INCOMPRESSIBLE_TYPES)
+    )
+
+
+def encoded_etag(etag, encoding):
+    """ETag (unquoted) of the `encoding` bytes of the representation `etag`"""
+    return f"{etag}-{encoding}"
+
+
+def etag_variants(etag):
+    """ETags (unquoted) of every encoding of the representation `etag`"""
+    return (etag, *(encoded_etag(etag, encoding) for encoding in ENCODINGS))
+
+
+def _not_modified_etag(etag_header, if_none_match):
+    """ETag header of a 304, the variant the client holds"""
+    etag, weak = unquote_etag(etag_header)
+    if etag is None or not if_none_match:
+        return etag_header
+    etags = parse_etags(if_none_match)
+    for variant in etag_variants(etag):
+        if etags.contains_weak(variant):
+            return quote_etag(variant, weak)
+    return etag_header
+
+
+def _add_vary(vary):
+    values = [value.strip() for value in vary.split(",") if value.strip()]
+    if "accept-encoding" not in (value.lower() for value in values):
+        values.append("Accept-Encoding")
+    return ", ".join(values)
+
+
+def encode_result(result, request_headers, level, min_size=DEFAULT_MIN_SIZE):
+    """
+    (status, headers, body) of a response, with `headers` a dict, compressed
+    for the client sending `request_headers`, like init_app does for Flask
+    """
+    status, headers, body = result
+    headers = dict(headers)
+    if status == 304 and "etag" in headers:
+        headers["etag"] = _not_modified_etag(
+            headers["etag"], request_headers.get("If-None-Match")
+        )
+        return status, headers, body
+    mimetype = headers.get("content-type", "").partition(";")[0].strip()
+    if (
+        not level
+        or status < 200
+        or status in (204, 206)
+        or "content-encoding" in headers
+        or not compressible(mimetype)
+    ):
+        return status, headers, body
+    headers["vary"] = _add_vary(headers.get("vary", ""))
+    encoding = negotiate(request_headers.get("Accept-Encoding"))
+    if encoding is None or len(body) < min_size:
+        return status, headers, body
+    body = compress(body, encoding, level)
+    headers["content-encoding"] = encoding
+    headers["content-length"] = str(len(body))
+    if "etag" in headers:
+        etag, weak = unquote_etag(headers["etag"])
+        headers["etag"] = quote_etag(encoded_etag(etag, encoding), weak)
+    return status, headers, body
+
+
+def init_app(app, api):
+    """
+    Compress the responses of `app` (COMPRESSION_LEVELS by namespace,
+    COMPRESSION_MIN_SIZE)
+    Registered after coalescing, so its after_request function runs first and
+    the requests coalesced share the compressed response.
+    """
+    levels = app.config.get("COMPRESSION_LEVELS") or {}
+    default_level = app.config.get("COMPRESSION_DEFAULT_LEVEL", DEFAULT_LEVEL)
+    min_size = app.config.get("COMPRESSION_MIN_SIZE", DEFAULT_MIN_SIZE)
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304 and "ETag" in response.headers:
+            response.headers["ETag"] = _not_modified_etag(
+                response.headers["ETag"], request.headers.get("If-None-Match")
+            )
+            return response
+        if (
+            request.method == "HEAD"
+            or response.status_code < 200
+            or response.status_code in (204, 206)
+            or "Content-Encoding" in response.headers
+            or not compressible(response.mimetype)
+        ):
+            return response
+        namespace, _ = prometheus.route_labels(app, api, request.endpoint)
+        level = levels.get(namespace, default_level)
+        if not level:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            if (response.content_length or min_size) < min_size:
+                return response
+            response.response = iter_compressed(response.response, encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            response.set_data(compress(data, encoding, level))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag(encoded_etag(etag, encoding), weak)
+        return response
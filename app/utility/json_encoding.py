@@ -0,0 +1,75 @@
+"""
+Fast JSON encoding of the API responses
+
+dumps() encodes with orjson when it is installed and with the standard json
+module otherwise, both giving the same compact UTF-8 JSON. Besides the JSON
+types, it encodes datetimes, dates and times as ISO-8601 (like isoformat()),
+Decimals as numbers (like the models' to_dict()) and Enum members, such as
+SentimentEnum or FixedEntityTypeEnum, as their value.
+
+output_json is the "application/json" representation of `api`
+(app/extensions.py) and JSONResponse the response class of the async reads.
+"""
+
+import datetime
+import decimal
+import enum
+import json
+
+from flask import current_app, make_response
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(value):
+    """Encoding of the non-JSON types"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    # datetimes go through _default, orjson writes naive ones differently
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(data, indent=False):
+        """`data` as JSON bytes, indented by 2 spaces if `indent`"""
+        options = _OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS
+        return orjson.dumps(data, default=_default, option=options)
+
+else:
+
+    def dumps(data, indent=False):
+        """`data` as JSON bytes, indented by 2 spaces if `indent`"""
+        return json.dumps(
+            data,
+            default=_default,
+            ensure_ascii=False,
+            indent=2 if indent else None,
+            separators=(",", ": ") if indent else (",", ":"),
+        ).encode("utf-8")
+
+
+def output_json(data, code, headers=None):
+    """
+    Flask response with a JSON encoded body, like flask-restx's own
+    representation (indented in debug mode, ending with a new line)
+    """
+    response = make_response(dumps(data, indent=current_app.debug) + b"\n", code)
+    response.headers.extend(headers or {})
+    return response
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Starlette JSONResponse encoding with dumps()"""
+
+    def render(self, content):
+        return dumps(content)
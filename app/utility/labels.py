@@ -0,0 +1,214 @@
+"""
+Normalization of free-text labels into their enum values
+
+LABEL_MAPPINGS holds the known spellings of every label (formerly hand-fed to
+db_utils/generate_query.py). Incoming values go through normalize_label at
+ingest, and normalize_stored_labels fixes rows written before that, with one
+UPDATE ... FROM (VALUES ...) per column and primary key range.
+"""
+
+import time
+from functools import lru_cache
+
+from app.brand.models import Brand, FixedEntityTypeEnum
+from app.extensions import db
+from app.logger import app_logger
+from app.sentiment.models import (
+    LicensabilityEnum,
+    Sentiment,
+    SentimentEnum,
+    UrlSourceEnum,
+)
+
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_THROTTLE_SECONDS = 0.05
+OTHER_LABEL = "other"
+
+LABEL_ENUMS = {
+    "licensability": LicensabilityEnum,
+    "sentiment": SentimentEnum,
+    "link_source": UrlSourceEnum,
+    "entity_type": FixedEntityTypeEnum,
+}
+
+# {label: {known spelling: enum value}}, matched ignoring case and extra spaces
+LABEL_MAPPINGS = {
+    "licensability": {
+        "Unlikely": "unlikely",
+        "Very Unlikely": "veryunlikely",
+        "Probably Likely": "likely",
+        "Ununlikely": "likely",
+        "Likelihood": "likely",
+        "Likely": "likely",
+        "Very Likely": "verylikely",
+    },
+    "sentiment": {
+        "Negative": "negative",
+        "strong negative": "negative",
+        "mixed": "neutral",
+        "Mixed": "neutral",
+        "Neutral": "neutral",
+        "neutr---": "neutral",
+        "Positive": "positive",
+    },
+    "link_source": {
+        "Parsed": "parsed",
+        "HTML Extract": "parsed",
+        "Generated by Context": "generated",
+        "generated": "generated",
+        "Generated": "generated",
+        "Adweek": "other",
+        "Derived": "other",
+        "Not applicable": "other",
+        "https://www.facebook.com/TheBennetGang/": "other",
+        "Not Applicable": "other",
+        "https://www.instagram.com/carol_starr/ ": "other",
+        "NaN": "notfound",
+        "Website Not Found": "notfound",
+    },
+    "entity_type": {
+        "Person": "person",
+        "Company": "company",
+        "Event": "event",
+        "Government": "government",
+        "Educational": "educational",
+        "NGO": "ngo",
+    },
+}
+
+# (label, table, primary key, source column, target column) of stored labels
+STORED_LABEL_COLUMNS = [
+    (
+        "licensability",
+        Sentiment.__table__,
+        "sentiment_id",
+        "licensability",
+        "licensability",
+    ),
+    ("sentiment", Sentiment.__table__, "sentiment_id", "sentiment", "sentiment"),
+    ("link_source", Sentiment.__table__, "sentiment_id", "link_source", "link_source"),
+    ("entity_type", Brand.__table__, "brand_id", "entity_type", "fixed_entity_type"),
+]
+
+
+def _label_key(value):
+    return " ".join(str(value).split()).lower()
+
+
+def label_lookup(label):
+    """
+    {normalized spelling: enum value} of a label, including the enum values themselves
+    """
+    lookup = {_label_key(member.value): member.value for member in LABEL_ENUMS[label]}
+    lookup.update(
+        {
+            _label_key(spelling): value
+            for spelling, value in LABEL_MAPPINGS[label].items()
+        }
+    )
+    return lookup
+
+
+_LOOKUPS = {label: label_lookup(label) for label in LABEL_ENUMS}
+
+
+def normalize_label(label, value):
+    """
+    Enum member for an incoming label value
+    Known spellings map to their value, anything else becomes "other".
+    Empty values stay None, values other than strings raise a ValueError.
+    """
+    if value is None:
+        return None
+    if isinstance(value, LABEL_ENUMS[label]):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"{label} should be a string.")
+    return _normalize_label(label, value)
+
+
+@lru_cache(maxsize=4096)
+def _normalize_label(label, value):
+    key = _label_key(value)
+    if not key:
+        return None
+    return LABEL_ENUMS[label](_LOOKUPS[label].get(key, OTHER_LABEL))
+
+
+def normalize_stored_labels(
+    labels=None, chunk_size=DEFAULT_CHUNK_SIZE, throttle=DEFAULT_THROTTLE_SECONDS
+):
+    """
+    Rewrite stored labels to their normalized enum value
+    Every column is walked by primary key range with a single
+    UPDATE ... FROM (VALUES <mapping>) per range, committed and followed by a
+    pause of `throttle` seconds so the job doesn't starve regular traffic.
+    Unknown non-empty values become "other", like at ingest.
+    Args:
+        labels (list): Labels to fix, all of STORED_LABEL_COLUMNS when None
+        chunk_size (int): Primary key range updated per statement
+        throttle (float): Seconds to sleep between chunks
+    returns: {"<table>.<column>": rows updated}
+    """
+    selected = list(LABEL_ENUMS) if not labels else list(labels)
+    unknown = [label for label in selected if label not in LABEL_ENUMS]
+    if unknown:
+        raise ValueError(f"Unknown labels: {', '.join(unknown)}")
+
+    updated = {}
+    for label, table, key, source, target in STORED_LABEL_COLUMNS:
+        if label not in selected:
+            continue
+        updated[f"{table.name}.{target}"] = _normalize_column(
+            label, table, key, source, target, chunk_size, throttle
+        )
+    return updated
+
+
+def _normalize_column(label, table, key, source, target, chunk_size, throttle):
+    connection = db.session.connection()
+    dialect = connection.dialect
+    quote = dialect.identifier_preparer.quote
+    table_name = dialect.identifier_preparer.format_table(table)
+    target_type = table.c[target].type.compile(dialect=dialect)
+    # bumped like any other change, ETags of the rows depend on it
+    touch = ", last_updated_at = now()" if "last_updated_at" in table.c else ""
+
+    first_key, last_key = db.session.execute(
+        db.select(db.func.min(table.c[key]), db.func.max(table.c[key]))
+    ).one()
+    if first_key is None:
+        return 0
+
+    with connection.connection.cursor() as cursor:
+        mapping = b",".join(
+            cursor.mogrify("(%s, %s)", item) for item in _LOOKUPS[label].items()
+        ).decode("utf-8")
+
+    # unmatched values fall back to 'other' through the LEFT JOIN
+    statement = (
+        f"UPDATE {table_name} AS t "
+        f"SET {quote(target)} = CAST(n.value AS {target_type}){touch} "
+        f"FROM ("
+        f"SELECT s.{quote(key)} AS key, COALESCE(v.value, '{OTHER_LABEL}') AS value "
+        f"FROM {table_name} AS s "
+        f"LEFT JOIN (VALUES {mapping.replace('%', '%%')}) AS v (spelling, value) "
+        f"ON v.spelling = lower(regexp_replace(btrim(s.{quote(source)}::text), '\\s+', ' ', 'g')) "
+        f"WHERE s.{quote(key)} >= %(start)s AND s.{quote(key)} < %(end)s "
+        f"AND NULLIF(btrim(s.{quote(source)}::text), '') IS NOT NULL"
+        f") AS n "
+        f"WHERE t.{quote(key)} = n.key "
+        f"AND t.{quote(target)} IS DISTINCT FROM CAST(n.value AS {target_type})"
+    )
+
+    updated = 0
+    for start in range(first_key, last_key + 1, chunk_size):
+        with db.session.connection().connection.cursor() as cursor:
+            cursor.execute(statement, {"start": start, "end": start + chunk_size})
+            updated += cursor.rowcount
+        db.session.commit()
+        if throttle:
+            time.sleep(throttle)
+
+    app_logger.info(f"Normalized {table.name}.{target}: {updated} rows updated")
+    return updated
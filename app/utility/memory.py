@@ -0,0 +1,289 @@
+"""
+Heap allocation tracing with tracemalloc
+
+start()/stop() toggle tracemalloc in the current process; while it runs,
+snapshots can be taken and compared to find what keeps growing, and the
+requests carrying many rows (bulk POSTs, pages with a page_size) record their
+peak traced memory per endpoint, next to their row count, to size page_size
+and bulk limits from data. Peaks are process wide: requests running
+concurrently in other threads add to each other's peaks.
+
+Served on /internal/memory (app/main/routes.py), and driven from a shell by
+`flask memory ...` (app/__init__.py), which calls those routes. Tracing state
+is per process: with several workers behind the server, consecutive calls can
+land on different ones. Every response names the pid of the worker answering,
+and a call with a `pid` parameter is answered 409 by any other worker, the CLI
+calling again until the one traced answers (see for_worker and call_server).
+"""
+
+import functools
+import json
+import os
+import threading
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+from flask import g, request
+
+from app.utility import metrics
+from app.utility.access import is_allowed_ip
+
+DEFAULT_FRAMES = 10
+DEFAULT_LIMIT = 20
+MAX_SNAPSHOTS = 10
+# calls made by call_server to reach the worker asked for, a new connection each
+MAX_WORKER_ATTEMPTS = 50
+KEY_TYPES = ("lineno", "filename", "traceback")
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_lock = threading.Lock()
+_snapshots = OrderedDict()
+_snapshot_count = 0
+_request_peaks = {}
+
+
+def start(frames=DEFAULT_FRAMES):
+    """Start tracing allocations, keeping `frames` frames of each traceback"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    return status()
+
+
+def stop():
+    """Stop tracing and drop the snapshots and request peaks"""
+    global _snapshot_count  # pylint: disable=global-statement
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+        _snapshot_count = 0
+        _request_peaks.clear()
+    return status()
+
+
+def status():
+    """Tracing state, traced memory, snapshots and request peaks per endpoint"""
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    with _lock:
+        snapshots = list(_snapshots)
+        request_peaks = {
+            endpoint: dict(peaks) for endpoint, peaks in sorted(_request_peaks.items())
+        }
+    return {
+        "pid": os.getpid(),
+        "tracing": tracing,
+        "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        "snapshots": snapshots,
+        "request_peaks": request_peaks,
+    }
+
+
+def _require_tracing():
+    if not tracemalloc.is_tracing():
+        raise ValueError("tracemalloc is not tracing, start it first.")
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+def take_snapshot():
+    """
+    Keep a snapshot of the traced allocations (the MAX_SNAPSHOTS latest are kept)
+    Raises ValueError when not tracing
+    returns: name of the snapshot
+    """
+    global _snapshot_count  # pylint: disable=global-statement
+    _require_tracing()
+    snapshot = _snapshot()
+    with _lock:
+        _snapshot_count += 1
+        name = f"snapshot-{_snapshot_count}"
+        _snapshots[name] = snapshot
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return name
+
+
+def _get_snapshot(name):
+    if name is None:
+        return _snapshot()
+    with _lock:
+        snapshot = _snapshots.get(name)
+    if snapshot is None:
+        raise ValueError(f"Unknown snapshot: {name}")
+    return snapshot
+
+
+def _check_key_type(key_type):
+    if key_type not in KEY_TYPES:
+        raise ValueError(f"key_type should be one of {', '.join(KEY_TYPES)}")
+
+
+def _frames(traceback):
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+
+
+def top(limit=DEFAULT_LIMIT, key_type="lineno", snapshot=None):
+    """
+    Largest allocation sites of a snapshot (of the current heap when None)
+    Raises ValueError when not tracing or for an unknown snapshot or key_type
+    """
+    _require_tracing()
+    _check_key_type(key_type)
+    stats = _get_snapshot(snapshot).statistics(key_type)
+    return [
+        {"site": _frames(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+        for stat in stats[:limit]
+    ]
+
+
+def diff(from_snapshot, to_snapshot=None, limit=DEFAULT_LIMIT, key_type="lineno"):
+    """
+    Allocation sites that grew (or shrank) the most between two snapshots, the
+    second one being the current heap when None
+    Raises ValueError when not tracing or for an unknown snapshot or key_type
+    """
+    _require_tracing()
+    _check_key_type(key_type)
+    stats = _get_snapshot(to_snapshot).compare_to(
+        _get_snapshot(from_snapshot), key_type
+    )
+    return [
+        {
+            "site": _frames(stat.traceback),
+            "size_bytes": stat.size,
+            "size_diff_bytes": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        }
+        for stat in stats[:limit]
+    ]
+
+
+def carries_rows():
+    """Whether the request is a bulk one or a page with a page_size"""
+    return request.path.endswith("/bulk") or "page_size" in request.args
+
+
+def request_rows():
+    """
+    Rows carried by a bulk request (items of its JSON list body, once parsed)
+    or asked for by a page (page_size), None when unknown
+    """
+    if request.path.endswith("/bulk"):
+        data = request.get_json(silent=True)
+        return len(data) if isinstance(data, list) else None
+    if "page_size" in request.args:
+        return request.args.get("page_size", type=int)
+    return None
+
+
+def record_request_peak(endpoint, peak_bytes, rows):
+    """Add the peak traced memory of one request to its endpoint's figures"""
+    with _lock:
+        peaks = _request_peaks.setdefault(
+            endpoint,
+            {"requests": 0, "peak_bytes_max": 0, "peak_bytes_last": 0, "rows_max": 0},
+        )
+        peaks["requests"] += 1
+        peaks["peak_bytes_last"] = peak_bytes
+        peaks["peak_bytes_max"] = max(peaks["peak_bytes_max"], peak_bytes)
+        if rows:
+            peaks["rows_max"] = max(peaks["rows_max"], rows)
+            peaks["bytes_per_row_max"] = max(
+                peaks.get("bytes_per_row_max", 0), peak_bytes // rows
+            )
+    metrics.set_gauge("request_peak_memory_bytes", peak_bytes, endpoint=endpoint)
+
+
+def for_worker(view):
+    """
+    Route decorator answering 409 to the requests whose `pid` parameter names
+    another process than the one they reached
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        pid = request.args.get("pid", type=int)
+        if pid is not None and pid != os.getpid():
+            return {
+                "message": f"Reached worker {os.getpid()}, not {pid}.",
+                "pid": os.getpid(),
+            }, 409
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def call_server(url, method, path, pid=None, **params):
+    """
+    Call the /internal/memory route `path` of the server at `url`, for the CLI
+    With a `pid`, the call is made again (up to MAX_WORKER_ATTEMPTS times)
+    until that worker answers it.
+    Raises ValueError with the server's message on errors
+    returns: decoded JSON response
+    """
+    query = urllib.parse.urlencode(
+        {
+            name: value
+            for name, value in dict(params, pid=pid).items()
+            if value is not None
+        }
+    )
+    target = f"{url.rstrip('/')}/internal/memory{path}" + (f"?{query}" if query else "")
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            with urllib.request.urlopen(
+                urllib.request.Request(target, method=method), timeout=60
+            ) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 409 and attempts < MAX_WORKER_ATTEMPTS:
+                e.close()
+                continue
+            try:
+                message = json.load(e).get("message", e.reason)
+            except ValueError:
+                message = e.reason
+            raise ValueError(f"{e.code}: {message}") from e
+        except urllib.error.URLError as e:
+            raise ValueError(f"Can't reach {url}: {e.reason}") from e
+
+
+def init_app(app):
+    """
+    Record the peak memory of the requests of `app` carrying many rows while
+    tracing, and start tracing right away with TRACEMALLOC_START
+    """
+    if app.config.get("TRACEMALLOC_START"):
+        start(app.config.get("TRACEMALLOC_FRAMES", DEFAULT_FRAMES))
+
+    @app.before_request
+    def start_request_peak():
+        if tracemalloc.is_tracing() and carries_rows():
+            tracemalloc.reset_peak()
+            g.memory_started_bytes = tracemalloc.get_traced_memory()[0]
+
+    @app.after_request
+    def record_peak(response):
+        started_bytes = g.pop("memory_started_bytes", None)
+        if started_bytes is not None and tracemalloc.is_tracing():
+            peak_bytes = tracemalloc.get_traced_memory()[1] - started_bytes
+            record_request_peak(request.endpoint, peak_bytes, request_rows())
+            if is_allowed_ip(request.remote_addr):
+                response.headers["X-Peak-Memory-Bytes"] = str(peak_bytes)
+        return response
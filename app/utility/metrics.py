@@ -0,0 +1,52 @@
+"""
+In-process counters and gauges
+
+Jobs and request hooks record what they did here, keyed by a metric name and
+optional labels; snapshot() is served by the internal /internal/metrics route.
+Every metric is exported on /metrics as well (app/utility/prometheus.py).
+"""
+
+import threading
+
+from app.utility import prometheus
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """Add `value` to a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    prometheus.increment_counter(name, value, labels)
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to its current value"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+    prometheus.set_gauge(name, value, labels)
+
+
+def snapshot():
+    """
+    Current value of every metric
+    returns: {"counters": [{"name", "labels", "value"}], "gauges": [...]}
+    """
+    with _lock:
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+    return {
+        kind: [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(items)
+        ]
+        for kind, items in (("counters", counters), ("gauges", gauges))
+    }
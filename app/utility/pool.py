@@ -0,0 +1,186 @@
+"""
+Instrumented database connection pool
+
+InstrumentedQueuePool is the QueuePool configured by SQLALCHEMY_POOL_OPTIONS
+(pool size, overflow, timeout) for server databases, plus counters of what it
+did: checkouts and the time spent waiting for them, timeouts, new
+connections and invalidations. Checkouts waiting longer than
+SQLALCHEMY_POOL_WAIT_WARNING_SECONDS are logged, so requests queueing on the
+pool show up in the logs, and pool_stats() is served on /internal/pool.
+"""
+
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app.logger import app_logger
+from app.utility import prometheus
+
+DEFAULT_WAIT_WARNING_SECONDS = 0.1
+
+
+class PoolStats:
+    """
+    Counters of one pool, kept across pool re-creations (engine.dispose())
+    """
+
+    FIELDS = (
+        "checkouts",
+        "checkins",
+        "timeouts",
+        "slow_checkouts",
+        "connects",
+        "invalidations",
+        "soft_invalidations",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def increment(self, field):
+        """Add one to a counter"""
+        with self._lock:
+            self.counts[field] += 1
+
+    def record_wait(self, seconds, slow):
+        """Record the wait of one checkout"""
+        with self._lock:
+            self.counts["checkouts"] += 1
+            if slow:
+                self.counts["slow_checkouts"] += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def to_dict(self):
+        """Counters and wait times"""
+        with self._lock:
+            checkouts = self.counts["checkouts"]
+            return {
+                **self.counts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": (
+                    round(self.wait_seconds_total / checkouts, 6) if checkouts else 0.0
+                ),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool timing every checkout
+    """
+
+    wait_warning_seconds = DEFAULT_WAIT_WARNING_SECONDS
+    # checkout timeout, engine options only pass whole seconds (see init_app)
+    timeout_seconds = None
+
+    def __init__(self, *args, **kwargs):
+        recreated = "_dispatch" in kwargs
+        if self.timeout_seconds is not None and not recreated:
+            kwargs["timeout"] = self.timeout_seconds
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        if recreated:
+            # recreate() hands over the listeners, and the stats with them
+            return
+        stats = self.stats
+        event.listen(self, "connect", lambda *_: stats.increment("connects"))
+        event.listen(
+            self, "soft_invalidate", lambda *_: stats.increment("soft_invalidations")
+        )
+
+        def count_invalidation(dbapi_connection, connection_record, exception):
+            stats.increment("invalidations")
+            app_logger.warning(f"DB pool connection invalidated: {exception!r}")
+
+        event.listen(self, "invalidate", count_invalidation)
+
+        def count_checkin(*_):
+            stats.increment("checkins")
+            prometheus.POOL_CHECKED_OUT.dec()
+
+        event.listen(self, "checkin", count_checkin)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self):
+        # waiting on a full pool, connecting and pre-pinging all count as wait
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.increment("timeouts")
+            prometheus.POOL_TIMEOUTS.inc()
+            app_logger.error(
+                f"DB pool checkout timed out after {time.perf_counter() - started:.3f}s "
+                f"({self.status()})"
+            )
+            raise
+        waited = time.perf_counter() - started
+        slow = waited >= self.wait_warning_seconds
+        self.stats.record_wait(waited, slow)
+        prometheus.POOL_CHECKOUT_SECONDS.observe(waited)
+        prometheus.POOL_CHECKED_OUT.inc()
+        if slow:
+            app_logger.warning(
+                f"DB pool checkout waited {waited:.3f}s ({self.status()})"
+            )
+        return connection
+
+    def to_dict(self):
+        """Live pool state and counters"""
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "timeout": self.timeout(),
+            **self.stats.to_dict(),
+        }
+
+
+def init_app(app):
+    """
+    Use InstrumentedQueuePool for the app's server database, before db.init_app(app)
+    SQLite (in-memory databases need their StaticPool) keeps its default pool.
+    pool_timeout is set on the pool class: Flask-SQLAlchemy builds engines with
+    engine_from_config, which would truncate it to an int.
+    """
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI")
+    if not uri or make_url(uri).get_backend_name() == "sqlite":
+        return
+
+    pool_options = dict(app.config.get("SQLALCHEMY_POOL_OPTIONS", {}))
+    InstrumentedQueuePool.timeout_seconds = pool_options.pop("pool_timeout", None)
+    InstrumentedQueuePool.wait_warning_seconds = app.config.get(
+        "SQLALCHEMY_POOL_WAIT_WARNING_SECONDS", DEFAULT_WAIT_WARNING_SECONDS
+    )
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "poolclass": InstrumentedQueuePool,
+        **pool_options,
+        **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+    }
+
+
+def pool_stats(engines):
+    """
+    State of the pools of {bind key: engine}, the default bind being "default"
+    """
+    return {
+        key or "default": (
+            engine.pool.to_dict()
+            if isinstance(engine.pool, InstrumentedQueuePool)
+            else {"status": engine.pool.status()}
+        )
+        for key, engine in engines.items()
+    }
@@ -0,0 +1,379 @@
+"""
+Profiles of live requests, on demand or in the background
+
+On demand: an allowlisted client (app.utility.access) adds a header to get the
+profile of that single request instead of its response body, the status and
+duration of the request going into X-Profiled-* headers:
+
+    X-Profile: sampling          stacks sampled every X-Profile-Interval-Ms
+                                 (default PROFILE_INTERVAL_MS), returned as
+                                 X-Profile-Format: speedscope (default) JSON
+                                 or collapsed stacks ("a;b;c count" lines)
+    X-Profile: cprofile          deterministic cProfile of the request, as a
+                                 pstats dump (python -m pstats, snakeviz)
+
+In the background (PROFILE_BACKGROUND): one sampler thread per process
+samples the stacks of every in-flight request every
+PROFILE_BACKGROUND_INTERVAL_MS, and the collapsed stacks of the
+PROFILE_SLOWEST_PER_MINUTE slowest requests of each minute are written to
+PROFILE_DIR/<minute>/ by that thread, never by a request thread.
+"""
+
+import cProfile
+import heapq
+import json
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import g, request
+
+from app.logger import app_logger
+from app.utility.access import is_allowed_ip
+
+DEFAULT_INTERVAL_MS = 1.0
+DEFAULT_BACKGROUND_INTERVAL_MS = 10.0
+DEFAULT_SLOWEST_PER_MINUTE = 5
+FORMATS = ("speedscope", "collapsed")
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def frame_stack(frame):
+    """(name, file, line) of the functions of a stack, outermost first"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class StackSamples:
+    """
+    Stacks sampled from one thread and how often each was seen
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def add(self, frame):
+        """Count the current stack of `frame`"""
+        self.stacks[frame_stack(frame)] += 1
+
+    def collapsed(self):
+        """Collapsed stacks, one "outer;inner count" line per stack"""
+        return "".join(
+            ";".join(
+                f"{name} ({os.path.basename(file)}:{line})"
+                for name, file, line in stack
+            )
+            + f" {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def speedscope(self, name):
+        """Speedscope file of the samples, in milliseconds"""
+        frames = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval * 1000)
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "companydb",
+            "shared": {
+                "frames": [
+                    {"name": frame_name, "file": file, "line": line}
+                    for frame_name, file, line in frames
+                ]
+            },
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+class Sampler:
+    """
+    Thread sampling the stacks of the watched threads every `interval` seconds
+    `on_tick` is called by the sampler thread after each round.
+    """
+
+    def __init__(self, interval, on_tick=None):
+        self.interval = interval
+        self.on_tick = on_tick
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the sampler thread"""
+        self._thread = threading.Thread(
+            target=self._run, name="profiling-sampler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the sampler thread and wait for it"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def watch(self, thread_id):
+        """Start sampling a thread, returns its StackSamples"""
+        samples = StackSamples(self.interval)
+        with self._lock:
+            self._watched[thread_id] = samples
+        return samples
+
+    def unwatch(self, thread_id):
+        """Stop sampling a thread"""
+        with self._lock:
+            self._watched.pop(thread_id, None)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                watched = list(self._watched.items())
+            if watched:
+                frames = sys._current_frames()  # pylint: disable=protected-access
+                for thread_id, samples in watched:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples.add(frame)
+            if self.on_tick is not None:
+                self.on_tick()
+
+
+class SlowestRequests:
+    """
+    The `limit` slowest requests of each minute, written to
+    `directory`/<minute>/ by flush() once the minute is over
+    """
+
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._minutes = {}
+        self._sequence = 0
+
+    @staticmethod
+    def current_minute():
+        """UTC minute, as used in the directory names"""
+        return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M")
+
+    def offer(self, seconds, label, samples):
+        """Keep the samples of a finished request if it's among the slowest"""
+        minute = self.current_minute()
+        with self._lock:
+            self._sequence += 1
+            entry = (seconds, self._sequence, label, samples)
+            slowest = self._minutes.setdefault(minute, [])
+            if len(slowest) < self.limit:
+                heapq.heappush(slowest, entry)
+            elif seconds > slowest[0][0]:
+                heapq.heapreplace(slowest, entry)
+
+    def flush(self, force=False):
+        """
+        Write the requests of the finished minutes (and of the current one if
+        `force`)
+        returns: paths written
+        """
+        current = self.current_minute()
+        with self._lock:
+            finished = {
+                minute: slowest
+                for minute, slowest in self._minutes.items()
+                if force or minute != current
+            }
+            for minute in finished:
+                del self._minutes[minute]
+        return [
+            path
+            for minute, slowest in sorted(finished.items())
+            for path in self.write(minute, slowest)
+        ]
+
+    def write(self, minute, slowest):
+        """Write the collapsed stacks of `slowest` requests to `directory`/`minute`/"""
+        directory = os.path.join(self.directory, minute)
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for seconds, sequence, label, samples in sorted(slowest, reverse=True):
+            name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")[:100]
+            path = os.path.join(
+                directory, f"{seconds * 1000:09.1f}ms-{sequence}-{name}.collapsed.txt"
+            )
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(samples.collapsed())
+            paths.append(path)
+        return paths
+
+
+class BackgroundProfiler:
+    """
+    Sampler of every request plus the slowest requests of each minute
+    The sampler thread is started on first use in each (forked) process, and
+    writes the finished minutes.
+    """
+
+    def __init__(self, directory, limit, interval):
+        self.slowest = SlowestRequests(directory, limit)
+        self.interval = interval
+        self._sampler = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def sampler(self):
+        """This process's Sampler, started on first use"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._sampler = Sampler(self.interval, on_tick=self._flush).start()
+                    self._pid = os.getpid()
+        return self._sampler
+
+    def finish(self, thread_id, seconds, label, samples):
+        """A request is done, offer its samples"""
+        self._sampler.unwatch(thread_id)
+        self.slowest.offer(seconds, label, samples)
+
+    def _flush(self):
+        try:
+            self.slowest.flush()
+        except OSError as e:
+            app_logger.error(f"Error writing request profiles: {str(e)}")
+
+
+def cprofile_dump(profiler):
+    """pstats dump (marshal) of a cProfile.Profile, what Profile.dump_stats writes"""
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+def _profile_response(app, kind, started, response, profile):
+    duration = time.perf_counter() - started
+    label = f"{request.method} {request.path}"
+    if kind == "cprofile":
+        body = cprofile_dump(profile)
+        mimetype, extension = "application/octet-stream", "prof"
+    elif request.headers.get("X-Profile-Format", "speedscope") == "collapsed":
+        body = profile.collapsed()
+        mimetype, extension = "text/plain", "collapsed.txt"
+    else:
+        body = json.dumps(profile.speedscope(label))
+        mimetype, extension = "application/json", "speedscope.json"
+    profiled = app.response_class(body, mimetype=mimetype)
+    profiled.headers["Content-Disposition"] = (
+        f"attachment; filename=profile.{extension}"
+    )
+    profiled.headers["X-Profiled-Status"] = str(response.status_code)
+    profiled.headers["X-Profiled-Duration-Ms"] = f"{duration * 1000:.1f}"
+    return profiled
+
+
+def init_app(app):
+    """
+    Profile requests of `app` on demand (PROFILE_ON_DEMAND, default true) and,
+    with PROFILE_BACKGROUND, keep the profiles of the slowest ones
+    """
+    on_demand = app.config.get("PROFILE_ON_DEMAND", True)
+    default_interval = app.config.get("PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS) / 1000
+    background = None
+    if app.config.get("PROFILE_BACKGROUND"):
+        background = BackgroundProfiler(
+            app.config.get("PROFILE_DIR", "./logs/profiles"),
+            app.config.get("PROFILE_SLOWEST_PER_MINUTE", DEFAULT_SLOWEST_PER_MINUTE),
+            app.config.get(
+                "PROFILE_BACKGROUND_INTERVAL_MS", DEFAULT_BACKGROUND_INTERVAL_MS
+            )
+            / 1000,
+        )
+
+    @app.before_request
+    def start_profile():
+        g.profile_started = time.perf_counter()
+        kind = request.headers.get("X-Profile") if on_demand else None
+        if kind and is_allowed_ip(request.remote_addr):
+            if kind not in ("sampling", "cprofile"):
+                return {"message": "X-Profile should be sampling or cprofile."}, 400
+            if request.headers.get("X-Profile-Format", "speedscope") not in FORMATS:
+                return {
+                    "message": f"X-Profile-Format should be one of {', '.join(FORMATS)}."
+                }, 400
+            if kind == "cprofile":
+                profile = cProfile.Profile()
+                profile.enable()
+                g.profile = (kind, profile, None)
+            else:
+                try:
+                    interval = (
+                        float(request.headers.get("X-Profile-Interval-Ms", 0)) / 1000
+                    )
+                except ValueError:
+                    return {"message": "X-Profile-Interval-Ms should be a number."}, 400
+                sampler = Sampler(
+                    max(interval, 0.0001) if interval else default_interval
+                )
+                g.profile = (
+                    kind,
+                    sampler.watch(threading.get_ident()),
+                    sampler.start(),
+                )
+        elif background is not None:
+            g.background_samples = background.sampler().watch(threading.get_ident())
+
+    @app.after_request
+    def finish_profile(response):
+        started = g.get("profile_started")
+        profile = g.pop("profile", None)
+        if profile is not None:
+            kind, samples, sampler = profile
+            if kind == "cprofile":
+                samples.disable()
+            else:
+                sampler.stop()
+            return _profile_response(app, kind, started, response, samples)
+        samples = g.pop("background_samples", None)
+        if samples is not None:
+            background.finish(
+                threading.get_ident(),
+                time.perf_counter() - started,
+                f"{request.method} {request.path}",
+                samples,
+            )
+        return response
+
+    @app.teardown_request
+    def stop_profile(_exception):
+        # requests whose after_request functions didn't run
+        profile = g.pop("profile", None)
+        if profile is not None:
+            kind, samples, sampler = profile
+            if kind == "cprofile":
+                samples.disable()
+            else:
+                sampler.stop()
+        if g.pop("background_samples", None) is not None:
+            background.sampler().unwatch(threading.get_ident())
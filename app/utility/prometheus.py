@@ -0,0 +1,224 @@
+"""
+Prometheus metrics of the API, served on /metrics
+
+Every request is counted and timed, labeled by flask-restx namespace,
+resource and method (blueprint and view for the other routes), along with the
+DB time and statement count of the request (app/utility/query_stats.py). The
+connection pool records its checkout waits and timeouts, and the counters and
+gauges of app/utility/metrics.py (bulk ingest rows, expiry sweeps, ...) are
+exported too.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py before the
+app is imported) makes every process write its values to mmap files in that
+directory, and /metrics adds up the files of all workers. Without it the
+values are those of the serving process. Recording a request is a few dict
+lookups and mmap writes.
+
+The requests the ASGI app answers itself (app/async_read) are recorded by
+AsgiMiddleware under the same names and labels, without the DB histograms.
+"""
+
+import os
+import threading
+import time
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.routing import Match
+from werkzeug.exceptions import HTTPException
+
+REQUEST_LABELS = ("namespace", "resource", "method")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+# routes that aren't matched (404, 405)
+UNMATCHED = "unmatched"
+
+REQUESTS = Counter("http_requests", "Requests served", [*REQUEST_LABELS, "status"])
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to build the response, streamed bodies excluded",
+    REQUEST_LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent executing SQL statements per request",
+    REQUEST_LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request",
+    REQUEST_LABELS,
+    buckets=QUERY_COUNT_BUCKETS,
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time waited for a pooled connection",
+    buckets=LATENCY_BUCKETS,
+)
+POOL_TIMEOUTS = Counter("db_pool_checkout_timeouts", "Pool checkouts that timed out")
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections checked out of the pools",
+    multiprocess_mode="livesum",
+)
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+_route_labels = {}
+
+
+def _metric(kind, name, labelnames):
+    key = (kind, name)
+    metric = _metrics.get(key)
+    if metric is None:
+        with _metrics_lock:
+            metric = _metrics.get(key)
+            if metric is None:
+                if kind == "gauge":
+                    metric = Gauge(
+                        name, name, labelnames, multiprocess_mode="mostrecent"
+                    )
+                else:
+                    metric = Counter(name, name, labelnames)
+                _metrics[key] = metric
+    return metric
+
+
+def increment_counter(name, value, labels):
+    """Add to the counter `name` (created on first use, like metrics.increment)"""
+    metric = _metric("counter", name, tuple(sorted(labels)))
+    (metric.labels(**labels) if labels else metric).inc(value)
+
+
+def set_gauge(name, value, labels):
+    """Set the gauge `name` (created on first use, like metrics.set_gauge)"""
+    metric = _metric("gauge", name, tuple(sorted(labels)))
+    (metric.labels(**labels) if labels else metric).set(value)
+
+
+def route_labels(app, api, endpoint):
+    """(namespace, resource) of a Flask endpoint, cached"""
+    labels = _route_labels.get(endpoint)
+    if labels is not None:
+        return labels
+    view = app.view_functions.get(endpoint)
+    resource = getattr(view, "view_class", None)
+    if view is None:
+        labels = (UNMATCHED, UNMATCHED)
+    elif resource is not None:
+        namespaces = {
+            route.resource: namespace.name
+            for namespace in api.namespaces
+            for route in namespace.resources
+        }
+        labels = (
+            namespaces.get(resource, api.default_namespace.name),
+            resource.__name__,
+        )
+    else:
+        blueprint, _, name = endpoint.rpartition(".")
+        labels = (blueprint or "app", name)
+    _route_labels[endpoint] = labels
+    return labels
+
+
+def render():
+    """
+    Exposition of every metric
+    returns: (body, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app, api):
+    """Count and time every request of `app`"""
+    # pylint: disable=import-outside-toplevel
+    from app.utility.query_stats import current_stats
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("request_started")
+        if started is None:
+            return response
+        namespace, resource = route_labels(app, api, request.endpoint)
+        observe_request(
+            (namespace, resource, request.method),
+            response.status_code,
+            time.perf_counter() - started,
+            current_stats(),
+        )
+        return response
+
+
+def observe_request(labels, status, seconds, stats=None):
+    """
+    Count and time a request labeled (namespace, resource, method), with the
+    DB time and statement count of its QueryStats when there are some
+    """
+    REQUESTS.labels(*labels, status).inc()
+    REQUEST_SECONDS.labels(*labels).observe(seconds)
+    if stats is not None:
+        REQUEST_DB_SECONDS.labels(*labels).observe(stats.seconds)
+        REQUEST_DB_QUERIES.labels(*labels).observe(stats.count)
+
+
+class AsgiMiddleware:
+    """
+    Count and time the requests an ASGI app answers itself among `routes`
+    (the async reads), under the labels of the Flask resource at the same
+    path; the requests it passes on to `flask_app` are recorded by init_app
+    """
+
+    def __init__(self, app, flask_app, api, routes):
+        self.app = app
+        self.flask_app = flask_app
+        self.api = api
+        self.routes = routes
+
+    def _labels(self, scope):
+        adapter = self.flask_app.url_map.bind("localhost")
+        try:
+            endpoint, _ = adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            endpoint = None
+        namespace, resource = route_labels(self.flask_app, self.api, endpoint)
+        return namespace, resource, scope["method"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+            route.matches(scope)[0] == Match.FULL for route in self.routes
+        ):
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def record_response(message):
+            if message["type"] == "http.response.start":
+                observe_request(
+                    self._labels(scope),
+                    message["status"],
+                    time.perf_counter() - started,
+                )
+            await send(message)
+
+        await self.app(scope, receive, record_response)
@@ -0,0 +1,204 @@
+"""
+Per-request SQL statement counts, N+1 detection and slow statement log
+
+Every statement run through a SQLAlchemy engine is timed by cursor execute
+listeners and recorded in the QueryStats of the current request (see
+init_app) and in the collectors opened by collect() or, in tests,
+query_budget(). At the end of a request:
+- statements run SQL_N_PLUS_ONE_THRESHOLD times or more with the same shape
+  (the SQL text with IN lists collapsed) are logged as a likely N+1,
+- the clients of SQL_STATS_HEADER_IPS (none by default) get X-SQL-Queries,
+  X-SQL-Time-Ms and X-SQL-N-Plus-One response headers.
+Statements slower than SQL_SLOW_QUERY_SECONDS are logged with the shape of
+their parameters (names and types, never values), in requests or not.
+"""
+
+import contextlib
+import contextvars
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.logger import app_logger
+from app.utility import metrics
+
+DEFAULT_SLOW_QUERY_SECONDS = 0.5
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+# statement text kept in logs and reports
+MAX_STATEMENT_LENGTH = 500
+
+_active = contextvars.ContextVar("query_stats", default=())
+_IN_LIST = re.compile(r"\((?:\s*%\(\w+\)s\s*,)*\s*%\(\w+\)s\s*\)")
+_listen_lock = threading.Lock()
+
+slow_query_seconds = DEFAULT_SLOW_QUERY_SECONDS
+# clients sent the X-SQL-* headers
+header_ips = frozenset()
+
+
+def statement_shape(statement):
+    """Statement text with whitespace and IN (...) parameter lists collapsed"""
+    return _IN_LIST.sub("(...)", " ".join(statement.split()))
+
+
+def parameters_shape(parameters, executemany=False):
+    """Names and types of bound parameters, without their values"""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {parameters_shape(rows[0]) if rows else '{}'}"
+    if isinstance(parameters, dict):
+        return (
+            "{"
+            + ", ".join(
+                f"{name}: {type(value).__name__}" for name, value in parameters.items()
+            )
+            + "}"
+        )
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+class QueryStats:
+    """
+    Statements run while this collector was active
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        """Count one statement and its duration"""
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        """[(shape, count)] of statements run at least `threshold` times"""
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+@contextlib.contextmanager
+def collect():
+    """Record the statements run in this context into a new QueryStats"""
+    stats = QueryStats()
+    token = _active.set((*_active.get(), stats))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More statements ran than the budget of a query_budget() block allows"""
+
+
+@contextlib.contextmanager
+def query_budget(max_queries):
+    """
+    Fail (QueryBudgetExceeded) when the block runs more than `max_queries`
+    statements, e.g. around a test client call to pin an endpoint's budget:
+
+    with query_budget(2):
+        client.get("/brand/1")
+    """
+    with collect() as stats:
+        yield stats
+    if stats.count > max_queries:
+        statements = "\n".join(
+            f"  {count} x {shape[:MAX_STATEMENT_LENGTH]}"
+            for shape, count in stats.shapes.most_common()
+        )
+        raise QueryBudgetExceeded(
+            f"{stats.count} statements ran, the budget is {max_queries}:\n{statements}"
+        )
+
+
+def current_stats():
+    """QueryStats of the current request, None outside requests"""
+    return g.get("query_stats") if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_stats_started"].pop()
+    for stats in _active.get():
+        stats.record(statement, seconds)
+    if has_request_context() and "query_stats" in g:
+        g.query_stats.record(statement, seconds)
+    if seconds >= slow_query_seconds:
+        metrics.increment("sql_slow_queries_total")
+        app_logger.warning(
+            f"Slow SQL statement ({seconds:.3f}s): "
+            f"{statement_shape(statement)[:MAX_STATEMENT_LENGTH]} "
+            f"parameters: {parameters_shape(parameters, executemany)}"
+        )
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute isn't called for failed statements
+    started = exception_context.connection and exception_context.connection.info.get(
+        "query_stats_started"
+    )
+    if started:
+        started.pop()
+
+
+def listen():
+    """Time the statements of every engine (idempotent)"""
+    with _listen_lock:
+        if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def init_app(app):
+    """
+    Collect the statements of every request of `app`
+    SQL_STATS_HEADER_IPS lists the clients getting the X-SQL-* headers.
+    """
+    global slow_query_seconds, header_ips  # pylint: disable=global-statement
+    slow_query_seconds = app.config.get(
+        "SQL_SLOW_QUERY_SECONDS", DEFAULT_SLOW_QUERY_SECONDS
+    )
+    threshold = app.config.get("SQL_N_PLUS_ONE_THRESHOLD", DEFAULT_N_PLUS_ONE_THRESHOLD)
+    header_ips = frozenset(app.config.get("SQL_STATS_HEADER_IPS") or ())
+    listen()
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = current_stats()
+        if stats is None:
+            return response
+        repeated = stats.repeated(threshold)
+        for shape, count in repeated:
+            metrics.increment("sql_n_plus_one_total", endpoint=request.endpoint)
+            app_logger.warning(
+                f"Possible N+1 in {request.method} {request.path}: statement run "
+                f"{count} times: {shape[:MAX_STATEMENT_LENGTH]}"
+            )
+        if request.remote_addr in header_ips:
+            response.headers["X-SQL-Queries"] = str(stats.count)
+            response.headers["X-SQL-Time-Ms"] = f"{stats.seconds * 1000:.1f}"
+            response.headers["X-SQL-N-Plus-One"] = str(len(repeated))
+        return response
@@ -0,0 +1,338 @@
+"""
+Read replicas with read-your-writes stickiness and health-aware failover
+
+SQLALCHEMY_REPLICA_URIS adds one Flask-SQLAlchemy bind per replica
+(replica_0, replica_1, ...). The views decorated with @replica_read run their
+SELECTs on a replica chosen per request by the app's ReplicaRouter
+(app.extensions["replica_router"]); flushes and INSERT/UPDATE/DELETE
+statements always go to the primary (RoutingSession).
+
+Read-your-writes: every successful POST/PUT/PATCH/DELETE answers with a
+`db_read_after` cookie (echoed in an X-DB-Read-After header for clients
+without cookies, which send it back as that header) holding the time of the
+write and, on Postgres, the WAL position (LSN) of the primary after it. For
+REPLICA_STICKY_SECONDS after a write, the client's reads go to replicas
+whose replayed LSN is past it, or to the primary when none is (always the
+primary without an LSN).
+
+The async reads (app/async_read) use the same router and tokens, on async
+engines of their own for the replicas.
+
+Failover: a thread per process checks every replica every
+REPLICA_HEALTH_INTERVAL_SECONDS (replayed LSN and replication lag on
+Postgres, a SELECT 1 elsewhere). Replicas failing the check, lagging more than
+REPLICA_MAX_LAG_SECONDS or raising a connection error are left out until a
+check passes again, and reads go to the primary when no replica is left.
+"""
+
+import functools
+import math
+import os
+import random
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+
+from app.logger import app_logger
+from app.utility import metrics
+
+BIND_PREFIX = "replica_"
+COOKIE = "db_read_after"
+HEADER = "X-DB-Read-After"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+DEFAULT_STICKY_SECONDS = 5.0
+DEFAULT_MAX_LAG_SECONDS = 30.0
+DEFAULT_HEALTH_INTERVAL_SECONDS = 2.0
+POSTGRES_HEALTH = text(
+    "SELECT pg_is_in_recovery() AS in_recovery, "
+    "CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() "
+    "ELSE pg_current_wal_lsn() END AS lsn, "
+    "CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag"
+)
+
+
+def parse_lsn(lsn):
+    """Postgres LSN ("16/B374D848") as an int"""
+    high, _, low = lsn.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def format_lsn(value):
+    """int LSN as Postgres writes it"""
+    return f"{value >> 32:X}/{value & 0xFFFFFFFF:X}"
+
+
+def read_after_token(written_at, lsn=None):
+    """Token of a write, "<unix time>" or "<unix time>@<LSN>" """
+    token = f"{written_at:.3f}"
+    return f"{token}@{format_lsn(lsn)}" if lsn is not None else token
+
+
+def parse_read_after(token):
+    """
+    (written_at, lsn) of a token, lsn None when absent
+    Raises ValueError for malformed tokens
+    """
+    written_at, _, lsn = token.partition("@")
+    return float(written_at), parse_lsn(lsn) if lsn else None
+
+
+class ReplicaState:
+    """
+    Last health check of one replica
+    """
+
+    def __init__(self):
+        self.healthy = True
+        self.lsn = None
+        self.lag_seconds = None
+        self.checked_at = None
+        self.error = None
+
+    def to_dict(self):
+        """State as served on /internal/replicas"""
+        return {
+            "healthy": self.healthy,
+            "lsn": format_lsn(self.lsn) if self.lsn is not None else None,
+            "lag_seconds": self.lag_seconds,
+            "checked_at": self.checked_at,
+            "error": self.error,
+        }
+
+
+class ReplicaRouter:
+    """
+    Replica (bind key) of each read, None meaning the primary
+    The health check thread is started on first use in each (forked) process.
+    """
+
+    def __init__(
+        self,
+        engines,
+        sticky_seconds=DEFAULT_STICKY_SECONDS,
+        max_lag_seconds=DEFAULT_MAX_LAG_SECONDS,
+        interval=DEFAULT_HEALTH_INTERVAL_SECONDS,
+    ):
+        self.engines = engines
+        self.sticky_seconds = sticky_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.interval = interval
+        self.replicas = {key: ReplicaState() for key in engines}
+        self._lock = threading.Lock()
+        self._pid = None
+        for key, engine in engines.items():
+            self.watch(key, engine)
+
+    def watch(self, key, engine):
+        """Mark replica `key` unhealthy on the connection errors of `engine`"""
+        event.listen(engine, "handle_error", self._error_listener(key))
+
+    def _error_listener(self, key):
+        def mark_down(exception_context):
+            if exception_context.is_disconnect or isinstance(
+                exception_context.sqlalchemy_exception, exc.OperationalError
+            ):
+                self.mark_unhealthy(key, exception_context.original_exception)
+
+        return mark_down
+
+    def start(self):
+        """Start this process's health check thread, once"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self._run, name="replica-health", daemon=True
+            ).start()
+
+    def _run(self):
+        while True:
+            self.check_all()
+            time.sleep(self.interval)
+
+    def check_all(self):
+        """Check every replica"""
+        for key in self.engines:
+            self.check(key)
+
+    def check(self, key):
+        """Check one replica, updating its state"""
+        state = self.replicas[key]
+        engine = self.engines[key]
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == "postgresql":
+                    row = connection.execute(POSTGRES_HEALTH).one()
+                    lsn = parse_lsn(row.lsn) if row.lsn else None
+                    lag = float(row.lag or 0)
+                else:
+                    connection.execute(text("SELECT 1"))
+                    lsn, lag = None, 0.0
+        except exc.SQLAlchemyError as e:
+            self.mark_unhealthy(key, e)
+            return
+        healthy = lag <= self.max_lag_seconds
+        if state.healthy and not healthy:
+            app_logger.warning(f"Replica {key} lags {lag:.1f}s, reading elsewhere")
+        elif not state.healthy and healthy:
+            app_logger.info(f"Replica {key} is back")
+        state.lsn, state.lag_seconds = lsn, lag
+        state.error = None if healthy else f"lag {lag:.1f}s"
+        state.checked_at = time.time()
+        state.healthy = healthy
+
+    def mark_unhealthy(self, key, error):
+        """Leave a replica out until its next passing check"""
+        state = self.replicas[key]
+        if state.healthy:
+            app_logger.warning(f"Replica {key} is down, reading elsewhere: {error}")
+        state.healthy = False
+        state.error = str(error)
+        state.checked_at = time.time()
+
+    def choose(self, read_after=None):
+        """
+        Replica for a read by a client that last wrote at `read_after` (a
+        token, or None), None for the primary
+        returns: (bind key or None, reason)
+        """
+        required_lsn = None
+        if read_after:
+            try:
+                written_at, lsn = parse_read_after(read_after)
+            except ValueError:
+                written_at, lsn = 0.0, None
+            if time.time() - written_at < self.sticky_seconds:
+                if lsn is None:
+                    return None, "sticky"
+                required_lsn = lsn
+        candidates = [
+            key
+            for key, state in self.replicas.items()
+            if state.healthy
+            and (
+                required_lsn is None
+                or (state.lsn is not None and state.lsn >= required_lsn)
+            )
+        ]
+        if not candidates:
+            return None, "sticky" if required_lsn is not None else "no_replica"
+        return random.choice(candidates), "replica"
+
+    def to_dict(self):
+        """State of every replica"""
+        return {key: state.to_dict() for key, state in self.replicas.items()}
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session reading from the replica chosen for the request
+    (g.db_replica, see replica_read); writes go to the primary
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not getattr(clause, "is_dml", False)
+            and has_request_context()
+        ):
+            key = g.get("db_replica")
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_after(http_request):
+    """Read-after token of a (Flask or Starlette) request, None without"""
+    return http_request.headers.get(HEADER) or http_request.cookies.get(COOKIE)
+
+
+def replica_read(view):
+    """
+    Run a read-only view on a replica, when replicas are configured and the
+    client didn't write too recently (see ReplicaRouter.choose)
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        router = current_app.extensions.get("replica_router")
+        if router is not None:
+            router.start()
+            key, reason = router.choose(read_after(request))
+            # kept for the whole request, lazy loads while marshalling included
+            g.db_replica = key
+            metrics.increment("db_reads_total", bind=key or "primary", reason=reason)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def init_binds(app):
+    """Add the SQLALCHEMY_REPLICA_URIS binds, before db.init_app(app)"""
+    uris = app.config.get("SQLALCHEMY_REPLICA_URIS") or []
+    if uris:
+        app.config["SQLALCHEMY_BINDS"] = {
+            **(app.config.get("SQLALCHEMY_BINDS") or {}),
+            **{f"{BIND_PREFIX}{index}": uri for index, uri in enumerate(uris)},
+        }
+
+
+def _primary_lsn(db):
+    engine = db.engines[None]
+    if engine.dialect.name != "postgresql":
+        return None
+    with engine.connect() as connection:
+        return parse_lsn(
+            connection.execute(text("SELECT pg_current_wal_lsn()")).scalar()
+        )
+
+
+def init_app(app, db):
+    """
+    Route the @replica_read views of `app` to the replicas, after
+    db.init_app(app), and make the clients that wrote read their writes
+    """
+    with app.app_context():
+        engines = {
+            key: engine
+            for key, engine in db.engines.items()
+            if key and key.startswith(BIND_PREFIX)
+        }
+    if not engines:
+        return
+    sticky_seconds = app.config.get("REPLICA_STICKY_SECONDS", DEFAULT_STICKY_SECONDS)
+    app.extensions["replica_router"] = ReplicaRouter(
+        engines,
+        sticky_seconds=sticky_seconds,
+        max_lag_seconds=app.config.get(
+            "REPLICA_MAX_LAG_SECONDS", DEFAULT_MAX_LAG_SECONDS
+        ),
+        interval=app.config.get(
+            "REPLICA_HEALTH_INTERVAL_SECONDS", DEFAULT_HEALTH_INTERVAL_SECONDS
+        ),
+    )
+
+    @app.after_request
+    def remember_write(response):
+        if request.method not in WRITE_METHODS or response.status_code >= 400:
+            return response
+        try:
+            lsn = _primary_lsn(db)
+        except exc.SQLAlchemyError as e:
+            app_logger.error(f"Error reading the primary's WAL position: {str(e)}")
+            lsn = None
+        token = read_after_token(time.time(), lsn)
+        response.set_cookie(
+            COOKIE, token, max_age=math.ceil(sticky_seconds), httponly=True
+        )
+        response.headers[HEADER] = token
+        return response
@@ -0,0 +1,73 @@
+"""
+Set-based SQL helpers shared by batch maintenance jobs
+"""
+
+from psycopg2.extras import execute_values
+
+
+def bulk_update_from_values(
+    session, table, key, column_types, rows, touch_column="last_updated_at"
+):
+    """
+    Update many rows with a single UPDATE ... FROM (VALUES ...) statement.
+    Rows whose values are already identical are left untouched, so the
+    touch_column (if any) is only bumped when something really changed.
+    The VALUES list is rendered by psycopg2's execute_values, compiling it
+    through SQLAlchemy costs more than the update itself for large chunks.
+
+    Args:
+        session: SQLAlchemy session whose transaction the update joins
+        table (Table): Table to update
+        key (str): Name of the column used to join the VALUES list with the table
+        column_types (dict): {column_name: SQLAlchemy type} of the columns to set
+        rows (list): Tuples of (key, value_1, value_2, ...) in column_types order
+        touch_column (str): Timestamp column set to now() on changed rows, or None
+
+    Returns:
+        list: Keys of the rows actually updated
+    """
+    if not rows:
+        return []
+
+    connection = session.connection()
+    dialect = connection.dialect
+    quote = dialect.identifier_preparer.quote
+    names = list(column_types)
+
+    # casting keeps Postgres from typing an all-NULL VALUES column as text
+    new_values = {
+        quote(name): f"CAST(v.{quote(name)} AS {column_types[name].compile(dialect=dialect)})"
+        for name in names
+    }
+    assignments = [f"{name} = {value}" for name, value in new_values.items()]
+    if touch_column:
+        assignments.append(f"{quote(touch_column)} = now()")
+    changed = " OR ".join(
+        f"t.{name} IS DISTINCT FROM {value}" for name, value in new_values.items()
+    )
+    value_columns = ", ".join(quote(name) for name in [key, *names])
+
+    statement = (
+        f"UPDATE {dialect.identifier_preparer.format_table(table)} AS t "
+        f"SET {', '.join(assignments)} "
+        f"FROM (VALUES %s) AS v ({value_columns}) "
+        f"WHERE t.{quote(key)} = v.{quote(key)} AND ({changed}) "
+        f"RETURNING t.{quote(key)}"
+    )
+
+    cursor = connection.connection.cursor()
+    try:
+        updated = execute_values(
+            cursor, statement, rows, page_size=len(rows), fetch=True
+        )
+        return [row[0] for row in updated]
+    finally:
+        cursor.close()
+
+
+def chunked(items, size):
+    """
+    Split a sequence into consecutive lists of at most `size` items
+    """
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
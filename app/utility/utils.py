@@ -1,4 +1,9 @@
+import enum
 import re
+from datetime import datetime, timezone
+
+from flask import request
+from flask_restx import fields
 
 
 def camel_to_snake(camel_str):
@@ -38,3 +43,39 @@ def is_valid_website(website):
     )
 
     return re.match(website_regex, website) is not None
+
+
+def parse_datetime(value):
+    """
+    Parse an ISO-8601 datetime
+    Timestamps are stored without time zone (UTC), so aware values are converted.
+    Raises ValueError on invalid values
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_datetime_arg(name):
+    """
+    Read an optional ISO-8601 datetime query argument
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return parse_datetime(value)
+    except ValueError as e:
+        raise ValueError(f"{name} should be an ISO-8601 datetime: {value}") from e
+
+
+class EnumValue(fields.String):
+    """
+    Marshal an Enum member as its value ("positive", not "SentimentEnum.positive")
+    """
+
+    def format(self, value):
+        if isinstance(value, enum.Enum):
+            value = value.value
+        return super().format(value)
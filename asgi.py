@@ -0,0 +1,17 @@
+"""
+ASGI entry point, serving the read-only GETs on the event loop (app/async_read)
+and the rest of the API through the Flask app
+
+uvicorn asgi:app --host 0.0.0.0 --port 8765 --workers 2
+"""
+
+from dotenv import load_dotenv
+
+# before importing the app, app.extensions reads SQLALCHEMY_SCHEMA at import time
+load_dotenv()
+
+# pylint: disable=wrong-import-position
+from app import create_app
+from app.async_read import create_asgi_app
+
+app = create_asgi_app(create_app())
@@ -0,0 +1,100 @@
+"""
+Minimal HTTP load generator for comparing ways of serving the app
+
+python benchmarks/http_load.py http://127.0.0.1:8765/health-check --concurrency 32 --requests 5000
+
+Every client thread keeps one keep-alive connection and sends its share of
+the requests back to back. Prints throughput and latency percentiles.
+"""
+
+import argparse
+import collections
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def run_client(url, count, latencies, errors, headers):
+    """Send `count` GETs over one connection, recording latencies in seconds"""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    for _ in range(count):
+        started = time.perf_counter()
+        # like browsers and proxies, retry once on a fresh connection when the
+        # server closed an idle keep-alive one (e.g. a worker restarting)
+        for retry in (False, True):
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors.append(response.status)
+                if response.getheader("Connection", "").lower() == "close":
+                    connection.close()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError) as e:
+                connection.close()
+                if retry:
+                    errors.append(type(e).__name__)
+            except (OSError, http.client.HTTPException) as e:
+                errors.append(type(e).__name__)
+                connection.close()
+                break
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def percentile(values, fraction):
+    """Value below which `fraction` of the sorted values fall"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    """Run the load and print a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--header", action="append", default=[], help="Name: value")
+    args = parser.parse_args()
+
+    headers = dict(header.split(":", 1) for header in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+    latencies, errors = [], []
+    per_client = max(args.requests // args.concurrency, 1)
+    clients = [
+        threading.Thread(
+            target=run_client, args=(args.url, per_client, latencies, errors, headers)
+        )
+        for _ in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{len(latencies)} requests, concurrency {args.concurrency}, "
+        f"{elapsed:.2f}s: {len(latencies) / elapsed:.1f} req/s, {len(errors)} errors"
+    )
+    if errors:
+        print(f"errors: {dict(collections.Counter(errors))}")
+    print(
+        f"latency ms: mean {statistics.mean(latencies) * 1000:.1f} "
+        f"p50 {percentile(latencies, 0.5) * 1000:.1f} "
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f} "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} "
+        f"max {latencies[-1] * 1000:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
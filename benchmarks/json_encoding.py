@@ -0,0 +1,122 @@
+"""
+Encoding time of list pages, flask-restx's json.dumps against app/utility/json_encoding.py
+
+python benchmarks/json_encoding.py --rows 100 --repeat 200
+
+Builds, without a database, a page of EnrichmentSimWeb.to_dict() rows like
+GET /enrichmentsimweb/?page_size=100 returns, and a page of sentiments with
+raw Enum, datetime and Decimal values, then times encoding each with both.
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from sqlalchemy import DateTime, Numeric, Text
+
+from app.enrichment_simweb.models import EnrichmentSimWeb
+from app.sentiment.models import LicensabilityEnum, SentimentEnum, UrlSourceEnum
+from app.utility import json_encoding
+
+
+def enrichment_page(rows):
+    """Body of a page of `rows` enrichments"""
+    items = []
+    for index in range(rows):
+        values = {}
+        for column in EnrichmentSimWeb.__table__.columns:
+            if isinstance(column.type, Numeric):
+                value = decimal.Decimal(f"{random.uniform(0, 1e6):.4f}")
+            elif isinstance(column.type, DateTime):
+                value = datetime.datetime(2024, 1, 1, 12, 30, 45, 123456)
+            elif isinstance(column.type, Text):
+                value = f"{column.name} of row {index}, with some text"
+            else:
+                value = index
+            values[column.key] = value
+        # a plain object, the models can't be instantiated without an app
+        items.append(EnrichmentSimWeb.to_dict(types.SimpleNamespace(**values)))
+    return {
+        "first_page_number": 1,
+        "last_page_number": 10,
+        "total_items": rows * 10,
+        "total_pages": 10,
+        "current_page": 1,
+        "enrichment_sim_webs": items,
+    }
+
+
+def sentiment_page(rows):
+    """Body of a page of `rows` sentiments, with non-JSON values"""
+    return {
+        "sentiments": [
+            {
+                "sentiment_id": index,
+                "brand_id": index,
+                "sentiment": random.choice(list(SentimentEnum)),
+                "licensability": random.choice(list(LicensabilityEnum)),
+                "url_source": random.choice(list(UrlSourceEnum)),
+                "score": decimal.Decimal("0.8125"),
+                "created_at": datetime.datetime(2024, 1, 1, 12, 30, 45),
+            }
+            for index in range(rows)
+        ]
+    }
+
+
+def restx_dumps(data):
+    """flask-restx's default representation, with a default for the other types"""
+    # pylint: disable-next=protected-access
+    return json.dumps(data, default=json_encoding._default) + "\n"
+
+
+def fast_dumps(data):
+    """Representation of `api`"""
+    return json_encoding.dumps(data) + b"\n"
+
+
+def timings(encode, data, repeat):
+    """Seconds of each of `repeat` encodings"""
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(data)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def main():
+    """Run the benchmark and print a summary"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    backend = "orjson" if json_encoding.orjson is not None else "json (fallback)"
+    print(f"encoder: {backend}, {args.rows} rows, {args.repeat} runs")
+    for name, data in (
+        ("enrichment page", enrichment_page(args.rows)),
+        ("sentiment page", sentiment_page(args.rows)),
+    ):
+        assert json.loads(restx_dumps(data)) == json.loads(fast_dumps(data))
+        baseline = statistics.median(timings(restx_dumps, data, args.repeat))
+        fast = statistics.median(timings(fast_dumps, data, args.repeat))
+        print(
+            f"{name}: {len(fast_dumps(data)) / 1024:.0f} KiB, "
+            f"json.dumps {baseline * 1000:.2f} ms, "
+            f"dumps {fast * 1000:.2f} ms, {baseline / fast:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,105 @@ class Config(object):
     FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY")
     SQLALCHEMY_SCHEMA = os.getenv("SQLALCHEMY_SCHEMA")
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    }
+    # QueuePool of server databases, instrumented by app/utility/pool.py
+    # (SQLite keeps SQLAlchemy's default pool)
+    SQLALCHEMY_POOL_OPTIONS = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+    # Async engine of the read-only ASGI app (app/async_read), defaults to
+    # SQLALCHEMY_DATABASE_URI with the asyncpg driver
+    ASYNC_SQLALCHEMY_DATABASE_URI = os.getenv("ASYNC_SQLALCHEMY_DATABASE_URI")
+    ASYNC_SQLALCHEMY_POOL_OPTIONS = {
+        "pool_size": int(os.getenv("ASYNC_DB_POOL_SIZE", "20")),
+        "max_overflow": int(os.getenv("ASYNC_DB_POOL_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    }
+    # Read replicas (comma separated URIs), see app/utility/replicas.py
+    SQLALCHEMY_REPLICA_URIS = [
+        uri.strip()
+        for uri in os.getenv("SQLALCHEMY_REPLICA_URIS", "").split(",")
+        if uri.strip()
+    ]
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+    REPLICA_HEALTH_INTERVAL_SECONDS = float(
+        os.getenv("REPLICA_HEALTH_INTERVAL_SECONDS", "2")
+    )
+    # Threads of the ASGI app running the Flask app (every non async request)
+    ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", "10"))
+    # Checkouts waiting longer than this are logged
+    SQLALCHEMY_POOL_WAIT_WARNING_SECONDS = float(
+        os.getenv("DB_POOL_WAIT_WARNING_SECONDS", "0.1")
+    )
+    # SQL statements of a request, see app/utility/query_stats.py
+    SQL_SLOW_QUERY_SECONDS = float(os.getenv("SQL_SLOW_QUERY_SECONDS", "0.5"))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+    # Clients sent the X-SQL-* headers (comma separated addresses), none by default
+    SQL_STATS_HEADER_IPS = {
+        ip.strip() for ip in os.getenv("SQL_STATS_HEADER_IPS", "").split(",") if ip.strip()
+    }
+    # Request profiles, see app/utility/profiling.py
+    PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "true").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+    PROFILE_BACKGROUND = os.getenv("PROFILE_BACKGROUND", "false").lower() == "true"
+    PROFILE_BACKGROUND_INTERVAL_MS = float(
+        os.getenv("PROFILE_BACKGROUND_INTERVAL_MS", "10")
+    )
+    PROFILE_SLOWEST_PER_MINUTE = int(os.getenv("PROFILE_SLOWEST_PER_MINUTE", "5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./logs/profiles")
+    # Cache-Control of the GET responses per namespace, "" to send none,
+    # see app/utility/caching.py
+    CACHE_CONTROL = {
+        "articles": os.getenv("CACHE_CONTROL_ARTICLES", "private, max-age=60"),
+        "brands": os.getenv("CACHE_CONTROL_BRANDS", "private, no-cache"),
+        "enrichmentsSim_web": os.getenv("CACHE_CONTROL_ENRICHMENTS", "private, no-cache"),
+        "publishers": os.getenv("CACHE_CONTROL_PUBLISHERS", "private, no-cache"),
+        "sentiments": os.getenv("CACHE_CONTROL_SENTIMENTS", "private, no-cache"),
+        "batch_statuses": os.getenv("CACHE_CONTROL_BATCH_STATUSES", "no-store"),
+    }
+    # Single-flight of identical concurrent GETs, see app/utility/coalescing.py
+    COALESCE_GETS = os.getenv("COALESCE_GETS", "true").lower() == "true"
+    COALESCE_TTL_SECONDS = float(os.getenv("COALESCE_TTL_SECONDS", "0"))
+    COALESCE_WAIT_SECONDS = float(os.getenv("COALESCE_WAIT_SECONDS", "30"))
+    # Compression level (1-9, 0 for none) of the responses per namespace, and
+    # the smallest body compressed, see app/utility/compression.py
+    COMPRESSION_LEVELS = {
+        "articles": int(os.getenv("COMPRESSION_LEVEL_ARTICLES", "6")),
+        "brands": int(os.getenv("COMPRESSION_LEVEL_BRANDS", "6")),
+        "enrichmentsSim_web": int(os.getenv("COMPRESSION_LEVEL_ENRICHMENTS", "4")),
+        "publishers": int(os.getenv("COMPRESSION_LEVEL_PUBLISHERS", "6")),
+        "sentiments": int(os.getenv("COMPRESSION_LEVEL_SENTIMENTS", "6")),
+        "batch_statuses": int(os.getenv("COMPRESSION_LEVEL_BATCH_STATUSES", "6")),
+    }
+    COMPRESSION_DEFAULT_LEVEL = int(os.getenv("COMPRESSION_DEFAULT_LEVEL", "6"))
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    # Allocation tracing, see app/utility/memory.py
+    TRACEMALLOC_START = os.getenv("TRACEMALLOC_START", "false").lower() == "true"
+    TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+    # Where batch input/output files live, see app/batch_status/file_store.py
+    BATCH_FILE_STORE = os.getenv("BATCH_FILE_STORE", "local")
+    BATCH_FILE_STORE_ROOT = os.getenv("BATCH_FILE_STORE_ROOT", "./batch_files")
+    # Defaults of `flask batch-worker`, see app/batch_status/worker.py
+    BATCH_WORKER_THREADS = int(os.getenv("BATCH_WORKER_THREADS", "4"))
+    BATCH_JOB_LEASE_SECONDS = int(os.getenv("BATCH_JOB_LEASE_SECONDS", "300"))
+    # Heuristics of the enrichment estimates, placeholders to tune per deployment
+    # (see app/enrichment_simweb/estimates.py for the defaults), unset = default
+    ESTIMATE_HEURISTICS = {
+        key: float(os.environ[env])
+        for key, env in (
+            ("revenue_per_visit_usd", "ESTIMATE_REVENUE_PER_VISIT_USD"),
+            ("revenue_per_employee_usd", "ESTIMATE_REVENUE_PER_EMPLOYEE_USD"),
+            ("ip_ad_spend_share", "ESTIMATE_IP_AD_SPEND_SHARE"),
+            ("licensing_share_of_revenue", "ESTIMATE_LICENSING_SHARE_OF_REVENUE"),
+        )
+        if os.getenv(env)
+    }
 
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,155 @@
+"""
+gunicorn settings for serving wsgi:app in production
+
+gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden with the GUNICORN_* env vars below (or on the
+command line). Workers default to gthread: requests mostly wait on Postgres,
+so a few processes with a handful of threads each beat many single threaded
+processes for the same memory. GUNICORN_WORKERS=auto sizes the worker count
+from the CPUs available to the process (cgroup/affinity aware).
+
+The app is preloaded in the master, so workers fork with the code already
+imported; post_fork then drops the database connections inherited from the
+master so no two processes ever share a socket.
+
+Workers write their Prometheus metrics to mmap files in
+PROMETHEUS_MULTIPROC_DIR (emptied when the master starts), so /metrics
+served by any worker adds up all of them.
+
+Reloads:
+    kill -HUP <master>     new workers with the new settings; code is only
+                           reloaded with GUNICORN_PRELOAD=false
+    kill -USR2 <master>    zero-downtime code upgrade: starts a new master,
+                           then kill -TERM the old one once it is serving
+"""
+
+# pylint: disable=invalid-name
+
+import glob
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKER_CLASSES = ("gthread", "sync")
+
+
+def available_cpus():
+    """CPUs this process may run on, honouring affinity masks"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def autotune_workers(worker_class, threads):
+    """
+    Worker count for the available CPUs
+    sync workers only overlap I/O across processes (2 * CPUs + 1), gthread
+    workers overlap it across their threads too, so fewer processes suffice.
+    """
+    cpus = available_cpus()
+    if worker_class == "sync" or threads <= 1:
+        return 2 * cpus + 1
+    return cpus + 1
+
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in WORKER_CLASSES:
+    raise ValueError(
+        f"GUNICORN_WORKER_CLASS should be one of {', '.join(WORKER_CLASSES)}"
+    )
+threads = int(os.getenv("GUNICORN_THREADS", "4")) if worker_class == "gthread" else 1
+workers_setting = os.getenv("GUNICORN_WORKERS", "auto")
+workers = (
+    autotune_workers(worker_class, threads)
+    if workers_setting == "auto"
+    else int(workers_setting)
+)
+
+bind = os.getenv(
+    "GUNICORN_BIND",
+    f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '8765')}",
+)
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+
+# recycle workers now and then (leaks, fragmentation), jittered so they
+# don't all restart at the same moment
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# slightly above the idle timeout of the load balancer in front, so it never
+# reuses a connection gunicorn just closed
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+# worker heartbeat files on tmpfs, a slow disk can make the master kill workers
+worker_tmp_dir = os.getenv("GUNICORN_WORKER_TMP_DIR", "/dev/shm")
+# read by prometheus_client when the app imports it, so set before preloading
+prometheus_multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(worker_tmp_dir, "companydb-prometheus")
+)
+os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+forwarded_allow_ips = os.getenv("GUNICORN_FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = os.getenv("GUNICORN_ERROR_LOG", "-")
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+access_log_format = '%(h)s "%(r)s" %(s)s %(b)s %(M)sms'
+
+
+def on_starting(server):
+    """Drop the metric files of a previous run"""
+    for path in glob.glob(os.path.join(prometheus_multiproc_dir, "*.db")):
+        os.remove(path)
+
+
+def when_ready(server):
+    """Log the effective concurrency once the master is up"""
+    server.log.info(
+        f"{workers} {worker_class} workers x {threads} threads "
+        f"(preload_app={preload_app}, max_requests={max_requests}"
+        f"+{max_requests_jitter}, keepalive={keepalive}s)"
+    )
+    pool_options = _app_config(server).get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    pool_limit = pool_options.get("pool_size", 5) + pool_options.get("max_overflow", 10)
+    if threads > pool_limit:
+        server.log.warning(
+            f"{threads} threads per worker share at most {pool_limit} DB connections, "
+            f"raise DB_POOL_SIZE/DB_POOL_MAX_OVERFLOW"
+        )
+
+
+def post_fork(server, worker):
+    """
+    Drop the connections a preloaded app inherited from the master
+    close=False leaves the sockets to the master instead of closing them
+    from under it, the worker then opens its own on first use.
+    """
+    if not preload_app:
+        return
+    # pylint: disable=import-outside-toplevel
+    from app.extensions import db
+
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    worker.log.debug(f"Worker {worker.pid} reset its inherited DB pools")
+
+
+def child_exit(server, worker):
+    """Stop counting the live gauges of an exited worker"""
+    # pylint: disable=import-outside-toplevel
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def _app_config(server):
+    if not preload_app:
+        return {}
+    return server.app.wsgi().config
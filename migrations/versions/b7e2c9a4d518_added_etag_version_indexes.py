@@ -0,0 +1,54 @@
+"""AddedEtagVersionIndexes
+
+Revision ID: b7e2c9a4d518
+Revises: d83f5a1c9e27
+Create Date: 2026-10-19 19:14:27.662913
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7e2c9a4d518"
+down_revision = "d83f5a1c9e27"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_articles_article_id_last_updated_at", "articles", "article_id"),
+    ("ix_brands_brand_id_last_updated_at", "brands", "brand_id"),
+    (
+        "ix_enrichments_simweb_enrichment_sim_web_id_last_updated_at",
+        "enrichments_simweb",
+        "enrichment_sim_web_id",
+    ),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while the indexes build,
+    # it cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, key in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [key],
+                unique=False,
+                schema="my_schema",
+                postgresql_include=["last_updated_at"],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                schema="my_schema",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
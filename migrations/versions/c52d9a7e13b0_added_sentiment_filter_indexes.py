@@ -0,0 +1,68 @@
+"""AddedSentimentFilterIndexes
+
+Revision ID: c52d9a7e13b0
+Revises: 8b41e6c0d2f7
+Create Date: 2026-10-19 12:20:44.918372
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c52d9a7e13b0"
+down_revision = "8b41e6c0d2f7"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_sentiments_brand_id_sentiment_id", ["brand_id", "sentiment_id"], None),
+    ("ix_sentiments_publisher_id_sentiment_id", ["publisher_id", "sentiment_id"], None),
+    ("ix_sentiments_article_id_sentiment_id", ["article_id", "sentiment_id"], None),
+    ("ix_sentiments_batch_id", ["batch_id"], None),
+    (
+        "ix_sentiments_brand_id_labels_sentiment_id",
+        ["brand_id", "sentiment", "licensability", "sentiment_id"],
+        None,
+    ),
+    (
+        "ix_sentiments_labels_sentiment_id",
+        ["sentiment", "licensability", "sentiment_id"],
+        None,
+    ),
+    (
+        "ix_sentiments_unverified_brand_id_sentiment_id",
+        ["brand_id", "sentiment_id"],
+        "is_manually_verified = false",
+    ),
+    ("ix_sentiments_created_at", ["created_at"], None),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps sentiments writable while the indexes build,
+    # it cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                "sentiments",
+                columns,
+                unique=False,
+                schema="my_schema",
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name="sentiments",
+                schema="my_schema",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,47 @@
+"""AddedBatchStatusExpiryIndex
+
+Revision ID: d83f5a1c9e27
+Revises: a9d4e2b7c361
+Create Date: 2026-10-19 18:02:13.406519
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d83f5a1c9e27"
+down_revision = "a9d4e2b7c361"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY keeps batch_statuses writable while the index builds,
+    # it cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_batch_statuses_expirable_expires_at",
+            "batch_statuses",
+            ["expires_at"],
+            unique=False,
+            schema="my_schema",
+            # must match EXPIRABLE_STATUSES in app/batch_status/models.py, the
+            # sweeper's WHERE clause only uses the index when they are equal
+            postgresql_where=sa.text(
+                "status IN ('validating', 'in_progress', 'finalizing')"
+            ),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_batch_statuses_expirable_expires_at",
+            table_name="batch_statuses",
+            schema="my_schema",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
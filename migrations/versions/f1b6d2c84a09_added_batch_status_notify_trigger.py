@@ -0,0 +1,34 @@
+"""AddedBatchStatusNotifyTrigger
+
+Revision ID: f1b6d2c84a09
+Revises: e7a3f90b5c14
+Create Date: 2026-10-19 15:08:52.671390
+
+"""
+
+from alembic import op
+
+from app.batch_status.feed import (
+    drop_notify_trigger_statements,
+    notify_trigger_statements,
+)
+
+# revision identifiers, used by Alembic.
+revision = "f1b6d2c84a09"
+down_revision = "e7a3f90b5c14"
+branch_labels = None
+depends_on = None
+
+
+BATCH_STATUSES_TABLE = "my_schema.batch_statuses"
+
+
+def upgrade():
+    # NOTIFY on batch status transitions, DDL shared with db.create_all()
+    for statement in notify_trigger_statements(BATCH_STATUSES_TABLE):
+        op.execute(statement)
+
+
+def downgrade():
+    for statement in drop_notify_trigger_statements(BATCH_STATUSES_TABLE):
+        op.execute(statement)
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers
+
+gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from dotenv import load_dotenv
+
+# before importing the app, app.extensions reads SQLALCHEMY_SCHEMA at import time
+load_dotenv()
+
+# pylint: disable=wrong-import-position
+from app import create_app
+
+app = create_app()